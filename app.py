@@ -1,20 +1,51 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 import yt_dlp
 import subprocess
 import tempfile
 import os
 from datetime import datetime
 import json
-import requests
 import shutil
-from functools import lru_cache
 import concurrent.futures
+import itertools
 import time
-import random
-import re
+import sqlite3
+import threading
+
+from caching import SQLiteCache, TTLCache, TieredCache
+from caption_parser import CAPTION_FORMATS, PARSEABLE_EXTS, CaptionParseError, parse_captions, render_captions
+from download_verify import stream_verify_job
+from extraction_pool import (ExtractionPool, ExtractionQueueFull, download_info_expiry, download_info_job, download_job,
+                             http_retry_sleep, subtitles_job)
+from hedging import HedgedFetcher
+from jobs import JobManager, JobQueueFull
+import metrics
+from http_client import PooledHTTPClient
+from rate_limit import RateLimiter, SQLiteTokenBucket, TokenBucket
+from scratch import sweep_scratch
+from self_test import SelfTest
+from singleflight import SingleFlight
+from track_index import TrackIndex
+from video_metadata import DESCRIPTION_CHARS, VideoMetadata, record_size
+from video_ids import is_video_url, video_key
 
 app = Flask(__name__)
 
+@app.before_request
+def start_request_metrics():
+    g.request_timer = metrics.RequestTimer(request.url_rule.rule if request.url_rule else 'unmatched', request.method)
+
+@app.after_request
+def record_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    timer = g.pop('request_timer', None)
+    if timer is not None:
+        timer.finish(g.pop('response_status', 500))
+
 @app.route('/')
 def home():
     return '''
@@ -422,7 +453,7 @@ def home():
                         <div class="endpoint-card">
                             <span class="endpoint-method method-get">GET</span>
                             <strong>/ytdlp-info</strong>
-                            <p>Get yt-dlp version and capabilities test</p>
+                            <p>Get yt-dlp version and the last capabilities test (add ?refresh=1 to re-run it)</p>
                             <div class="code-block">curl http://localhost:8090/ytdlp-info</div>
                         </div>
                         
@@ -539,7 +570,8 @@ def home():
                     document.getElementById('service-info').innerHTML = 
                         '<h4>🚀 Service Status</h4>' +
                         '<p><strong>yt-dlp Version:</strong> ' + data['yt-dlp_version'] + '</p>' +
-                        '<p><strong>Test Extraction:</strong> ' + data.test_extraction + '</p>' +
+                        '<p><strong>Test Extraction:</strong> ' + data.test_extraction +
+                            (data.test_age_seconds !== null ? ' (checked ' + Math.round(data.test_age_seconds) + 's ago)' : '') + '</p>' +
                         '<p><strong>Test Video:</strong> ' + data.test_video_title + '</p>' +
                         '<p><strong>Capabilities:</strong> ✅ Extract Info, ✅ Download, ✅ Format Detection</p>';
                 })
@@ -1064,37 +1096,18 @@ def health():
 
 @app.route('/ytdlp-info')
 def ytdlp_info():
+    """yt-dlp version and the last background self-test; ?refresh=1 re-runs the self-test first"""
     try:
-        # Get yt-dlp version
-        try:
-            version = yt_dlp.version.__version__
-        except AttributeError:
-            # Fallback for newer versions
-            import subprocess
-            version = subprocess.check_output(['yt-dlp', '--version'], text=True).strip()
-        
-        # Test basic functionality
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': True
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Test with a known working video
-            test_url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"  # Rick Roll - always available
-            try:
-                info = ydl.extract_info(test_url, download=False)
-                test_result = "success"
-                test_title = info.get('title', 'Unknown')
-            except Exception as e:
-                test_result = f"error: {str(e)}"
-                test_title = None
+        if request.args.get('refresh', '').lower() in ('1', 'true', 'yes'):
+            ytdlp_self_test.refresh()
+        test = ytdlp_self_test.snapshot()
         
         return jsonify({
-            'yt-dlp_version': version,
-            'test_extraction': test_result,
-            'test_video_title': test_title,
+            'yt-dlp_version': YTDLP_VERSION,
+            'test_extraction': test['test_extraction'] if test else 'pending',
+            'test_video_title': test['test_video_title'] if test else None,
+            'test_checked_at': datetime.fromtimestamp(test['checked_at']).isoformat() if test else None,
+            'test_age_seconds': round(test['age'], 1) if test else None,
             'capabilities': {
                 'extract_info': True,
                 'download': True,
@@ -1109,6 +1122,20 @@ def ytdlp_info():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+def metadata_payload(info):
+    """Response body for /test-ytdlp"""
+    return {
+        'success': True,
+        'title': info.title or 'Unknown',
+        'uploader': info.uploader or 'Unknown',
+        'duration': info.duration or 0,
+        'view_count': info.view_count or 0,
+        'upload_date': info.upload_date or 'Unknown',
+        'formats_available': info.formats['count'],
+        'description': info.description[:DESCRIPTION_CHARS] + '...' if info.description else '',
+        'timestamp': datetime.now().isoformat()
+    }
+
 @app.route('/test-ytdlp', methods=['POST'])
 def test_ytdlp():
     try:
@@ -1118,28 +1145,17 @@ def test_ytdlp():
         if not url:
             return jsonify({'error': 'URL is required', 'success': False}), 400
         
-        # Configure yt-dlp for metadata extraction only
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False
-        }
+        # Metadata extraction only, served from the shared metadata cache when warm
+        info = get_video_metadata_cached(url)
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            return jsonify({
-                'success': True,
-                'title': info.get('title', 'Unknown'),
-                'uploader': info.get('uploader', 'Unknown'),
-                'duration': info.get('duration', 0),
-                'view_count': info.get('view_count', 0),
-                'upload_date': info.get('upload_date', 'Unknown'),
-                'formats_available': len(info.get('formats', [])),
-                'description': info.get('description', '')[:200] + '...' if info.get('description') else '',
-                'timestamp': datetime.now().isoformat()
-            })
+        return jsonify(metadata_payload(info))
             
+    except ExtractionQueueFull as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }), 503
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1147,6 +1163,97 @@ def test_ytdlp():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+def classify_download(file_extension, file_size):
+    """Describe what a download test actually fetched, from its extension and size"""
+    if file_extension == '.mhtml':
+        return 'storyboard/thumbnails'
+    elif file_extension in ['.mp4', '.webm', '.mkv']:
+        return 'video'
+    elif file_extension in ['.mp3', '.m4a', '.opus']:
+        return 'audio'
+    elif file_size < 1024:
+        return 'metadata/small file'
+    return 'media file'
+
+def stream_download_test(url, max_bytes, progress=None):
+    """Verify a download by streaming the selected format through a counting/hashing sink; no disk involved"""
+    # One extraction; format selection in the worker reuses it instead of extracting again
+    info = get_download_info(url)
+    verified, ext = extraction_pool.run(stream_verify_job, url, 'download', args=(max_bytes, info, progress),
+                                        timeout=EXTRACTION_DOWNLOAD_TIMEOUT)
+    file_size = verified['bytes']
+    if not file_size:
+        return {
+            'success': False,
+            'error': 'Download failed - no bytes were received',
+            'url_tested': url,
+            'timestamp': datetime.now().isoformat()
+        }, 500
+    
+    file_extension = f'.{ext}' if ext else ''
+    download_type = classify_download(file_extension, file_size)
+    stopped_early = f' (stopped at the {max_bytes:,}-byte cap)' if verified['truncated'] else ''
+    return {
+        'success': True,
+        'mode': 'stream',
+        'video_title': info.get('title', 'Unknown'),
+        'uploader': info.get('uploader', 'Unknown'),
+        'duration': info.get('duration', 0),
+        'downloaded_bytes': file_size,
+        'downloaded_size_mb': round(file_size / (1024 * 1024), 2),
+        'downloaded_size_human': f"{file_size:,} bytes ({round(file_size / (1024 * 1024), 2):.2f} MB)",
+        'file_extension': file_extension,
+        'file_signature': verified['signature'][:32] or 'none',
+        'sha256': verified['sha256'],
+        'truncated': verified['truncated'],
+        'download_type': download_type,
+        'url_tested': url,
+        'timestamp': datetime.now().isoformat(),
+        'verification': f'Streamed through a byte counter and SHA-256 hash, never written to disk{stopped_early}',
+        'note': f'✅ DOWNLOAD COMPLETED! Streamed {download_type} and verified it without storing it.',
+        'explanation': 'Note: YouTube often restricts video downloads. You may only get storyboard images or metadata.'
+    }, 200
+
+def disk_download_test(url, progress=None):
+    """Let yt-dlp write the file into a per-request scratch directory and inspect the exact file it reports"""
+    sweep_scratch(DOWNLOAD_SCRATCH_DIR, max_age=2 * EXTRACTION_DOWNLOAD_TIMEOUT)
+    
+    # One extraction (its record is shared with the other endpoints through the metadata cache);
+    # the worker downloads from that info dict (format listing, inspection and cleanup happen there too)
+    info = get_download_info(url)
+    downloaded = extraction_pool.run(download_job, url, 'download', overrides={'outtmpl': 'ytdlp_test.%(ext)s'},
+                                     args=(DOWNLOAD_SCRATCH_DIR, info, progress), timeout=EXTRACTION_DOWNLOAD_TIMEOUT)
+    if not downloaded:
+        return {
+            'success': False,
+            'error': 'Download failed - no file was created',
+            'url_tested': url,
+            'timestamp': datetime.now().isoformat()
+        }, 500
+    
+    file_size = downloaded['bytes']
+    file_extension = os.path.splitext(downloaded['filename'])[1]
+    download_type = classify_download(file_extension, file_size)
+    return {
+        'success': True,
+        'mode': 'disk',
+        'video_title': info.get('title', 'Unknown'),
+        'uploader': info.get('uploader', 'Unknown'),
+        'duration': info.get('duration', 0),
+        'downloaded_bytes': file_size,
+        'downloaded_size_mb': round(file_size / (1024 * 1024), 2),
+        'downloaded_size_human': f"{file_size:,} bytes ({round(file_size / (1024 * 1024), 2):.2f} MB)",
+        'file_extension': file_extension,
+        'file_signature': downloaded['signature'][:32] or 'none',
+        'download_type': download_type,
+        'files_written': downloaded['files_written'],
+        'url_tested': url,
+        'timestamp': datetime.now().isoformat(),
+        'verification': f"Final file reported by yt-dlp read back from a private scratch directory ({downloaded['files_written']} file(s) written)",
+        'note': f'✅ DOWNLOAD COMPLETED! Downloaded {download_type}. File was created, verified, and deleted.',
+        'explanation': 'Note: YouTube often restricts video downloads. You may only get storyboard images or metadata.'
+    }, 200
+
 @app.route('/test-download', methods=['POST'])
 def test_download():
     try:
@@ -1156,102 +1263,18 @@ def test_download():
         if not url:
             return jsonify({'error': 'URL is required', 'success': False}), 400
         
-        # Create a temporary file path (but don't create the file yet)
-        temp_dir = tempfile.gettempdir()
-        output_template = os.path.join(temp_dir, f"ytdlp_test_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.%(ext)s")
-            
-        try:
-            # Configure yt-dlp for download
-            download_opts = {
-                'outtmpl': output_template,
-                'quiet': False,  # Enable logging to see what's happening
-                'no_warnings': False,  # Show warnings to debug
-                # Try audio formats first (smaller files), then video formats
-                'format': '140/249/250/251/bestaudio[filesize<10M]/best[filesize<10M]/worst',
-            }
-            
-            with yt_dlp.YoutubeDL(download_opts) as ydl:
-                # First, get info to show available formats
-                info = ydl.extract_info(url, download=False)
-                
-                # Show available formats for debugging
-                formats = info.get('formats', [])
-                print(f"Available formats: {len(formats)}")
-                for f in formats[:3]:  # Show first 3 formats
-                    print(f"  - {f.get('format_id')}: {f.get('ext')} {f.get('resolution')} {f.get('filesize')}")
-                
-                # Attempt download
-                print(f"Attempting to download: {url}")
-                ydl.download([url])
-                
-                # Find the actual downloaded file (yt-dlp replaces %(ext)s with actual extension)
-                base_path = output_template.replace('.%(ext)s', '')
-                downloaded_file = None
-                for ext in ['.m4a', '.mp4', '.webm', '.opus', '.mp3', '.mkv', '.mhtml']:
-                    potential_file = base_path + ext
-                    if os.path.exists(potential_file):
-                        downloaded_file = potential_file
-                        break
-                
-                if downloaded_file and os.path.exists(downloaded_file):
-                    file_size = os.path.getsize(downloaded_file)
-                    file_extension = os.path.splitext(downloaded_file)[1]
-                    
-                    # Read first few bytes to verify content
-                    with open(downloaded_file, 'rb') as f:
-                        first_bytes = f.read(16)
-                    
-                    # Determine what was actually downloaded
-                    download_type = 'unknown'
-                    if file_extension == '.mhtml':
-                        download_type = 'storyboard/thumbnails'
-                    elif file_extension in ['.mp4', '.webm', '.mkv']:
-                        download_type = 'video'
-                    elif file_extension in ['.mp3', '.m4a', '.opus']:
-                        download_type = 'audio'
-                    elif file_size < 1024:
-                        download_type = 'metadata/small file'
-                    else:
-                        download_type = 'media file'
-                    
-                    # Clean up the temporary file
-                    os.unlink(downloaded_file)
-                    
-                    result = {
-                        'success': True,
-                        'video_title': info.get('title', 'Unknown'),
-                        'uploader': info.get('uploader', 'Unknown'),
-                        'duration': info.get('duration', 0),
-                        'downloaded_bytes': file_size,
-                        'downloaded_size_mb': round(file_size / (1024 * 1024), 2),
-                        'downloaded_size_human': f"{file_size:,} bytes ({round(file_size / (1024 * 1024), 2):.2f} MB)",
-                        'file_extension': file_extension,
-                        'file_signature': first_bytes.hex()[:32] if first_bytes else 'none',
-                        'download_type': download_type,
-                        'url_tested': url,
-                        'timestamp': datetime.now().isoformat(),
-                        'verification': 'Full file read into memory (0 bytes)',
-                        'note': f'✅ DOWNLOAD COMPLETED! Downloaded {download_type}. File was created, verified, and deleted.',
-                        'explanation': 'Note: YouTube often restricts video downloads. You may only get storyboard images or metadata.'
-                    }
-                    
-                    return jsonify(result)
-                else:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Download failed - no file was created',
-                        'url_tested': url,
-                        'timestamp': datetime.now().isoformat()
-                    }), 500
-                    
-        except Exception as e:
-            # Clean up temp files if they exist
-            base_path = output_template.replace('.%(ext)s', '')
-            for ext in ['.m4a', '.mp4', '.webm', '.opus', '.mp3', '.mkv', '.mhtml']:
-                potential_file = base_path + ext
-                if os.path.exists(potential_file):
-                    os.unlink(potential_file)
-            raise e
+        # 'stream' verifies bytes in flight; 'disk' lets yt-dlp write the file and inspects it
+        mode = data.get('mode', DOWNLOAD_VERIFY_MODE)
+        if mode not in ('stream', 'disk'):
+            return jsonify({'error': 'mode must be "stream" or "disk"', 'success': False}), 400
+        if mode == 'stream':
+            max_mb = data.get('max_mb')
+            max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb is not None else DOWNLOAD_MAX_BYTES
+            payload, status = stream_download_test(url, max_bytes)
+            return jsonify(payload), status
+        
+        payload, status = disk_download_test(url)
+        return jsonify(payload), status
             
     except Exception as e:
         return jsonify({
@@ -1260,25 +1283,417 @@ def test_download():
             'timestamp': datetime.now().isoformat()
         }), 500
 
-# Cache for video metadata to avoid repeated yt-dlp calls
-@lru_cache(maxsize=100)
-def get_video_metadata_cached(url):
-    """Cached video metadata extraction with optimized yt-dlp options"""
-    ydl_opts = {
+@app.route('/jobs/download', methods=['POST'])
+def create_download_job():
+    """Start a /test-download run in the background and return its job ID immediately"""
+    data = request.get_json(silent=True) or {}
+    url = data.get('url')
+    if not url:
+        return jsonify({'error': 'URL is required', 'success': False}), 400
+    
+    mode = data.get('mode', DOWNLOAD_VERIFY_MODE)
+    if mode not in ('stream', 'disk'):
+        return jsonify({'error': 'mode must be "stream" or "disk"', 'success': False}), 400
+    max_mb = data.get('max_mb')
+    max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb is not None else DOWNLOAD_MAX_BYTES
+    
+    if mode == 'stream':
+        run = lambda progress: stream_download_test(url, max_bytes, progress=progress)
+    else:
+        run = lambda progress: disk_download_test(url, progress=progress)
+    try:
+        job = download_jobs.submit('download', {'url': url, 'mode': mode, 'max_bytes': max_bytes or None}, run)
+    except JobQueueFull as e:
+        return jsonify({'success': False, 'error': str(e), 'timestamp': datetime.now().isoformat()}), 503
+    
+    return jsonify(dict(job, success=True, status_url=f"/jobs/{job['job_id']}",
+                        timestamp=datetime.now().isoformat())), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status, live download progress (bytes, speed, ETA) and, once finished, the result"""
+    job = download_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found', 'timestamp': datetime.now().isoformat()}), 404
+    return jsonify(dict(job, success=job['status'] != 'failed', timestamp=datetime.now().isoformat()))
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued or running job; deleting a finished job removes its record"""
+    job = download_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found', 'timestamp': datetime.now().isoformat()}), 404
+    return jsonify(dict(job, success=True, timestamp=datetime.now().isoformat()))
+
+# Shared metadata cache: keyed on the canonical video key (see video_ids), bounded in bytes and
+# expired well before YouTube's signed caption URLs (typically ~6h) stop working
+METADATA_CACHE_TTL = int(os.environ.get('METADATA_CACHE_TTL', 3600))
+METADATA_CACHE_MAX_BYTES = int(os.environ.get('METADATA_CACHE_MAX_MB', 64)) * 1024 * 1024
+SIGNED_URL_SAFETY_MARGIN = 600  # Seconds kept in reserve before a signed URL expires
+CAPTION_CACHE_TTL = int(os.environ.get('CAPTION_CACHE_TTL', 6 * 3600))
+CAPTION_CACHE_MAX_BYTES = int(os.environ.get('CAPTION_CACHE_MAX_MB', 32)) * 1024 * 1024
+DOWNLOAD_INFO_CACHE_MAX_BYTES = int(os.environ.get('DOWNLOAD_INFO_CACHE_MAX_MB', 16)) * 1024 * 1024
+
+# Cross-worker cache: 'shared' layers each worker's memory cache over SQLite files in
+# CACHE_DIR so gunicorn workers in the same pod share warm entries; 'memory' disables it
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'shared')
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'ytdlp-downloads'))
+SHARED_CACHE_MAX_BYTES = int(os.environ.get('SHARED_CACHE_MAX_MB', 256)) * 1024 * 1024
+
+def build_cache(name, max_bytes, ttl, record=None):
+    """Create the cache for one namespace according to CACHE_BACKEND; record is the class of its values, if not JSON"""
+    if record is not None:
+        local = TTLCache(max_bytes=max_bytes, ttl=ttl, sizeof=record_size)
+        codec = {'encode': record.to_dict, 'decode': record.from_dict}
+    else:
+        local = TTLCache(max_bytes=max_bytes, ttl=ttl)
+        codec = {}
+    if CACHE_BACKEND != 'shared':
+        return local
+    try:
+        shared = SQLiteCache(os.path.join(CACHE_DIR, f'{name}-cache.sqlite3'),
+                             max_bytes=SHARED_CACHE_MAX_BYTES, ttl=ttl, **codec)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Shared {name} cache unavailable, using per-worker memory cache: {e}")
+        return local
+    return TieredCache(local, shared)
+
+# Metadata entries are VideoMetadata records projected from the info dict in the extraction worker
+metadata_cache = build_cache('metadata', METADATA_CACHE_MAX_BYTES, METADATA_CACHE_TTL, record=VideoMetadata)
+caption_cache = build_cache('captions', CAPTION_CACHE_MAX_BYTES, CAPTION_CACHE_TTL)
+# Download tests: the info dict cut down to the formats the download profile selects
+download_info_cache = build_cache('downloads', DOWNLOAD_INFO_CACHE_MAX_BYTES, METADATA_CACHE_TTL)
+
+# Upstream pacing: one AIMD token bucket per YouTube host, either per worker ('process')
+# or shared by all workers in the pod through a SQLite file in CACHE_DIR ('pod')
+RATE_LIMIT_SCOPE = os.environ.get('RATE_LIMIT_SCOPE', 'process')
+UPSTREAM_RATE_LIMITS = {
+    'rate': float(os.environ.get('UPSTREAM_RATE', 5)),
+    'burst': int(os.environ.get('UPSTREAM_BURST', 10)),
+    'min_rate': float(os.environ.get('UPSTREAM_MIN_RATE', 0.5)),
+    'max_rate': float(os.environ.get('UPSTREAM_MAX_RATE', 20)),
+    'increase': float(os.environ.get('UPSTREAM_RATE_INCREASE', 0.05)),
+    'decrease': float(os.environ.get('UPSTREAM_RATE_DECREASE', 0.5)),
+}
+
+def build_rate_bucket(host):
+    """Create the token bucket for one upstream host according to RATE_LIMIT_SCOPE"""
+    if RATE_LIMIT_SCOPE == 'pod':
+        try:
+            return SQLiteTokenBucket(os.path.join(CACHE_DIR, 'rate-limits.sqlite3'), host, **UPSTREAM_RATE_LIMITS)
+        except (OSError, sqlite3.Error) as e:
+            print(f"Shared rate limiter unavailable for {host}, using per-worker bucket: {e}")
+    return TokenBucket(**UPSTREAM_RATE_LIMITS)
+
+upstream_limiter = RateLimiter(build_rate_bucket, max_wait=float(os.environ.get('UPSTREAM_MAX_WAIT', 10)),
+                               on_throttle=metrics.record_upstream_throttle)
+
+# One keep-alive connection pool per worker, shared by every caption fetch
+http_client = PooledHTTPClient(
+    pool_connections=int(os.environ.get('HTTP_POOL_CONNECTIONS', 10)),
+    pool_maxsize=int(os.environ.get('HTTP_POOL_MAXSIZE', 20)),
+    pool_block=os.environ.get('HTTP_POOL_BLOCK', 'false').lower() == 'true',
+    max_retries=int(os.environ.get('HTTP_MAX_RETRIES', 2)),
+    backoff_factor=float(os.environ.get('HTTP_BACKOFF_FACTOR', 0.5)),
+    connect_timeout=float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5)),
+    read_timeout=float(os.environ.get('HTTP_READ_TIMEOUT', 15)),
+    rate_limiter=upstream_limiter
+)
+
+# Hedged fallback fetching for /extract-captions-old: per-request parallelism and a
+# process-wide cap on concurrent fetches per upstream host
+CAPTION_HEDGE_DELAY = float(os.environ.get('CAPTION_HEDGE_DELAY', 0.75))
+CAPTION_HEDGE_MAX_PARALLEL = int(os.environ.get('CAPTION_HEDGE_MAX_PARALLEL', 3))
+hedged_fetcher = HedgedFetcher(
+    http_client,
+    max_workers=int(os.environ.get('CAPTION_HEDGE_WORKERS', 32)),
+    per_host_limit=int(os.environ.get('CAPTION_HEDGE_PER_HOST', 8))
+)
+
+# In-flight dedup: followers for the same key wait on the leader's result
+metadata_flights = SingleFlight()
+caption_flights = SingleFlight()
+
+METADATA_YDL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'extract_flat': False,
+    'writesubtitles': False,
+    'writeautomaticsub': False,
+    # Optimize for speed - only get essential metadata
+    'skip_download': True,
+    'no_check_certificate': True,
+    'socket_timeout': 10,  # Reduce timeout
+    'retries': 1,  # Reduce retries
+}
+
+# yt-dlp option profiles; each extraction worker keeps one warm YoutubeDL per profile
+YDL_PROFILES = {
+    'metadata': METADATA_YDL_OPTS,
+    'flat': {
         'quiet': True,
         'no_warnings': True,
-        'extract_flat': False,
-        'writesubtitles': False,
-        'writeautomaticsub': False,
-        # Optimize for speed - only get essential metadata
+        'extract_flat': True,
+        'socket_timeout': 15
+    },
+    'download': {
+        'quiet': False,  # Enable logging to see what's happening
+        'no_warnings': False,  # Show warnings to debug
+        'socket_timeout': 30,
+        # Try audio formats first (smaller files), then video formats
+        'format': '140/249/250/251/bestaudio[filesize<10M]/best[filesize<10M]/worst',
+    },
+    # /extract-captions-old yt-dlp fallback; each job sets its own subtitleslangs
+    'subtitles': {
+        'writesubtitles': True,
+        'writeautomaticsub': True,
+        'subtitlesformat': 'ttml/vtt/best',
         'skip_download': True,
-        'no_check_certificate': True,
-        'socket_timeout': 10,  # Reduce timeout
-        'retries': 1,  # Reduce retries
-    }
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': False,
+        # Enhanced browser impersonation
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-us,en;q=0.5',
+            'Sec-Fetch-Mode': 'navigate',
+        },
+        'cookiefile': None,
+        'extractor_retries': 2,
+        'fragment_retries': 2,
+        'retry_sleep_functions': {'http': http_retry_sleep},
+    },
+}
+
+# Offline stand-in for YouTube (fake_youtube.py): with FAKE_YOUTUBE_URL set, YouTube URLs are extracted from
+# that stub server, and the caption and media URLs it hands out point there too
+FAKE_YOUTUBE_URL = os.environ.get('FAKE_YOUTUBE_URL')
+fake_extractor = None
+if FAKE_YOUTUBE_URL:
+    # Only imported (and registered with the extraction pool) when asked for
+    from fake_youtube import FakeYouTubeIE as fake_extractor
+    print(f"Using the fake YouTube server at {FAKE_YOUTUBE_URL} instead of youtube.com")
+    for options in YDL_PROFILES.values():
+        options['extractor_args'] = {'fakeyoutube': {'server': [FAKE_YOUTUBE_URL]}}
+
+# Extraction runs in a bounded pool of worker processes (EXTRACTION_WORKERS=0 runs it on the request thread)
+EXTRACTION_DOWNLOAD_TIMEOUT = float(os.environ.get('EXTRACTION_DOWNLOAD_TIMEOUT', 300))
+
+# /test-download verifies by streaming unless asked for a real file; DOWNLOAD_MAX_MB=0 streams everything
+DOWNLOAD_VERIFY_MODE = os.environ.get('DOWNLOAD_VERIFY_MODE', 'stream')
+DOWNLOAD_MAX_BYTES = int(float(os.environ.get('DOWNLOAD_MAX_MB', 0)) * 1024 * 1024)
+
+# Disk downloads run in per-request directories under here; leftovers of crashed workers are swept
+DOWNLOAD_SCRATCH_DIR = os.environ.get('DOWNLOAD_SCRATCH_DIR', os.path.join(CACHE_DIR, 'scratch'))
+
+# Background download jobs; their state files are shared by all workers in the pod
+download_jobs = JobManager(
+    os.path.join(CACHE_DIR, 'jobs'),
+    max_running=int(os.environ.get('JOB_WORKERS', 4)),
+    max_queued=int(os.environ.get('JOB_QUEUE_SIZE', 16)),
+    max_records=int(os.environ.get('JOB_MAX_RECORDS', 200)),
+    retention=float(os.environ.get('JOB_RETENTION', 3600))
+)
+# /extract-captions-old fetches and returns VTT or TTML as is, whichever YouTube lists first
+OLD_CAPTION_EXTS = frozenset(('vtt', 'ttml'))
+
+# Caption encodings fetched for output that is parsed anyway ("cues", "text"), most preferred first: YouTube's
+# json3/srv3 are several times smaller than VTT/TTML on the wire (see caption_fetch_exts for the other formats)
+CAPTION_FORMAT_PREFERENCE = [ext.strip() for ext in os.environ.get('CAPTION_FORMAT_PREFERENCE', 'srv3,json3,vtt,ttml').split(',')
+                             if ext.strip() in PARSEABLE_EXTS]
+# Format returned when the client does not ask for one: what these tracks were always served as
+LEGACY_CAPTION_FORMATS = {'manual': 'vtt', 'auto': 'ttml'}
+
+# POST /extract-captions/batch: URLs per request, URLs one batch works on at once, and across all batches
+BATCH_MAX_URLS = int(os.environ.get('BATCH_MAX_URLS', 500))
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 8))
+BATCH_GLOBAL_CONCURRENCY = int(os.environ.get('BATCH_GLOBAL_CONCURRENCY', 16))
+batch_slots = threading.BoundedSemaphore(BATCH_GLOBAL_CONCURRENCY)
+
+extraction_pool = ExtractionPool(
+    YDL_PROFILES,
+    max_workers=int(os.environ.get('EXTRACTION_WORKERS', 2)),
+    max_queue=int(os.environ.get('EXTRACTION_QUEUE_SIZE', 16)),
+    job_timeout=float(os.environ.get('EXTRACTION_JOB_TIMEOUT', 60)),
+    max_jobs_per_worker=int(os.environ.get('EXTRACTION_JOBS_PER_WORKER', 50)),
+    extractor=fake_extractor,
+    observer=metrics.record_extraction_pool
+)
+
+def resolve_ytdlp_version():
+    """yt-dlp version, resolved once at startup"""
+    try:
+        return yt_dlp.version.__version__
+    except AttributeError:
+        # Fallback for newer versions
+        try:
+            return subprocess.check_output(['yt-dlp', '--version'], text=True).strip()
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Could not determine yt-dlp version: {e}")
+            return 'unknown'
+
+YTDLP_VERSION = resolve_ytdlp_version()
+
+# /ytdlp-info self-test: a live extraction of a known video, re-run in the background every
+# SELF_TEST_INTERVAL seconds (0 disables the refresher; ?refresh=1 still runs it on demand)
+SELF_TEST_URL = os.environ.get('SELF_TEST_URL', 'https://www.youtube.com/watch?v=dQw4w9WgXcQ')  # Rick Roll - always available
+SELF_TEST_INTERVAL = float(os.environ.get('SELF_TEST_INTERVAL', 600))
+
+def run_extraction_self_test():
+    try:
+        info = extraction_pool.extract(SELF_TEST_URL, 'flat')
+        return {'test_extraction': 'success', 'test_video_title': info.get('title', 'Unknown')}
+    except Exception as e:
+        return {'test_extraction': f"error: {str(e)}", 'test_video_title': None}
+
+# The last result is shared through a small cache so the workers of a pod take turns checking
+ytdlp_self_test = SelfTest(run_extraction_self_test, SELF_TEST_INTERVAL,
+                           store=build_cache('selftest', 64 * 1024, max(1, int(SELF_TEST_INTERVAL))))
+
+@app.before_request
+def start_self_test():
+    # Started by the first request a process serves, so merely importing the app checks nothing
+    ytdlp_self_test.start()
+
+def _ttl_before_expiry(expires_at):
+    """METADATA_CACHE_TTL, capped so an entry expires before the signed URLs it contains"""
+    ttl = METADATA_CACHE_TTL
+    if expires_at is not None:
+        remaining = expires_at - time.time() - SIGNED_URL_SAFETY_MARGIN
+        return max(0, min(ttl, int(remaining)))
+    return ttl
+
+def _metadata_ttl(metadata):
+    return _ttl_before_expiry(metadata.caption_expiry())
+
+def get_video_metadata_cached(url):
+    """Cached video metadata (a VideoMetadata record) shared by all metadata and caption endpoints"""
+    cache_key = video_key(url)
+    info = metadata_cache.get(cache_key)
+    metrics.record_cache_lookup('metadata', info is not None)
+    if info is not None:
+        print(f"Metadata cache hit for {cache_key}")
+        return info
+
+    # Concurrent requests for the same video wait on a single yt-dlp extraction
+    return metadata_flights.do(cache_key, _extract_and_cache_metadata, url, cache_key)
+
+def _extract_and_cache_metadata(url, cache_key):
+    metadata = extraction_pool.metadata(url, 'metadata')
+    metadata_cache.set(cache_key, metadata, ttl=_metadata_ttl(metadata))
+    return metadata
+
+def get_download_info(url):
+    """Info dict with just the download profile's selected formats, cached until their media URLs near expiry
+
+    A warm download test therefore only fetches the media. A cold one extracts once, and
+    the same extraction seeds the metadata cache.
+    """
+    cache_key = video_key(url)
+    info = download_info_cache.get(cache_key)
+    metrics.record_cache_lookup('downloads', info is not None)
+    if info is not None:
+        print(f"Download info cache hit for {cache_key}")
+        return info
+    return metadata_flights.do(f'{cache_key}|download', _extract_download_info, url, cache_key)
+
+def _extract_download_info(url, cache_key):
+    metadata, info = extraction_pool.run(download_info_job, url, 'download')
+    metadata_cache.set(cache_key, metadata, ttl=_metadata_ttl(metadata))
+    download_info_cache.set(cache_key, info, ttl=_ttl_before_expiry(download_info_expiry(info)))
+    return info
+
+BROWSER_CAPTION_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/vtt,application/ttml+xml,text/plain,*/*',
+    'Accept-Language': 'en-US,en;q=0.9,es;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Cache-Control': 'no-cache',
+    'Connection': 'keep-alive',
+    'DNT': '1',
+    'Pragma': 'no-cache',
+    'Sec-Ch-Ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
+    'Sec-Ch-Ua-Mobile': '?0',
+    'Sec-Ch-Ua-Platform': '"macOS"',
+    'Sec-Fetch-Dest': 'empty',
+    'Sec-Fetch-Mode': 'cors',
+    'Sec-Fetch-Site': 'same-origin',
+    'X-Client-Data': 'CIe2yQEIorbJAQipncoBCMDdygEIlaHLAQiHoM0BCLnIzQEY9snNAQ==',
+    'X-Youtube-Client-Name': '1',
+    'X-Youtube-Client-Version': '2.20231214.01.00'
+}
+
+CAPTION_FETCH_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'application/json,text/xml,text/vtt,application/ttml+xml,text/plain,*/*',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+def caption_track_key(track, cache_key):
+    return f"{cache_key}|{track['type']}|{track['language']}|{track['ext']}"
+
+def fetch_caption_track(track, video_id, cache_key):
+    """Fetch a caption track body via the caption cache, coalescing concurrent fetches of the same track"""
+    track_key = caption_track_key(track, cache_key)
+    content = caption_cache.get(track_key)
+    metrics.record_cache_lookup('captions', content is not None)
+    if content is not None:
+        return content
+    return caption_flights.do(track_key, _fetch_caption_body, track['url'], video_id, track_key)
+
+def needs_conversion(track, output_format):
+    return output_format not in ('raw', track['ext'])
+
+def cached_caption_cues(track, cache_key):
+    """Canonical (parsed) form of a track if cached; with it the track body need not be fetched at all"""
+    cues = caption_cache.get(f"{caption_track_key(track, cache_key)}|cues")
+    metrics.record_cache_lookup('caption_cues', cues is not None)
+    return cues
+
+def convert_captions(track, content, cues, output_format, cache_key):
+    """Render a track in output_format from its cached cues, or parse (and cache) the fetched body first"""
+    if cues is None:
+        # Only YouTube's WebVTT auto-captions scroll; json3/srv3 events already hold just the new words
+        cues = parse_captions(content, track['ext'], rolling=track['type'] == 'auto' and track['ext'] == 'vtt')
+        caption_cache.set(f"{caption_track_key(track, cache_key)}|cues", cues)
+    return render_captions(cues, output_format, track['language'])
+
+def _fetch_caption_body(caption_url, video_id, track_key):
+    headers = dict(CAPTION_FETCH_HEADERS, Referer=f'https://www.youtube.com/watch?v={video_id}')
+    response = http_client.get(caption_url, headers=headers)
+    
+    if not response.ok:
+        raise Exception(f"Failed to fetch captions: HTTP {response.status_code}")
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        return ydl.extract_info(url, download=False)
+    if response.text.strip():
+        caption_cache.set(track_key, response.text)
+    return response.text
+
+@app.route('/cache-stats')
+def cache_stats():
+    """Report cache occupancy and hit/miss/eviction counters, connection reuse and request coalescing counters"""
+    return jsonify({
+        'metadata_cache': metadata_cache.stats(),
+        'caption_cache': caption_cache.stats(),
+        'download_info_cache': download_info_cache.stats(),
+        'http_pool': http_client.stats(),
+        'hedging': hedged_fetcher.stats(),
+        'extraction_pool': extraction_pool.stats(),
+        'jobs': download_jobs.stats(),
+        'self_test': ytdlp_self_test.stats(),
+        'singleflight': {
+            'metadata': metadata_flights.stats(),
+            'captions': caption_flights.stats()
+        },
+        'timestamp': datetime.now().isoformat()
+    })
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint, aggregated across all gunicorn workers"""
+    body, content_type = metrics.render_latest()
+    return Response(body, content_type=content_type)
 
 @app.route('/extract-captions-old', methods=['POST'])
 def extract_captions_old():
@@ -1298,6 +1713,7 @@ def extract_captions_old():
         metadata_start = time.time()
         info = get_video_metadata_cached(url)
         metadata_time = time.time() - metadata_start
+        metrics.observe_phase('extract-captions-old', 'metadata', metadata_time)
         print(f"Metadata extraction took: {metadata_time:.2f}s")
         
         if not info:
@@ -1307,80 +1723,44 @@ def extract_captions_old():
                 'timestamp': datetime.now().isoformat()
             }), 500
         
-        video_id = info.get('id', 'unknown')
-        default_language = info.get('language') or info.get('language_code')
+        video_id = info.id or 'unknown'
+        default_language = info.language
         
         print(f"Default language for video {video_id}: {default_language}")
         
-        # Get caption data
-        manual_captions = info.get('subtitles', {})
-        auto_captions = info.get('automatic_captions', {})
-        
-        # Optimize caption track processing - limit to top 3 languages for speed
-        available_tracks = []
-        processed_count = 0
-        for lang, tracks in manual_captions.items():
-            if processed_count >= 3:  # Reduced from 5 to 3 for speed
-                break
-            for track in tracks:
-                if track.get('ext') in ['vtt', 'ttml']:  # Accept both VTT and TTML for manual captions
-                    available_tracks.append({
-                        'language': lang,
-                        'type': 'manual',
-                        'url': track['url'],
-                        'ext': track['ext']
-                    })
-                    processed_count += 1
-                    break
+        # Caption tracks indexed once per cached record (language-prefix trie per type)
+        index = info.track_index
+        
+        # Optimize caption track processing - limit to top 3 manual languages for speed
+        available_tracks = index.select('manual', OLD_CAPTION_EXTS)[:3]
         
         # Add auto captions - prioritize English first
         if len(available_tracks) < 5:  # Increased limit to include more options
-            # First, add English auto captions if available
-            english_langs = [lang for lang in auto_captions.keys() if lang.startswith('en')]
-            for lang in english_langs:
-                if len(available_tracks) >= 5:
-                    break
-                tracks = auto_captions[lang]
-                for track in tracks:
-                    if track.get('ext') in ['ttml', 'vtt']:
-                        available_tracks.append({
-                            'language': lang,
-                            'type': 'auto',
-                            'url': track['url'],
-                            'ext': track['ext']
-                        })
-                        break
+            available_tracks += index.select('auto', OLD_CAPTION_EXTS, prefix='en')[:5 - len(available_tracks)]
             
             # Then add other languages if we still need more
-            for lang, tracks in auto_captions.items():
-                if len(available_tracks) >= 5:
-                    break
-                if not lang.startswith('en'):  # Skip English as we already added them
-                    for track in tracks:
-                        if track.get('ext') in ['ttml', 'vtt']:
-                            available_tracks.append({
-                                'language': lang,
-                                'type': 'auto',
-                                'url': track['url'],
-                                'ext': track['ext']
-                            })
-                            break
+            other_auto_tracks = (track for track in index.select('auto', OLD_CAPTION_EXTS)
+                                 if not track['language'].startswith('en'))
+            available_tracks += itertools.islice(other_auto_tracks, max(0, 5 - len(available_tracks)))
 
         if not available_tracks:
             return jsonify({
                 'success': False,
                 'error': 'No captions available for this video',
                 'videoId': video_id,
-                'videoTitle': info.get('title', 'Unknown'),
-                'manualCaptionLanguages': list(manual_captions.keys()),
-                'autoCaptionLanguages': list(auto_captions.keys()),
+                'videoTitle': info.title or 'Unknown',
+                'manualCaptionLanguages': index.languages('manual'),
+                'autoCaptionLanguages': index.languages('auto'),
                 'timestamp': datetime.now().isoformat()
             }), 404
         
+        # The candidates get their own small index: every priority below is one lookup
+        candidates = TrackIndex(available_tracks)
+        
         # Determine best language fallback
         if not default_language:
             # Look for English variant
-            english_track = next((track for track in available_tracks if track['language'].startswith('en')), None)
+            english_track = candidates.find('en')
             if english_track:
                 default_language = english_track['language']
         
@@ -1388,26 +1768,22 @@ def extract_captions_old():
         selected_track = None
         
         # First priority: Preferred language auto-generated captions
-        preferred_auto_track = next((track for track in available_tracks 
-                                   if track['language'].startswith(preferred_language) and track['type'] == 'auto'), None)
+        preferred_auto_track = candidates.find(preferred_language, 'auto')
         
         # Second priority: Preferred language manual captions
-        preferred_manual_track = next((track for track in available_tracks 
-                                     if track['language'].startswith(preferred_language) and track['type'] == 'manual'), None)
+        preferred_manual_track = candidates.find(preferred_language, 'manual')
         
         # Third priority: English auto-generated (if preferred language is not English)
         english_auto_track = None
         english_manual_track = None
         if preferred_language != 'en':
-            english_auto_track = next((track for track in available_tracks 
-                                     if track['language'].startswith('en') and track['type'] == 'auto'), None)
-            english_manual_track = next((track for track in available_tracks 
-                                       if track['language'].startswith('en') and track['type'] == 'manual'), None)
+            english_auto_track = candidates.find('en', 'auto')
+            english_manual_track = candidates.find('en', 'manual')
         
         # Fourth priority: Default language (if different from preferred and English)
         default_track = None
         if default_language and not default_language.startswith(preferred_language) and not default_language.startswith('en'):
-            default_track = next((track for track in available_tracks if track['language'] == default_language), None)
+            default_track = candidates.find(default_language, exact=True)
         
         # Selection priority
         selected_track = (preferred_auto_track or preferred_manual_track or 
@@ -1438,101 +1814,59 @@ def extract_captions_old():
             if url_match:
                 original_lang = url_match.group(1)
                 # Find track in original language without translation
-                original_track = next((track for track in available_tracks 
-                                     if track['language'] == original_lang and 'tlang=' not in track.get('url', '')), None)
-                if original_track:
+                original_track = candidates.find(original_lang, exact=True)
+                if original_track and 'tlang=' not in original_track.get('url', ''):
                     fallback_tracks.append(("original_language", original_track))
         
         # Fallback 2: Manual captions in preferred language (higher quality)
-        if preferred_manual_track and preferred_manual_track != selected_track:
+        if preferred_manual_track and preferred_manual_track is not selected_track:
             fallback_tracks.append(("preferred_manual", preferred_manual_track))
         
         # Fallback 3: English captions (most reliable)
-        if english_manual_track and english_manual_track != selected_track:
+        if english_manual_track and english_manual_track is not selected_track:
             fallback_tracks.append(("english_manual", english_manual_track))
-        if english_auto_track and english_auto_track != selected_track:
+        if english_auto_track and english_auto_track is not selected_track:
             fallback_tracks.append(("english_auto", english_auto_track))
         
         # Fallback 4: Any manual captions (higher quality than auto)
-        manual_tracks = [track for track in available_tracks 
-                        if track['type'] == 'manual' and track not in [t[1] for t in fallback_tracks]]
+        queued = {id(track) for _, track in fallback_tracks}
+        manual_tracks = [track for track in candidates.select('manual') if id(track) not in queued]
         for track in manual_tracks[:2]:  # Limit to 2 additional manual tracks
             fallback_tracks.append(("manual_fallback", track))
         
         # Fallback 5: Default language without translation
-        if default_track and default_track != selected_track:
+        if default_track and default_track is not selected_track:
             fallback_tracks.append(("default_language", default_track))
         
         fetch_start = time.time()
         
-        # Try each fallback track
-        for attempt_name, track in fallback_tracks:
-            if caption_content:  # Stop if we got content
-                break
-                
-            try:
-                print(f"Attempting {attempt_name} caption fetch for track: {track['language']} ({track['type']})")
-                
-                # Enhanced headers to mimic real browser behavior
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'text/vtt,application/ttml+xml,text/plain,*/*',
-                    'Accept-Language': 'en-US,en;q=0.9,es;q=0.8',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Cache-Control': 'no-cache',
-                    'Connection': 'keep-alive',
-                    'DNT': '1',
-                    'Pragma': 'no-cache',
-                    'Referer': f'https://www.youtube.com/watch?v={video_id}',
-                    'Sec-Ch-Ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
-                    'Sec-Ch-Ua-Mobile': '?0',
-                    'Sec-Ch-Ua-Platform': '"macOS"',
-                    'Sec-Fetch-Dest': 'empty',
-                    'Sec-Fetch-Mode': 'cors',
-                    'Sec-Fetch-Site': 'same-origin',
-                    'X-Client-Data': 'CIe2yQEIorbJAQipncoBCMDdygEIlaHLAQiHoM0BCLnIzQEY9snNAQ==',
-                    'X-Youtube-Client-Name': '1',
-                    'X-Youtube-Client-Version': '2.20231214.01.00'
-                }
-                
-                # Create a session to maintain cookies and connection
-                session = requests.Session()
-                session.headers.update(headers)
-                
-                # Progressive delay for rate limiting - longer delays for translation attempts
-                import random
-                if 'tlang=' in track.get('url', ''):
-                    # Longer delay for translated captions
-                    delay = random.uniform(2.0, 4.0)
-                    print(f"Using extended delay ({delay:.1f}s) for translated caption attempt")
-                else:
-                    delay = random.uniform(0.5, 1.5)
-                time.sleep(delay)
-                
-                caption_response = session.get(track['url'], timeout=15)
-                if caption_response.status_code == 200 and caption_response.text.strip():
-                    caption_content = caption_response.text
-                    fetch_time = time.time() - fetch_start
-                    print(f"Successfully fetched {len(caption_content)} characters via {attempt_name} in {fetch_time:.2f}s")
-                    # Update selected_track to reflect what actually worked
-                    selected_track = track
-                    break
-                else:
-                    error_msg = f"{attempt_name} fetch failed: HTTP {caption_response.status_code}"
-                    print(error_msg)
-                    fallback_attempts.append(error_msg)
-                    
-                    # If we get 429 (rate limit), try longer delay before next attempt
-                    if caption_response.status_code == 429:
-                        print("Rate limit detected, adding extra delay before next attempt")
-                        time.sleep(random.uniform(3.0, 6.0))
-                        
-            except Exception as e:
-                error_msg = f"{attempt_name} fetch error: {str(e)}"
-                print(error_msg)
-                fallback_attempts.append(error_msg)
-                if not caption_fetch_error:
-                    caption_fetch_error = error_msg
+        # Enhanced headers to mimic real browser behavior
+        headers = dict(BROWSER_CAPTION_HEADERS, Referer=f'https://www.youtube.com/watch?v={video_id}')
+        
+        # Hedged fetch: primary first, next-best fallback launched whenever the hedge delay
+        # passes without an answer (or an attempt fails), first good body wins
+        candidate_names = ', '.join(f"{name}={track['language']} ({track['type']})" for name, track in fallback_tracks)
+        print(f"Hedged caption fetch over {len(fallback_tracks)} candidates: {candidate_names}")
+        winner_index, body, attempt_errors = hedged_fetcher.fetch_first(
+            [(attempt_name, track['url']) for attempt_name, track in fallback_tracks],
+            headers=headers,
+            hedge_delay=CAPTION_HEDGE_DELAY,
+            max_parallel=CAPTION_HEDGE_MAX_PARALLEL
+        )
+        metrics.observe_phase('extract-captions-old', 'caption_fetch', time.time() - fetch_start)
+        for error_msg in attempt_errors:
+            print(error_msg)
+            fallback_attempts.append(error_msg)
+            if not caption_fetch_error and ' fetch error: ' in error_msg:
+                caption_fetch_error = error_msg
+        
+        if winner_index is not None:
+            attempt_name, track = fallback_tracks[winner_index]
+            caption_content = body
+            fetch_time = time.time() - fetch_start
+            print(f"Successfully fetched {len(caption_content)} characters via {attempt_name} in {fetch_time:.2f}s")
+            # Update selected_track to reflect what actually worked
+            selected_track = track
         
         # Enhanced yt-dlp fallback if all direct attempts failed
         if not caption_content:
@@ -1554,79 +1888,56 @@ def extract_captions_old():
                         
                     print(f"yt-dlp strategy {strategy_idx + 1}: languages {subtitle_langs}")
                     
-                    ydl_opts = {
-                        'writesubtitles': True,
-                        'writeautomaticsub': True,
-                        'subtitleslangs': subtitle_langs,
-                        'subtitlesformat': 'ttml/vtt/best',
-                        'skip_download': True,
-                        'quiet': True,
-                        'no_warnings': True,
-                        'extract_flat': False,
-                        # Enhanced browser impersonation
-                        'http_headers': {
-                            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                            'Accept-Language': 'en-us,en;q=0.5',
-                            'Sec-Fetch-Mode': 'navigate',
-                        },
-                        'cookiefile': None,
-                        'extractor_retries': 2,
-                        'fragment_retries': 2,
-                        'retry_sleep_functions': {'http': lambda n: min(3 ** n, 30)},
-                    }
-                    
                     try:
-                        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                            info_dict = ydl.extract_info(url, download=False)
-                            
-                            if 'requested_subtitles' in info_dict and info_dict['requested_subtitles']:
-                                for lang, sub_info in info_dict['requested_subtitles'].items():
-                                    if sub_info and 'data' in sub_info:
-                                        caption_content = sub_info['data']
-                                        fallback_time = time.time() - fallback_start
-                                        print(f"Successfully extracted {len(caption_content)} characters via yt-dlp strategy {strategy_idx + 1} in {fallback_time:.2f}s")
-                                        break
-                                    elif sub_info and 'url' in sub_info:
-                                        try:
-                                            session = requests.Session()
-                                            session.headers.update(headers)
-                                            resp = session.get(sub_info['url'], timeout=15)
-                                            if resp.status_code == 200:
-                                                caption_content = resp.text
-                                                fallback_time = time.time() - fallback_start
-                                                print(f"Successfully fetched {len(caption_content)} characters via yt-dlp URL strategy {strategy_idx + 1} in {fallback_time:.2f}s")
-                                                break
-                                        except Exception as url_e:
-                                            print(f"yt-dlp URL fetch failed: {url_e}")
-                            
-                            if caption_content:
-                                break
-                                
+                        # Same worker pool, admission limit and timeout as every other extraction
+                        requested_subtitles = extraction_pool.run(subtitles_job, url, 'subtitles',
+                                                                  overrides={'subtitleslangs': subtitle_langs})
+                    except ExtractionQueueFull as strategy_e:
+                        print(f"yt-dlp strategy {strategy_idx + 1} not admitted: {str(strategy_e)}")
+                        break
                     except Exception as strategy_e:
                         print(f"yt-dlp strategy {strategy_idx + 1} failed: {str(strategy_e)}")
                         continue
+                    
+                    for lang, sub_info in requested_subtitles.items():
+                        if sub_info['data']:
+                            caption_content = sub_info['data']
+                            fallback_time = time.time() - fallback_start
+                            print(f"Successfully extracted {len(caption_content)} characters via yt-dlp strategy {strategy_idx + 1} in {fallback_time:.2f}s")
+                            break
+                        elif sub_info['url']:
+                            try:
+                                resp = http_client.get(sub_info['url'], headers=headers)
+                                if resp.status_code == 200:
+                                    caption_content = resp.text
+                                    fallback_time = time.time() - fallback_start
+                                    print(f"Successfully fetched {len(caption_content)} characters via yt-dlp URL strategy {strategy_idx + 1} in {fallback_time:.2f}s")
+                                    break
+                            except Exception as url_e:
+                                print(f"yt-dlp URL fetch failed: {url_e}")
                         
             except Exception as fallback_e:
                 print(f"yt-dlp fallback failed: {str(fallback_e)}")
                 if not caption_fetch_error:
                     caption_fetch_error = f"yt-dlp fallback failed: {str(fallback_e)}"
+            metrics.observe_phase('extract-captions-old', 'ytdlp_fallback', time.time() - fallback_start)
         
         total_time = time.time() - start_time
+        metrics.observe_phase('extract-captions-old', 'total', total_time)
         print(f"Total caption extraction time: {total_time:.2f}s")
         
         # Return result
         result = {
             'success': True,
             'videoId': video_id,
-            'videoTitle': info.get('title', 'Unknown'),
-            'videoDuration': info.get('duration', 0),
+            'videoTitle': info.title or 'Unknown',
+            'videoDuration': info.duration or 0,
             'defaultLanguage': default_language,
             'selectedTrack': selected_track,
             'selectedCaptions': caption_content,
             'availableTracks': available_tracks,
-            'manualCaptionCount': len(manual_captions),
-            'autoCaptionCount': len(auto_captions),
+            'manualCaptionCount': len(index.languages('manual')),
+            'autoCaptionCount': len(index.languages('auto')),
             'processingTime': f"{total_time:.2f}s",
             'approach': 'enhanced',
             'timestamp': datetime.now().isoformat()
@@ -1646,6 +1957,7 @@ def extract_captions_old():
         
     except Exception as e:
         total_time = time.time() - start_time
+        metrics.observe_phase('extract-captions-old', 'total', total_time)
         print(f"Caption extraction failed after {total_time:.2f}s: {str(e)}")
         return jsonify({
             'success': False,
@@ -1720,13 +2032,84 @@ def api_docs():
                     'service': 'yt-dlp-test'
                 }
             },
+            'GET /metrics': {
+                'description': 'Prometheus scrape endpoint aggregated over all workers: http_requests_total, http_request_duration_seconds, http_requests_in_flight, ytdlp_phase_duration_seconds (metadata, caption_fetch, ytdlp_fallback, total), ytdlp_cache_lookups_total, ytdlp_upstream_throttled_total, ytdlp_extraction_jobs_in_flight, ytdlp_extraction_queue_depth',
+                'response_type': 'text/plain (Prometheus exposition format)'
+            },
+            'POST /jobs/download': {
+                'description': 'Start a download test in the background (same options and result as /test-download) and return a job ID immediately',
+                'request_body': {'url': 'YouTube URL', 'mode': '"stream" or "disk" (optional)', 'max_mb': 'Byte cap in MB (optional)'},
+                'response_type': 'JSON (HTTP 202)',
+                'example_response': {
+                    'success': True,
+                    'job_id': '3f2a9c0e8b7d4e1f9a6b5c4d3e2f1a0b',
+                    'status': 'queued',
+                    'status_url': '/jobs/3f2a9c0e8b7d4e1f9a6b5c4d3e2f1a0b'
+                }
+            },
+            'GET /jobs/<job_id>': {
+                'description': 'Job status (queued, running, cancelling, finished, failed, cancelled) with live progress; includes the /test-download result once finished',
+                'response_type': 'JSON',
+                'example_response': {
+                    'success': True,
+                    'job_id': '3f2a9c0e8b7d4e1f9a6b5c4d3e2f1a0b',
+                    'status': 'running',
+                    'progress': {'status': 'downloading', 'downloaded_bytes': 7340032, 'total_bytes': 241672132, 'speed': 2411724.8, 'eta': 97}
+                }
+            },
+            'DELETE /jobs/<job_id>': {
+                'description': 'Cancel a queued or running job; deleting a finished job removes its record',
+                'response_type': 'JSON'
+            },
+            'GET /cache-stats': {
+                'description': 'Metadata/caption cache occupancy and hit/miss/eviction counters, HTTP connection reuse, upstream rate limits and request coalescing counters',
+                'response_type': 'JSON',
+                'example_response': {
+                    'metadata_cache': {
+                        'backend': 'tiered',
+                        'hits': 340,
+                        'misses': 12,
+                        'hit_ratio': 0.9659,
+                        'local': {'backend': 'memory', 'entries': 12, 'bytes': 5242880, 'hits': 310, 'misses': 42, 'evictions': 0},
+                        'shared': {'backend': 'sqlite', 'entries': 40, 'bytes': 9437184, 'hits': 30, 'misses': 12, 'evictions': 0}
+                    },
+                    'caption_cache': {
+                        'backend': 'tiered',
+                        'hits': 120,
+                        'misses': 15,
+                        'hit_ratio': 0.8889
+                    },
+                    'http_pool': {
+                        'requests_sent': 135,
+                        'request_errors': 0,
+                        'connections_opened': 4,
+                        'connections_reused': 131,
+                        'reuse_ratio': 0.9704,
+                        'hosts': {'https://www.youtube.com:443': {'connections_opened': 4, 'requests': 135, 'idle_connections': 4}},
+                        'rate_limits': {
+                            'www.youtube.com': {'acquired': 135, 'timeouts': 0, 'wait_seconds': 12.4, 'throttled': 2, 'rate_decreases': 1, 'rate': 3.4}
+                        }
+                    },
+                    'hedging': {'launched': 48, 'hedges': 21, 'wins_by_hedge': 6, 'cancelled': 9, 'per_host_limit': 8},
+                    'extraction_pool': {'mode': 'process', 'workers': 2, 'in_flight': 3, 'queue_depth': 1, 'submitted': 40,
+                                        'completed': 36, 'failed': 1, 'rejected': 0, 'timeouts': 0, 'pool_restarts': 0,
+                                        'avg_queue_wait_seconds': 0.21, 'avg_run_seconds': 1.84},
+                    'singleflight': {
+                        'metadata': {'in_flight': 1, 'waiting': 4, 'leaders': 12, 'coalesced': 57, 'failures': 0},
+                        'captions': {'in_flight': 0, 'waiting': 0, 'leaders': 15, 'coalesced': 31, 'failures': 1}
+                    }
+                }
+            },
             'GET /ytdlp-info': {
-                'description': 'Get yt-dlp version and capabilities',
+                'description': 'Get yt-dlp version and the last background self-test extraction (re-run every SELF_TEST_INTERVAL seconds)',
+                'query_params': {'refresh': 'Optional; 1 re-runs the self-test before answering'},
                 'response_type': 'JSON',
                 'example_response': {
                     'yt-dlp_version': '2025.09.05',
                     'test_extraction': 'success',
                     'test_video_title': 'Rick Astley - Never Gonna Give You Up',
+                    'test_checked_at': '2025-09-12T10:15:02.511204',
+                    'test_age_seconds': 212.4,
                     'capabilities': {
                         'extract_info': True,
                         'download': True,
@@ -1751,8 +2134,12 @@ def api_docs():
                 }
             },
             'POST /test-download': {
-                'description': 'Download video content to memory for testing',
-                'request_body': {'url': 'YouTube URL'},
+                'description': 'Download test: streams the selected format through a byte counter and SHA-256 hash without touching disk (mode "stream", default), or lets yt-dlp write the file (mode "disk")',
+                'request_body': {
+                    'url': 'YouTube URL',
+                    'mode': '"stream" or "disk" (optional, defaults to DOWNLOAD_VERIFY_MODE)',
+                    'max_mb': 'Stop a streamed download after this many MB (optional, defaults to DOWNLOAD_MAX_MB)'
+                },
                 'response_type': 'JSON',
                 'example_request': {
                     'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
@@ -1770,7 +2157,10 @@ def api_docs():
                 'description': 'Extract YouTube video captions/subtitles with simple, fast approach (VTT preferred)',
                 'request_body': {
                     'url': 'YouTube URL (required)',
-                    'language': 'Preferred language code (optional, defaults to "en" for English)'
+                    'language': 'Preferred language code (optional, defaults to "en" for English)',
+                    'format': '"vtt", "ttml", "cues" ([{start_ms, end_ms, text}], auto-caption repeats removed), "text" (plain transcript) '
+                              'or "raw" (the body as YouTube serves it: VTT for manual, TTML for auto captions where listed); optional, '
+                              'defaults to VTT for manual and TTML for auto captions'
                 },
                 'response_type': 'JSON',
                 'example_request': {
@@ -1789,12 +2179,33 @@ def api_docs():
                         'ext': 'vtt'
                     },
                     'selectedCaptions': 'WEBVTT\\n\\n00:00:00.000 --> 00:00:03.000\\nNever gonna give you up...',
+                    'captionFormat': 'vtt',
                     'availableTracks': [],
                     'manualCaptionCount': 0,
                     'autoCaptionCount': 12,
                     'approach': 'simple'
                 }
             },
+            'POST /extract-captions/batch': {
+                'description': 'Caption extraction for many URLs: deduplicated by video ID and language, run concurrently, '
+                               'and streamed back as NDJSON (one /extract-captions result per line as it completes, then a summary line)',
+                'request_body': {
+                    'urls': 'List of YouTube URLs, or {"url": ..., "language": ...} objects (required)',
+                    'language': 'Default preferred language code (optional, defaults to "en")',
+                    'format': 'Caption format for every result, as in /extract-captions (optional)',
+                    'concurrency': f'Videos extracted at once (optional, at most {BATCH_CONCURRENCY})'
+                },
+                'response_type': 'NDJSON (application/x-ndjson)',
+                'example_request': {
+                    'urls': ['https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'https://youtu.be/dQw4w9WgXcQ'],
+                    'language': 'en'
+                },
+                'example_response': [
+                    {'type': 'result', 'url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'videoKey': 'youtube:dQw4w9WgXcQ',
+                     'inputIndexes': [0, 1], 'httpStatus': 200, 'success': True, 'videoId': 'dQw4w9WgXcQ', 'selectedCaptions': 'WEBVTT...'},
+                    {'type': 'summary', 'requested': 2, 'unique': 1, 'succeeded': 1, 'failed': 0, 'processingTime': '1.84s'}
+                ]
+            },
             'POST /extract-captions-old': {
                 'description': 'Extract YouTube video captions/subtitles with enhanced fallback logic and rate limit handling',
                 'request_body': {
@@ -1871,182 +2282,312 @@ def api_docs():
     
     return jsonify(docs)
 
-@app.route('/extract-captions', methods=['POST'])
-def extract_captions():
-    """Extract YouTube video captions/subtitles with simple, fast approach"""
+class CaptionExtractionError(Exception):
+    """A caption extraction that ends in an error response: carries its JSON payload and HTTP status"""
+
+    def __init__(self, payload, status):
+        super().__init__(payload.get('error'))
+        self.payload = payload
+        self.status = status
+
+def caption_fetch_exts(track_type, output_format):
+    """Caption encodings to fetch for output_format, most preferred first
+
+    Formats YouTube serves itself (the default VTT/TTML, "raw", or an explicit "vtt"/"ttml") are
+    fetched in that encoding where listed and returned byte for byte, cue settings and all; the
+    compact encodings only come first when the body is parsed anyway.
+    """
+    wanted = LEGACY_CAPTION_FORMATS[track_type] if output_format in (None, 'raw') else output_format
+    if wanted not in PARSEABLE_EXTS:
+        return CAPTION_FORMAT_PREFERENCE
+    return [wanted] + [ext for ext in CAPTION_FORMAT_PREFERENCE if ext != wanted]
+
+def plan_caption_extraction(info, preferred_language, output_format=None):
+    """Pick the caption track to fetch for an extracted video; returns the fields every response shares"""
+    if not info:
+        raise CaptionExtractionError({
+            'success': False,
+            'error': 'Failed to extract video information',
+            'timestamp': datetime.now().isoformat()
+        }, 500)
+    
+    video_id = info.id or 'unknown'
+    default_language = info.language
+    
+    print(f"Default language for video {video_id}: {default_language}")
+    
+    # Caption tracks indexed once per cached record; one track per language, in the first
+    # encoding of caption_fetch_exts() that YouTube lists
+    index = info.track_index
+    
+    # Manual captions first, auto captions only when there are none
+    track_type = 'manual' if index.find(track_type='manual', exts=PARSEABLE_EXTS) else 'auto'
+    exts = caption_fetch_exts(track_type, output_format)
+    caption_tracks = index.select(track_type, exts)
+    
+    if not caption_tracks:
+        raise CaptionExtractionError({
+            'success': False,
+            'error': 'No captions in a supported format (json3, srv3, VTT or TTML) available for this video',
+            'videoId': video_id,
+            'videoTitle': info.title or 'Unknown',
+            'timestamp': datetime.now().isoformat()
+        }, 404)
+    
+    # Attempt to prioritize captions in the default language
+    if not default_language:
+        # Look for English variant
+        english_track = index.find('en', track_type, exts)
+        if english_track:
+            default_language = english_track['language']
+    
+    # Select the best caption track
+    selected_track = None
+    
+    # Priority 1: Default language
+    if default_language:
+        selected_track = index.find(default_language, track_type, exts, exact=True)
+    
+    # Priority 2: Preferred language
+    if not selected_track:
+        selected_track = index.find(preferred_language, track_type, exts)
+    
+    # Priority 3: English
+    if not selected_track:
+        selected_track = index.find('en', track_type, exts)
+    
+    # Priority 4: First available
+    if not selected_track:
+        selected_track = caption_tracks[0]
+    
+    print(f"Selected caption track for {video_id}: {selected_track}")
+    
+    return {
+        'video_id': video_id,
+        'title': info.title or 'Unknown',
+        'duration': info.duration or 0,
+        'default_language': default_language,
+        'tracks': caption_tracks,
+        'selected_track': selected_track,
+        'manual_count': len(index.languages('manual')),
+        'auto_count': len(index.languages('auto'))
+    }
+
+def caption_fetch_error_payload(plan, error):
+    """Error response for a video whose caption track was selected but could not be fetched"""
+    return {
+        'success': False,
+        'error': f'Failed to fetch captions content: {str(error)}',
+        'videoId': plan['video_id'],
+        'videoTitle': plan['title'],
+        'selectedTrack': plan['selected_track'],
+        'availableTracks': plan['tracks'][:10],  # Limit to first 10 for response size
+        'timestamp': datetime.now().isoformat()
+    }
+
+def caption_result_payload(plan, caption_content, total_time, output_format):
+    """Success response for the simple caption extraction"""
+    return {
+        'success': True,
+        'videoId': plan['video_id'],
+        'videoTitle': plan['title'],
+        'videoDuration': plan['duration'],
+        'defaultLanguage': plan['default_language'],
+        'selectedTrack': plan['selected_track'],
+        'selectedCaptions': caption_content,
+        'captionFormat': output_format,
+        'availableTracks': plan['tracks'][:10],  # Limit to first 10 for response size
+        'manualCaptionCount': plan['manual_count'],
+        'autoCaptionCount': plan['auto_count'],
+        'processingTime': f"{total_time:.2f}s",
+        'approach': 'simple',
+        'timestamp': datetime.now().isoformat()
+    }
+
+def caption_exception_payload(error, total_time):
+    return {
+        'success': False,
+        'error': str(error),
+        'processingTime': f"{total_time:.2f}s",
+        'approach': 'simple',
+        'timestamp': datetime.now().isoformat()
+    }
+
+def caption_format_error(output_format):
+    """Error payload for an unknown format, or None when output_format is valid (None picks the default)"""
+    if output_format is None or output_format in CAPTION_FORMATS:
+        return None
+    return {'error': f"format must be one of: {', '.join(CAPTION_FORMATS)}", 'success': False}
+
+def extract_captions_for_url(url, preferred_language='en', output_format=None):
+    """Run the simple caption extraction for one URL and return (payload, http_status)"""
     start_time = time.time()
     try:
-        data = request.get_json()
-        url = data.get('url')
-        preferred_language = data.get('language', 'en')  # Default to English
-        
-        if not url:
-            return jsonify({'error': 'URL is required', 'success': False}), 400
-        
         print(f"Starting simple caption extraction for: {url} (preferred language: {preferred_language})")
         
-        # Single yt-dlp call to get metadata
+        # Single yt-dlp call to get metadata (served from the shared cache when warm)
         metadata_start = time.time()
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-            'writesubtitles': False,
-            'writeautomaticsub': False,
-            'skip_download': True,
-            'no_check_certificate': True,
-            'socket_timeout': 15,
-            'retries': 2,
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+        info = get_video_metadata_cached(url)
         
         metadata_time = time.time() - metadata_start
+        metrics.observe_phase('extract-captions', 'metadata', metadata_time)
         print(f"Metadata extraction took: {metadata_time:.2f}s")
         
-        if not info:
-            return jsonify({
-                'success': False,
-                'error': 'Failed to extract video information',
-                'timestamp': datetime.now().isoformat()
-            }), 500
-        
-        video_id = info.get('id', 'unknown')
-        default_language = info.get('language') or info.get('language_code')
-        
-        print(f"Default language for video {video_id}: {default_language}")
-        
-        # Get caption data
-        manual_captions = info.get('subtitles', {})
-        auto_captions = info.get('automatic_captions', {})
-        
-        # Look for VTT captions in manual captions first
-        vtt_tracks = []
-        for lang, tracks in manual_captions.items():
-            for track in tracks:
-                if track.get('ext') == 'vtt':
-                    vtt_tracks.append({
-                        'language': lang,
-                        'type': 'manual',
-                        'url': track['url'],
-                        'ext': track['ext']
-                    })
-        
-        # If no VTT in manual captions, look for TTML in auto captions
-        if not vtt_tracks:
-            for lang, tracks in auto_captions.items():
-                for track in tracks:
-                    if track.get('ext') == 'ttml':
-                        vtt_tracks.append({
-                            'language': lang,
-                            'type': 'auto',
-                            'url': track['url'],
-                            'ext': track['ext']
-                        })
-        
-        if not vtt_tracks:
-            return jsonify({
-                'success': False,
-                'error': 'No VTT or TTML captions available for this video',
-                'videoId': video_id,
-                'videoTitle': info.get('title', 'Unknown'),
-                'timestamp': datetime.now().isoformat()
-            }), 404
-        
-        # Attempt to prioritize captions in the default language
-        if not default_language:
-            # Look for English variant
-            english_track = next((track for track in vtt_tracks if track['language'].startswith('en')), None)
-            if english_track:
-                default_language = english_track['language']
-        
-        # Select the best caption track
-        selected_track = None
-        
-        # Priority 1: Default language
-        if default_language:
-            selected_track = next((track for track in vtt_tracks if track['language'] == default_language), None)
-        
-        # Priority 2: Preferred language
-        if not selected_track:
-            selected_track = next((track for track in vtt_tracks if track['language'].startswith(preferred_language)), None)
-        
-        # Priority 3: English
-        if not selected_track:
-            selected_track = next((track for track in vtt_tracks if track['language'].startswith('en')), None)
-        
-        # Priority 4: First available
-        if not selected_track:
-            selected_track = vtt_tracks[0]
-        
-        print(f"Selected caption track for {video_id}: {selected_track}")
+        plan = plan_caption_extraction(info, preferred_language, output_format)
         
-        # Fetch the selected caption track
-        fetch_start = time.time()
-        caption_content = ""
+        track = plan['selected_track']
+        output_format = output_format or LEGACY_CAPTION_FORMATS[track['type']]
+        cues = cached_caption_cues(track, video_key(url)) if needs_conversion(track, output_format) else None
+        caption_content = None
         
-        try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/vtt,application/ttml+xml,text/plain,*/*',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Referer': f'https://www.youtube.com/watch?v={video_id}',
-            }
+        # Fetch the selected caption track, unless its parsed form is already cached
+        if cues is None:
+            fetch_start = time.time()
             
-            response = requests.get(selected_track['url'], headers=headers, timeout=15)
-            
-            if not response.ok:
-                raise Exception(f"Failed to fetch captions: HTTP {response.status_code}")
-            
-            caption_content = response.text
-            fetch_time = time.time() - fetch_start
-            print(f"Successfully fetched {len(caption_content)} characters in {fetch_time:.2f}s")
-            
-        except Exception as e:
-            print(f"Failed to fetch captions: {str(e)}")
-            return jsonify({
-                'success': False,
-                'error': f'Failed to fetch captions content: {str(e)}',
-                'videoId': video_id,
-                'videoTitle': info.get('title', 'Unknown'),
-                'selectedTrack': selected_track,
-                'availableTracks': vtt_tracks[:10],  # Limit to first 10 for response size
-                'timestamp': datetime.now().isoformat()
-            }), 500
+            try:
+                caption_content = fetch_caption_track(track, plan['video_id'], video_key(url))
+                fetch_time = time.time() - fetch_start
+                metrics.observe_phase('extract-captions', 'caption_fetch', fetch_time)
+                print(f"Successfully fetched {len(caption_content)} characters ({track['ext']}) in {fetch_time:.2f}s")
+                
+            except Exception as e:
+                print(f"Failed to fetch captions: {str(e)}")
+                return caption_fetch_error_payload(plan, e), 500
+        
+        if needs_conversion(track, output_format):
+            parse_start = time.time()
+            try:
+                caption_content = convert_captions(track, caption_content, cues, output_format, video_key(url))
+            except CaptionParseError as e:
+                return caption_fetch_error_payload(plan, e), 502
+            metrics.observe_phase('extract-captions', 'parse', time.time() - parse_start)
         
         total_time = time.time() - start_time
+        metrics.observe_phase('extract-captions', 'total', total_time)
         print(f"Total simple caption extraction time: {total_time:.2f}s")
         
-        # Return result
-        result = {
-            'success': True,
-            'videoId': video_id,
-            'videoTitle': info.get('title', 'Unknown'),
-            'videoDuration': info.get('duration', 0),
-            'defaultLanguage': default_language,
-            'selectedTrack': selected_track,
-            'selectedCaptions': caption_content,
-            'availableTracks': vtt_tracks[:10],  # Limit to first 10 for response size
-            'manualCaptionCount': len(manual_captions),
-            'autoCaptionCount': len(auto_captions),
-            'processingTime': f"{total_time:.2f}s",
-            'approach': 'simple',
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        return jsonify(result)
+        return caption_result_payload(plan, caption_content, total_time, output_format), 200
         
+    except CaptionExtractionError as e:
+        return e.payload, e.status
+    except ExtractionQueueFull as e:
+        return caption_exception_payload(e, time.time() - start_time), 503
     except Exception as e:
         total_time = time.time() - start_time
+        metrics.observe_phase('extract-captions', 'total', total_time)
         print(f"Simple caption extraction failed after {total_time:.2f}s: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': str(e),
-            'processingTime': f"{total_time:.2f}s",
-            'approach': 'simple',
-            'timestamp': datetime.now().isoformat()
-        }), 500
+        return caption_exception_payload(e, total_time), 500
+
+@app.route('/extract-captions', methods=['POST'])
+def extract_captions():
+    """Extract YouTube video captions/subtitles with simple, fast approach"""
+    try:
+        data = request.get_json()
+        url = data.get('url')
+        preferred_language = data.get('language', 'en')  # Default to English
+        output_format = data.get('format')
+    except Exception as e:
+        return jsonify(caption_exception_payload(e, 0)), 500
+    
+    if not url:
+        return jsonify({'error': 'URL is required', 'success': False}), 400
+    if caption_format_error(output_format):
+        return jsonify(caption_format_error(output_format)), 400
+    
+    payload, status = extract_captions_for_url(url, preferred_language, output_format)
+    return jsonify(payload), status
+
+def plan_caption_batch(data):
+    """Validate a batch request and dedup its URLs by canonical video ID and language
+
+    Returns (entries, requested, concurrency) where each entry is one unit of work:
+    {'url', 'language', 'format', 'videoKey', 'inputIndexes'}. Items are URLs or
+    {"url": ..., "language": ...} objects; the batch-level language is the default.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get('urls'), list) or not data['urls']:
+        raise CaptionExtractionError({'error': 'urls must be a non-empty list', 'success': False}, 400)
+    if len(data['urls']) > BATCH_MAX_URLS:
+        raise CaptionExtractionError({
+            'error': f"Too many URLs: {len(data['urls'])} (at most {BATCH_MAX_URLS} per batch)",
+            'success': False
+        }, 400)
+
+    concurrency = data.get('concurrency', BATCH_CONCURRENCY)
+    if not isinstance(concurrency, int) or concurrency < 1:
+        raise CaptionExtractionError({'error': 'concurrency must be a positive integer', 'success': False}, 400)
+
+    output_format = data.get('format')
+    if caption_format_error(output_format):
+        raise CaptionExtractionError(caption_format_error(output_format), 400)
+
+    default_language = data.get('language', 'en')
+    entries = {}
+    for index, item in enumerate(data['urls']):
+        if isinstance(item, dict):
+            url, language = item.get('url'), item.get('language', default_language)
+        else:
+            url, language = item, default_language
+        if not isinstance(url, str) or not url.strip():
+            raise CaptionExtractionError({'error': f'Item {index} has no URL', 'success': False}, 400)
+        if not is_video_url(url):
+            raise CaptionExtractionError({'error': f'Item {index} is not a video URL: {url!r}', 'success': False}, 400)
+        key = video_key(url)
+        entry = entries.get((key, language))
+        if entry is None:
+            entry = entries[(key, language)] = {'url': url, 'language': language, 'format': output_format,
+                                                'videoKey': key, 'inputIndexes': []}
+        entry['inputIndexes'].append(index)
+    return list(entries.values()), len(data['urls']), min(concurrency, BATCH_CONCURRENCY)
+
+def batch_result_line(entry, payload, status):
+    """One NDJSON line of a batch: the /extract-captions payload tagged with the input it answers"""
+    return dict(payload, type='result', url=entry['url'], language=entry['language'],
+                videoKey=entry['videoKey'], inputIndexes=entry['inputIndexes'], httpStatus=status)
+
+def batch_summary_line(requested, results, total_time):
+    succeeded = sum(1 for line in results if line.get('success'))
+    return {
+        'type': 'summary',
+        'requested': requested,
+        'unique': len(results),
+        'succeeded': succeeded,
+        'failed': len(results) - succeeded,
+        'processingTime': f"{total_time:.2f}s",
+        'timestamp': datetime.now().isoformat()
+    }
+
+def _extract_batch_entry(entry):
+    # The global semaphore caps batch work across all concurrent batches in this worker
+    with batch_slots:
+        payload, status = extract_captions_for_url(entry['url'], entry['language'], entry['format'])
+    return batch_result_line(entry, payload, status)
+
+@app.route('/extract-captions/batch', methods=['POST'])
+def extract_captions_batch():
+    """Extract captions for many URLs, streaming one NDJSON line per video as it completes"""
+    try:
+        entries, requested, concurrency = plan_caption_batch(request.get_json(silent=True))
+    except CaptionExtractionError as e:
+        return jsonify(e.payload), e.status
+
+    print(f"Starting caption batch: {len(entries)} unique of {requested} URLs, concurrency {concurrency}")
+
+    def generate():
+        start_time = time.time()
+        results = []
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch')
+        try:
+            futures = [executor.submit(_extract_batch_entry, entry) for entry in entries]
+            for future in concurrent.futures.as_completed(futures):
+                line = future.result()
+                results.append(line)
+                yield app.json.dumps(line) + '\n'
+            yield app.json.dumps(batch_summary_line(requested, results, time.time() - start_time)) + '\n'
+        finally:
+            # Client gone or batch done: drop whatever has not started yet
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return Response(generate(), mimetype='application/x-ndjson')
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8090))
@@ -0,0 +1,422 @@
+"""
+ASGI entry point: async serving path for the caption and metadata endpoints
+
+POST /extract-captions, POST /extract-captions/batch and POST /test-ytdlp are
+served natively on the event loop: yt-dlp extraction runs on a bounded thread pool
+and caption bodies are fetched with aiohttp, so a request waiting on YouTube costs
+a coroutine, not a thread. Batches stream one NDJSON line per video as it completes.
+Every other route is handed to the Flask app through a WSGI bridge running on its
+own bounded thread pool.
+
+Run with:
+    gunicorn asgi:application -k uvicorn_worker.UvicornWorker
+    uvicorn asgi:application --host 0.0.0.0 --port 8090
+"""
+
+import asyncio
+import concurrent.futures
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import aiohttp
+
+import app as service
+import metrics
+
+EXTRACTION_WORKERS = int(os.environ.get('ASYNC_EXTRACTION_WORKERS', 8))
+WSGI_WORKERS = int(os.environ.get('ASYNC_WSGI_WORKERS', 16))
+ASYNC_HTTP_LIMIT = int(os.environ.get('ASYNC_HTTP_LIMIT', 100))
+ASYNC_HTTP_LIMIT_PER_HOST = int(os.environ.get('ASYNC_HTTP_LIMIT_PER_HOST', 20))
+
+extraction_executor = concurrent.futures.ThreadPoolExecutor(max_workers=EXTRACTION_WORKERS,
+                                                            thread_name_prefix='extract')
+wsgi_executor = concurrent.futures.ThreadPoolExecutor(max_workers=WSGI_WORKERS,
+                                                      thread_name_prefix='wsgi')
+
+
+class LeaderCancelled(Exception):
+    """Handed to coalesced waiters when the request fetching for them was cancelled"""
+
+
+def run_blocking(func, *args):
+    """Run a blocking call (cache, SQLite rate limiter, parsing) on the extraction thread pool"""
+    return asyncio.get_running_loop().run_in_executor(extraction_executor, func, *args)
+
+
+class AsyncCaptionFetcher:
+    """aiohttp caption fetching that shares the caption cache and upstream rate limiter with the sync path"""
+
+    def __init__(self, limit=100, limit_per_host=20, connect_timeout=5.0, read_timeout=15.0):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self._session = None
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                             ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def fetch_track(self, track, video_id, cache_key):
+        """Async counterpart of app.fetch_caption_track: cache first, then one coalesced upstream GET"""
+        track_key = service.caption_track_key(track, cache_key)
+        while True:
+            content = await run_blocking(service.caption_cache.get, track_key)
+            metrics.record_cache_lookup('captions', content is not None)
+            if content is not None:
+                return content
+
+            flight = self._flights.get(track_key)
+            if flight is None:
+                return await self._lead(track_key, track['url'], video_id)
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(flight)
+            except LeaderCancelled:
+                # The leader's client went away; take the fetch over (or follow whoever already did)
+                continue
+
+    async def _lead(self, track_key, caption_url, video_id):
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[track_key] = flight
+        self.leaders += 1
+        try:
+            body = await self._fetch(caption_url, video_id)
+            if body.strip():
+                await run_blocking(service.caption_cache.set, track_key, body)
+            flight.set_result(body)
+            return body
+        except asyncio.CancelledError:
+            # Only this request was cancelled: waiters get an ordinary error and retry themselves
+            flight.set_exception(LeaderCancelled())
+            flight.exception()
+            raise
+        except Exception as e:
+            flight.set_exception(e)
+            flight.exception()  # Mark retrieved so a failure nobody waited on is not logged twice
+            raise
+        finally:
+            del self._flights[track_key]
+
+    async def _fetch(self, caption_url, video_id):
+        # Under RATE_LIMIT_SCOPE=pod reserving a token is a SQLite transaction
+        await asyncio.sleep(await run_blocking(service.upstream_limiter.reserve, caption_url))
+        headers = dict(service.CAPTION_FETCH_HEADERS, Referer=f'https://www.youtube.com/watch?v={video_id}')
+        async with self.session().get(caption_url, headers=headers) as response:
+            await run_blocking(service.upstream_limiter.observe, caption_url, response.status,
+                               response.headers.get('Retry-After'))
+            if response.status >= 400:
+                raise Exception(f"Failed to fetch captions: HTTP {response.status}")
+            return await response.text()
+
+    def stats(self):
+        return {'in_flight': len(self._flights), 'leaders': self.leaders, 'coalesced': self.coalesced}
+
+
+caption_fetcher = AsyncCaptionFetcher(
+    limit=ASYNC_HTTP_LIMIT,
+    limit_per_host=ASYNC_HTTP_LIMIT_PER_HOST,
+    connect_timeout=float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5)),
+    read_timeout=float(os.environ.get('HTTP_READ_TIMEOUT', 15))
+)
+
+
+async def get_video_metadata(url):
+    """Run the (cached, coalesced) yt-dlp metadata extraction on the bounded extraction pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(extraction_executor, service.get_video_metadata_cached, url)
+
+
+async def extract_captions_for_url(url, preferred_language='en', output_format=None):
+    """Async counterpart of app.extract_captions_for_url; returns (payload, http_status)"""
+    start_time = time.time()
+    try:
+        print(f"Starting async caption extraction for: {url} (preferred language: {preferred_language})")
+
+        metadata_start = time.time()
+        info = await get_video_metadata(url)
+        metrics.observe_phase('extract-captions', 'metadata', time.time() - metadata_start)
+        print(f"Metadata extraction took: {time.time() - metadata_start:.2f}s")
+
+        plan = service.plan_caption_extraction(info, preferred_language, output_format)
+
+        track = plan['selected_track']
+        cache_key = service.video_key(url)
+        output_format = output_format or service.LEGACY_CAPTION_FORMATS[track['type']]
+        conversion = service.needs_conversion(track, output_format)
+        cues = await run_blocking(service.cached_caption_cues, track, cache_key) if conversion else None
+        caption_content = None
+
+        if cues is None:
+            fetch_start = time.time()
+            try:
+                caption_content = await caption_fetcher.fetch_track(track, plan['video_id'], cache_key)
+                metrics.observe_phase('extract-captions', 'caption_fetch', time.time() - fetch_start)
+                print(f"Successfully fetched {len(caption_content)} characters ({track['ext']}) "
+                      f"in {time.time() - fetch_start:.2f}s")
+            except Exception as e:
+                print(f"Failed to fetch captions: {str(e)}")
+                return service.caption_fetch_error_payload(plan, e), 500
+
+        if conversion:
+            # Parsing and rendering a long transcript is CPU work: keep it off the event loop
+            parse_start = time.time()
+            try:
+                caption_content = await run_blocking(service.convert_captions, track, caption_content, cues,
+                                                     output_format, cache_key)
+            except service.CaptionParseError as e:
+                return service.caption_fetch_error_payload(plan, e), 502
+            metrics.observe_phase('extract-captions', 'parse', time.time() - parse_start)
+
+        total_time = time.time() - start_time
+        metrics.observe_phase('extract-captions', 'total', total_time)
+        print(f"Total async caption extraction time: {total_time:.2f}s")
+        return service.caption_result_payload(plan, caption_content, total_time, output_format), 200
+
+    except service.CaptionExtractionError as e:
+        return e.payload, e.status
+    except service.ExtractionQueueFull as e:
+        return service.caption_exception_payload(e, time.time() - start_time), 503
+    except Exception as e:
+        total_time = time.time() - start_time
+        metrics.observe_phase('extract-captions', 'total', total_time)
+        print(f"Async caption extraction failed after {total_time:.2f}s: {str(e)}")
+        return service.caption_exception_payload(e, total_time), 500
+
+
+async def handle_extract_captions(data):
+    url = data.get('url')
+    if not url:
+        return {'error': 'URL is required', 'success': False}, 400
+    output_format = data.get('format')
+    if service.caption_format_error(output_format):
+        return service.caption_format_error(output_format), 400
+    return await extract_captions_for_url(url, data.get('language', 'en'), output_format)
+
+
+async def handle_test_ytdlp(data):
+    url = data.get('url')
+    if not url:
+        return {'error': 'URL is required', 'success': False}, 400
+    try:
+        info = await get_video_metadata(url)
+        return service.metadata_payload(info), 200
+    except service.ExtractionQueueFull as e:
+        return {'success': False, 'error': str(e), 'timestamp': datetime.now().isoformat()}, 503
+    except Exception as e:
+        return {'success': False, 'error': str(e), 'timestamp': datetime.now().isoformat()}, 500
+
+
+# Shared by every batch on this worker's event loop (BATCH_GLOBAL_CONCURRENCY)
+batch_slots = asyncio.Semaphore(service.BATCH_GLOBAL_CONCURRENCY)
+
+
+async def extract_batch_entry(entry, batch_limit):
+    async with batch_limit, batch_slots:
+        payload, status = await extract_captions_for_url(entry['url'], entry['language'], entry['format'])
+    return service.batch_result_line(entry, payload, status)
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def handle_extract_captions_batch(data, receive, send):
+    """Stream one NDJSON line per unique video as it completes, then a summary line; returns the status"""
+    try:
+        entries, requested, concurrency = service.plan_caption_batch(data)
+    except service.CaptionExtractionError as e:
+        await send_json(send, e.status, e.payload)
+        return e.status
+
+    print(f"Starting async caption batch: {len(entries)} unique of {requested} URLs, concurrency {concurrency}")
+    start_time = time.time()
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [(b'content-type', b'application/x-ndjson')]
+    })
+
+    batch_limit = asyncio.Semaphore(concurrency)
+    tasks = [asyncio.create_task(extract_batch_entry(entry, batch_limit)) for entry in entries]
+    disconnected = asyncio.create_task(wait_for_disconnect(receive))
+    results = []
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            line = await next_result
+            if disconnected.done():
+                print(f"Client left caption batch after {len(results)} of {len(entries)} results")
+                return 200
+            results.append(line)
+            await send({'type': 'http.response.body', 'body': encode_line(line), 'more_body': True})
+        summary = service.batch_summary_line(requested, results, time.time() - start_time)
+        await send({'type': 'http.response.body', 'body': encode_line(summary)})
+        return 200
+    finally:
+        # Whatever has not finished is abandoned (still-running extractions finish in their threads)
+        for task in tasks + [disconnected]:
+            task.cancel()
+
+
+ASYNC_ROUTES = {
+    ('POST', '/extract-captions'): handle_extract_captions,
+    ('POST', '/test-ytdlp'): handle_test_ytdlp,
+}
+
+# Routes that write their own (streamed) response: handler(data, receive, send) -> status
+STREAMING_ROUTES = {
+    ('POST', '/extract-captions/batch'): handle_extract_captions_batch,
+}
+
+
+async def read_body(receive):
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body.extend(message.get('body', b''))
+        if not message.get('more_body', False):
+            break
+    return bytes(body)
+
+
+async def send_json(send, status, payload):
+    body = service.app.json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def encode_line(payload):
+    return (service.app.json.dumps(payload) + '\n').encode('utf-8')
+
+
+def build_environ(scope, body):
+    """Translate an ASGI HTTP scope into a PEP 3333 environ"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def call_flask(scope, receive, send):
+    """Serve a request with the Flask app on the WSGI thread pool, streaming its body chunks back"""
+    environ = build_environ(scope, await read_body(receive))
+    loop = asyncio.get_running_loop()
+
+    def send_from_thread(message):
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run():
+        response_start = {}
+
+        def start_response(status, headers, exc_info=None):
+            response_start['status'] = int(status.split(' ', 1)[0])
+            response_start['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return lambda data: None
+
+        result = service.app(environ, start_response)
+        try:
+            started = False
+            for chunk in result:
+                if not started:
+                    send_from_thread(dict(type='http.response.start', **response_start))
+                    started = True
+                if chunk:
+                    send_from_thread({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            if not started:
+                send_from_thread(dict(type='http.response.start', **response_start))
+            send_from_thread({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    await loop.run_in_executor(wsgi_executor, run)
+
+
+async def application(scope, receive, send):
+    """ASGI application: async-native caption/metadata routes, everything else via Flask"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                service.ytdlp_self_test.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await caption_fetcher.close()
+                service.extraction_pool.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] != 'http':
+        return
+
+    route = (scope['method'], scope['path'])
+    handler = ASYNC_ROUTES.get(route) or STREAMING_ROUTES.get(route)
+    if handler is None:
+        await call_flask(scope, receive, send)
+        return
+
+    timer = metrics.RequestTimer(scope['path'], scope['method'])
+    status = 500
+    try:
+        body = await read_body(receive)
+        try:
+            data = json.loads(body or b'null')
+            if not isinstance(data, dict):
+                raise ValueError('JSON object expected')
+        except ValueError as e:
+            status = 400
+            await send_json(send, status, {'success': False, 'error': f'Invalid JSON body: {e}'})
+            return
+        if route in STREAMING_ROUTES:
+            status = await handler(data, receive, send)
+            return
+        payload, status = await handler(data)
+        await send_json(send, status, payload)
+    finally:
+        timer.finish(status)
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+yt-dlp Service Micro-Benchmarks
+Measures per-call cost of the service's in-process hot paths on synthetic data
+
+--save-baseline stores the results as JSON; --compare re-runs the same benchmarks
+and exits non-zero when any of them got slower than the baseline by more than
+--threshold. The "service" group imports app.py against an in-process
+fake_youtube server, so no network is needed.
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import timeit
+
+from caching import SQLiteCache, TTLCache, TieredCache
+from caption_parser import parse_captions
+from track_index import TrackIndex
+from video_metadata import VideoMetadata, caption_table, record_size
+from video_ids import normalize_video_url
+
+URL_SPELLINGS = [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=30",
+    "https://youtube.com/watch?feature=share&v=dQw4w9WgXcQ",
+    "https://m.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://music.youtube.com/watch?v=dQw4w9WgXcQ&list=RDAMVM",
+    "https://youtu.be/dQw4w9WgXcQ?si=abcdef",
+    "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+    "https://www.youtube.com/embed/dQw4w9WgXcQ?autoplay=1",
+    "https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ",
+    "dQw4w9WgXcQ",
+]
+
+
+RESULTS = {}  # benchmark name -> best µs per call of this run
+
+
+def record(name: str, best: float) -> float:
+    RESULTS[name] = best
+    print(f"{name:<45s} {best:10.3f} µs/call")
+    return best
+
+
+def bench(name: str, func, number: int, repeat: int = 5) -> float:
+    """Run func `number` times per round and report the best per-call time in microseconds"""
+    return record(name, min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6)
+
+
+def bench_contended(name: str, op, threads: int, ops: int, repeat: int = 5) -> float:
+    """Run op() `ops` times on each of `threads` threads at once and report wall time per operation"""
+    def contended_round():
+        barrier = threading.Barrier(threads)
+
+        def worker():
+            barrier.wait()
+            for _ in range(ops):
+                op()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+    return record(name, min(timeit.repeat(contended_round, number=1, repeat=repeat)) / (threads * ops) * 1e6)
+
+
+def quiet(func):
+    """func with its stdout (the service's request logging) discarded"""
+    devnull = open(os.devnull, "w")
+
+    def silenced():
+        with contextlib.redirect_stdout(devnull):
+            return func()
+    return silenced
+
+
+def bench_video_ids(number: int):
+    """Benchmark URL -> (extractor, video_id) normalization, cold (regex) and warm (memoized)"""
+    keys = {normalize_video_url(url) for url in URL_SPELLINGS}
+    assert len(keys) == 1, f"URL spellings did not collapse to one key: {keys}"
+
+    raw = normalize_video_url.__wrapped__
+    cold_urls = itertools.cycle(URL_SPELLINGS)
+    warm_urls = itertools.cycle(URL_SPELLINGS)
+
+    bench("video_ids.normalize_video_url (uncached)", lambda: raw(next(cold_urls)), number)
+    bench("video_ids.normalize_video_url (memoized)", lambda: normalize_video_url(next(warm_urls)), number)
+
+
+def _timestamp(ms: int) -> str:
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}"
+
+
+def synthetic_auto_vtt(hours: float) -> str:
+    """YouTube-style rolling auto-caption WebVTT: karaoke tags, repeated lines and 10ms bridge cues"""
+    blocks = ["WEBVTT\nKind: captions\nLanguage: en\n"]
+    previous = " "
+    for n in range(int(hours * 3600 / 2)):
+        start = n * 2000
+        words = [f"word{n}_{i}" for i in range(6)]
+        line = words[0] + "".join(f"<{_timestamp(start + 300 * i)}><c> {w}</c>" for i, w in enumerate(words[1:], 1))
+        blocks.append(f"{_timestamp(start)} --> {_timestamp(start + 1990)} align:start position:0%\n{previous}\n{line}\n")
+        previous = " ".join(words)
+        blocks.append(f"{_timestamp(start + 1990)} --> {_timestamp(start + 2000)} align:start position:0%\n{previous}\n \n")
+    return "\n".join(blocks)
+
+
+def synthetic_ttml(hours: float) -> str:
+    """TTML with one two-line <p> every 3 seconds"""
+    paragraphs = "".join(
+        f'<p begin="{_timestamp(n * 3000)}" end="{_timestamp(n * 3000 + 2900)}" style="s2">'
+        f'line one of cue {n}<br />line two &amp; more</p>\n'
+        for n in range(int(hours * 3600 / 3))
+    )
+    return ('<?xml version="1.0" encoding="utf-8" ?>\n<tt xml:lang="en" xmlns="http://www.w3.org/ns/ttml">'
+            f'<body><div>\n{paragraphs}</div></body></tt>')
+
+
+def synthetic_json3(hours: float) -> str:
+    """YouTube json3 auto-captions: one event per two seconds with per-word segments"""
+    events = [{"tStartMs": 0, "dDurationMs": int(hours * 3600000), "id": 1, "wpWinPosId": 1, "wsWinStyleId": 1}]
+    for n in range(int(hours * 3600 / 2)):
+        segs = [{"utf8": f"word{n}_0", "acAsrConf": 0}]
+        segs.extend({"utf8": f" word{n}_{i}", "tOffsetMs": 300 * i, "acAsrConf": 0} for i in range(1, 6))
+        events.append({"tStartMs": n * 2000, "dDurationMs": 2000, "wWinId": 1, "segs": segs})
+    return json.dumps({"wireMagic": "pb3", "events": events}, separators=(",", ":"))
+
+
+def synthetic_srv3(hours: float) -> str:
+    """YouTube srv3 (timedtext format 3) auto-captions with the same words as synthetic_json3"""
+    paragraphs = "".join(
+        f'<p t="{n * 2000}" d="2000" w="1"><s ac="0">word{n}_0</s>'
+        + "".join(f'<s t="{300 * i}" ac="0"> word{n}_{i}</s>' for i in range(1, 6)) + "</p>\n"
+        for n in range(int(hours * 3600 / 2))
+    )
+    return f'<?xml version="1.0" encoding="utf-8" ?><timedtext format="3">\n<body>\n{paragraphs}</body></timedtext>'
+
+
+def bench_caption_parser(hours: float, number: int):
+    """Benchmark parsing a multi-hour transcript into cues, with and without rolling-line collapsing"""
+    vtt = synthetic_auto_vtt(hours)
+    ttml = synthetic_ttml(hours)
+    raw_cues = parse_captions(vtt, "vtt")
+    collapsed = parse_captions(vtt, "vtt", rolling=True)
+    assert len(collapsed) == len(raw_cues) // 2, "Rolling auto-caption repeats were not collapsed"
+
+    json3 = synthetic_json3(hours)
+    srv3 = synthetic_srv3(hours)
+    assert parse_captions(json3, "json3") == parse_captions(srv3, "srv3") == collapsed, \
+        "json3/srv3 parse differently from the collapsed auto VTT"
+
+    print(f"# {hours:g}h transcripts: auto VTT {len(vtt) / 1e6:.1f} MB, {len(raw_cues)} cues -> "
+          f"{len(collapsed)} after collapsing; TTML {len(ttml) / 1e6:.1f} MB")
+    print(f"# same auto captions as json3 {len(json3) / 1e6:.1f} MB, srv3 {len(srv3) / 1e6:.1f} MB")
+    bench(f"caption_parser WebVTT {hours:g}h (raw cues)", lambda: parse_captions(vtt, "vtt"), number)
+    bench(f"caption_parser WebVTT {hours:g}h (rolling)", lambda: parse_captions(vtt, "vtt", rolling=True), number)
+    bench(f"caption_parser TTML {hours:g}h", lambda: parse_captions(ttml, "ttml"), number)
+    bench(f"caption_parser json3 {hours:g}h", lambda: parse_captions(json3, "json3"), number)
+    bench(f"caption_parser srv3 {hours:g}h", lambda: parse_captions(srv3, "srv3"), number)
+
+
+def synthetic_caption_info(languages: int) -> dict:
+    """Info dict with a few manual tracks and auto-translated captions in `languages` languages"""
+    exts = ["json3", "srv1", "srv2", "srv3", "ttml", "vtt"]
+    auto_languages = [f"x{i:03d}" for i in range(languages - 2)] + ["en-US", "en"]
+    return {
+        "subtitles": {lang: [{"ext": ext, "url": f"https://example.com/{lang}.{ext}"} for ext in exts]
+                      for lang in ("de", "fr")},
+        "automatic_captions": {lang: [{"ext": ext, "url": f"https://example.com/a/{lang}.{ext}"} for ext in exts]
+                               for lang in auto_languages},
+    }
+
+
+def bench_track_index(languages: int, number: int):
+    """Benchmark caption track lookup: trie index versus the linear scan it replaced"""
+    info = synthetic_caption_info(languages)
+    table = caption_table(info)
+    index = TrackIndex.from_table(table)
+    preference = ("srv3", "json3", "vtt", "ttml")
+
+    def linear_scan():
+        tracks = [{"language": lang, "type": "auto", "url": track["url"], "ext": track["ext"]}
+                  for lang, lang_tracks in info["automatic_captions"].items()
+                  for track in lang_tracks if track["ext"] == "srv3"]
+        return next((track for track in tracks if track["language"].startswith("en")), None)
+
+    assert index.find("en", "auto", preference)["url"] == linear_scan()["url"]
+    bench(f"track_index build ({languages} languages)", lambda: TrackIndex.from_table(table), max(1, number // 100))
+    bench(f"track_index find 'en' ({languages} languages)", lambda: index.find("en", "auto", preference), number)
+    bench(f"linear track scan 'en' ({languages} languages)", linear_scan, max(1, number // 100))
+
+
+def synthetic_video_info(languages: int, formats: int) -> dict:
+    """Full info dict shaped like yt-dlp's: caption listings plus `formats` formats with headers and fragments"""
+    info = synthetic_caption_info(languages)
+    headers = {"User-Agent": "Mozilla/5.0 " + "x" * 100, "Accept": "*/*", "Accept-Language": "en-us,en;q=0.5"}
+    info.update({
+        "id": "dQw4w9WgXcQ", "title": "Synthetic video", "duration": 3600, "uploader": "Someone",
+        "view_count": 1234567, "upload_date": "20240101", "description": "d" * 5000, "language": "en",
+        "thumbnails": [{"url": f"https://i.ytimg.com/vi/dQw4w9WgXcQ/{i}.jpg", "preference": -i} for i in range(40)],
+        "formats": [{"format_id": str(i), "url": f"https://rr1.googlevideo.com/videoplayback?itag={i}&" + "s" * 600,
+                     "ext": "mp4", "vcodec": "avc1" if i % 3 else "none", "acodec": "mp4a",
+                     "height": 144 * (i % 8 + 1), "http_headers": headers,
+                     "fragments": [{"url": f"https://rr1.googlevideo.com/{i}/{n}", "duration": 5} for n in range(20)]}
+                    for i in range(formats)],
+    })
+    return info
+
+
+def bench_video_metadata(languages: int, formats: int, number: int):
+    """Benchmark projecting a full info dict onto the slim record the metadata cache holds"""
+    info = synthetic_video_info(languages, formats)
+    record = VideoMetadata.from_info(info)
+    assert VideoMetadata.from_dict(json.loads(json.dumps(record.to_dict()))).captions == record.captions
+    full_size = len(json.dumps(info, separators=(",", ":")))
+    print(f"# info dict {full_size / 1e3:.0f} KB -> VideoMetadata record {record_size(record) / 1e3:.0f} KB "
+          f"({languages} caption languages, {formats} formats)")
+    bench(f"video_metadata projection ({formats} formats)", lambda: VideoMetadata.from_info(info), number)
+
+
+def bench_caches(threads: int, number: int):
+    """Benchmark cache get/set (80/20) from `threads` threads on the memory, SQLite and tiered caches"""
+    value = {"title": "x" * 200, "captions": {"en": {ext: "https://example.com/" + "u" * 300
+                                                      for ext in ("json3", "srv3", "vtt", "ttml")}}}
+    keys = [f"youtube:{i:011d}" for i in range(1000)]
+
+    def mixed(cache):
+        def op():
+            key = random.choice(keys)
+            if random.random() < 0.8:
+                cache.get(key)
+            else:
+                cache.set(key, value)
+        return op
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caches = {
+            "memory": TTLCache(max_bytes=64 * 1024 * 1024, ttl=3600),
+            "sqlite": SQLiteCache(os.path.join(tmp, "shared.sqlite3"), max_bytes=64 * 1024 * 1024, ttl=3600),
+            "tiered": TieredCache(TTLCache(max_bytes=64 * 1024 * 1024, ttl=3600),
+                                  SQLiteCache(os.path.join(tmp, "tiered.sqlite3"), max_bytes=64 * 1024 * 1024, ttl=3600)),
+        }
+        for name, cache in caches.items():
+            for key in keys:
+                cache.set(key, value)
+            bench_contended(f"cache {name} get/set ({threads} threads)", mixed(cache), threads, max(1, number // threads))
+
+
+def bench_service(hours: float, number: int):
+    """Benchmark the service's request paths in process, against a zero-latency fake_youtube server
+
+    Caches are warmed first, so the timings cover track selection, caption conversion, JSON
+    serialization and Flask dispatch; only /extract-captions-old, which never caches caption
+    bodies, still fetches one from the fake server per call (upstream pacing is lifted for it).
+    """
+    import fake_youtube
+    _, base_url = fake_youtube.start_server(fake_youtube.FakeYouTube(duration=1800, translations=150))
+    os.environ.update({"FAKE_YOUTUBE_URL": base_url, "CACHE_BACKEND": "memory", "EXTRACTION_WORKERS": "0",
+                       "SELF_TEST_INTERVAL": "0", "UPSTREAM_RATE": "1000000", "UPSTREAM_BURST": "1000000",
+                       "UPSTREAM_MAX_RATE": "1000000"})
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        import app
+
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    client = app.app.test_client()
+    requests = {
+        "GET /health": lambda: client.get("/health"),
+        "POST /test-ytdlp": lambda: client.post("/test-ytdlp", json={"url": url}),
+        "POST /extract-captions (cues)": lambda: client.post("/extract-captions", json={"url": url, "format": "cues"}),
+        "POST /extract-captions (vtt)": lambda: client.post("/extract-captions", json={"url": url, "format": "vtt"}),
+        "POST /extract-captions-old (fetches)": lambda: client.post("/extract-captions-old", json={"url": url}),
+    }
+    for name, send in requests.items():
+        response = quiet(send)()
+        assert response.status_code == 200, f"{name} answered {response.status_code}: {response.get_data(as_text=True)[:200]}"
+
+    record_ = quiet(lambda: app.get_video_metadata_cached(url))()
+    bench("plan_caption_extraction (150 languages)", quiet(lambda: app.plan_caption_extraction(record_, "de")), number)
+
+    vtt = synthetic_auto_vtt(hours)
+    cues = parse_captions(vtt, "vtt", rolling=True)
+    plan = quiet(lambda: app.plan_caption_extraction(record_, "en"))()
+    for name, content in ((f"{hours:g}h VTT string", vtt), (f"{hours:g}h cue list", cues)):
+        payload = app.caption_result_payload(plan, content, 0.1, "vtt")
+        bench(f"response JSON, selectedCaptions {name}", lambda: app.app.json.dumps(payload), max(1, number // 1000))
+
+    for name, send in requests.items():
+        bench(f"dispatch {name}", quiet(send), max(1, number // 100))
+
+
+def compare(baseline_path: str, threshold: float) -> int:
+    """Compare RESULTS with a saved baseline; returns the number of benchmarks slower than threshold allows"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressions = 0
+    print(f"\n# Compared with {baseline_path} (threshold +{threshold:.0%})")
+    for name, current in RESULTS.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<45s} {'':>10s}    (not in baseline)")
+            continue
+        change = current / before - 1
+        regressed = change > threshold
+        regressions += regressed
+        print(f"{name:<45s} {change:+10.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+GROUPS = ("video_ids", "track_index", "video_metadata", "caption_parser", "caches", "service")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="yt-dlp Service Micro-Benchmarks")
+    parser.add_argument("--number", type=int, default=10000,
+                        help="Calls per timing round (default: 10000)")
+    parser.add_argument("--transcript-hours", type=float, default=3,
+                        help="Length of the synthetic transcripts parsed (default: 3)")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="Threads contending for the caches (default: 8)")
+    parser.add_argument("--only", default=",".join(GROUPS),
+                        help=f"Comma-separated benchmark groups to run (default: all of {','.join(GROUPS)})")
+    parser.add_argument("--save-baseline", metavar="FILE",
+                        help="Write this run's results to FILE as the baseline")
+    parser.add_argument("--compare", metavar="FILE",
+                        help="Compare with the baseline in FILE and exit 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=float(os.environ.get("BENCHMARK_THRESHOLD", 0.25)),
+                        help="Slowdown over the baseline counted as a regression (default: 0.25, i.e. +25%%)")
+    args = parser.parse_args()
+
+    groups = {group.strip() for group in args.only.split(",")}
+    unknown = groups - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown benchmark group(s): {', '.join(sorted(unknown))}")
+
+    if "video_ids" in groups:
+        bench_video_ids(args.number)
+    if "track_index" in groups:
+        bench_track_index(150, args.number)
+    if "video_metadata" in groups:
+        bench_video_metadata(150, 100, max(1, args.number // 100))
+    if "caption_parser" in groups:
+        bench_caption_parser(args.transcript_hours, max(1, args.number // 10000))
+    if "caches" in groups:
+        bench_caches(args.threads, args.number)
+    if "service" in groups:
+        bench_service(args.transcript_hours, args.number)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "results": RESULTS}, f, indent=2, sort_keys=True)
+        print(f"\n# Baseline written to {args.save_baseline}")
+    if args.compare:
+        regressions = compare(args.compare, args.threshold)
+        if regressions:
+            print(f"# {regressions} benchmark(s) regressed by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,334 @@
+"""
+Caching primitives shared by the yt-dlp service endpoints
+
+TTLCache is a per-process memory cache; SQLiteCache is an on-disk store that all
+gunicorn workers in a pod share; TieredCache layers the former over the latter.
+All three implement the CacheBackend interface.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """Approximate the memory footprint of a JSON-like value by its serialized length"""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8', 'ignore'))
+    try:
+        return len(json.dumps(value, default=str, separators=(',', ':')))
+    except (TypeError, ValueError):
+        return 1024
+
+
+class CacheBackend:
+    """Interface for cache stores: get/set/pop/clear plus a stats() dict for monitoring"""
+
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None, size=None):
+        raise NotImplementedError
+
+    def pop(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+
+class TTLCache(CacheBackend):
+    """Thread-safe in-memory LRU cache bounded by total size in bytes, with a TTL per entry"""
+
+    def __init__(self, max_bytes, ttl, sizeof=estimate_size, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, size, expires_at = entry
+            if expires_at <= self._clock():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None, size=None):
+        """Store value under key, evicting least recently used entries to stay within max_bytes"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return False
+        size = self._sizeof(value) if size is None else size
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, self._clock() + ttl)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def pop(self, key):
+        """Drop key from the cache if present"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Return counters and occupancy for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'memory',
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class SQLiteCache(CacheBackend):
+    """Multi-process cache in a SQLite file (WAL mode) holding zlib-compressed JSON values
+
+    Expiry uses wall-clock time so every process agrees on it; once the file grows
+    past max_bytes (compressed), the least recently read entries are evicted.
+    Database errors are counted and treated as misses so the cache never fails a request.
+    encode/decode convert values that are not JSON themselves (records) on the way in and out.
+    """
+
+    TOUCH_INTERVAL = 30  # Seconds between access-time updates for the same entry
+
+    def __init__(self, path, max_bytes, ttl, compresslevel=1, encode=None, decode=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.compresslevel = compresslevel
+        self._encode = encode
+        self._decode = decode
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY,'
+            ' value BLOB NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' expires_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)')
+
+    def _connect(self):
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, counter):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key, default=None):
+        value, _ = self.get_with_ttl(key, default)
+        return value
+
+    def get_with_ttl(self, key, default=None):
+        """Return (value, remaining TTL in seconds), or (default, 0) on a miss"""
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT value, expires_at, accessed_at FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self._count('misses')
+                return default, 0
+            if row[2] < now - self.TOUCH_INTERVAL:
+                conn.execute('UPDATE entries SET accessed_at = ? WHERE key = ?', (now, key))
+            value = json.loads(zlib.decompress(row[0]))
+            if self._decode is not None:
+                value = self._decode(value)
+        except (sqlite3.Error, zlib.error, ValueError, TypeError) as e:
+            print(f"Shared cache read failed for {key}: {e}")
+            self._count('errors')
+            self._count('misses')
+            return default, 0
+        self._count('hits')
+        return value, row[1] - now
+
+    def set(self, key, value, ttl=None, size=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return False
+        if self._encode is not None:
+            value = self._encode(value)
+        blob = zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), self.compresslevel)
+        if len(blob) > self.max_bytes:
+            return False
+
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (key, blob, len(blob), now + ttl, now)
+            )
+            self._evict(conn, now)
+        except sqlite3.Error as e:
+            print(f"Shared cache write failed for {key}: {e}")
+            self._count('errors')
+            return False
+        return True
+
+    def _evict(self, conn, now):
+        conn.execute('DELETE FROM entries WHERE expires_at <= ?', (now,))
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute('SELECT key, size FROM entries ORDER BY accessed_at').fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            self._count('evictions')
+
+    def pop(self, key):
+        try:
+            self._connect().execute('DELETE FROM entries WHERE key = ?', (key,))
+        except sqlite3.Error:
+            self._count('errors')
+
+    def clear(self):
+        try:
+            self._connect().execute('DELETE FROM entries')
+        except sqlite3.Error:
+            self._count('errors')
+
+    def stats(self):
+        try:
+            entries, total = self._connect().execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries'
+            ).fetchone()
+        except sqlite3.Error:
+            entries, total = None, None
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'sqlite',
+                'path': self.path,
+                'entries': entries,
+                'bytes': total,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'errors': self.errors,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class TieredCache(CacheBackend):
+    """Per-process memory cache in front of a shared backend; shared hits warm the local tier"""
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key, default=None):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        value, ttl = self.shared.get_with_ttl(key)
+        if value is None:
+            return default
+        # Keep the shared entry's remaining lifetime so signed URLs inside it never outlive it
+        self.local.set(key, value, ttl=ttl)
+        return value
+
+    def set(self, key, value, ttl=None, size=None):
+        stored = self.local.set(key, value, ttl=ttl, size=size)
+        return self.shared.set(key, value, ttl=ttl) or stored
+
+    def pop(self, key):
+        self.local.pop(key)
+        self.shared.pop(key)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+    def stats(self):
+        local = self.local.stats()
+        shared = self.shared.stats()
+        # The shared tier is only consulted on a local miss, so its misses are the overall misses
+        hits = local['hits'] + shared['hits']
+        misses = shared['misses']
+        lookups = hits + misses
+        return {
+            'backend': 'tiered',
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            'local': local,
+            'shared': shared
+        }
@@ -0,0 +1,258 @@
+"""
+Server-side caption parsing into a compact cue list, and rendering back out
+
+WebVTT, TTML and YouTube's compact json3/srv3 bodies are normalized into the same
+structure, a list of {'start_ms', 'end_ms', 'text'} cues, without building a DOM:
+WebVTT is read line by line and the XML formats through ElementTree.iterparse,
+clearing each <p> once it has been turned into a cue, so memory stays flat on
+multi-hour transcripts. render_captions() turns a cue list into any output format,
+so the service can fetch whichever encoding is smallest on the wire.
+
+YouTube's auto-generated tracks scroll: each cue repeats the previous line above
+the new one, and a 10ms cue re-shows the finished line between them.
+collapse_rolling() keeps only the newly spoken text of every cue.
+"""
+
+import html
+import io
+import json
+import re
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+# Output formats a client can ask for; 'raw' is the upstream body exactly as fetched
+CAPTION_FORMATS = ('raw', 'vtt', 'ttml', 'cues', 'text')
+# Upstream encodings parse_captions() understands
+PARSEABLE_EXTS = ('json3', 'srv3', 'vtt', 'ttml')
+
+_VTT_TIMESTAMP = re.compile(r'(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})')
+_VTT_TIMING = re.compile(_VTT_TIMESTAMP.pattern + r'\s*-->\s*' + _VTT_TIMESTAMP.pattern)
+_TAG = re.compile(r'<[^>]*>')
+_TTML_CLOCK = re.compile(r'(\d+):(\d{2}):(\d{2})(?:\.(\d+)|:(\d+))?$')
+_TTML_OFFSET = re.compile(r'(\d+(?:\.\d+)?)(h|ms|m|s|f|t)$')
+_TTML_PARAMETER = '{http://www.w3.org/ns/ttml#parameter}'
+
+
+class CaptionParseError(Exception):
+    """Raised when a caption body cannot be parsed in its declared format"""
+
+
+def _cue(start_ms, end_ms, text):
+    return {'start_ms': start_ms, 'end_ms': end_ms, 'text': text}
+
+
+def _vtt_ms(hours, minutes, seconds, millis):
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(millis)
+
+
+def _clean_text(lines, markup=True):
+    """Strip markup (voice/class tags, karaoke timestamps) and entities; drop blank lines"""
+    if markup:
+        lines = (html.unescape(_TAG.sub('', line)) for line in lines)
+    cleaned = (line.replace('\u200e', '').strip() for line in lines)
+    return '\n'.join(line for line in cleaned if line)
+
+
+def iter_vtt_cues(lines):
+    """Yield (start_ms, end_ms, text) for each cue of a WebVTT body given as an iterable of lines"""
+    timing = None
+    payload = []
+    skipping = False  # Inside a NOTE, STYLE or REGION block
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if not line:
+            # Only an empty line ends a block: auto-caption cues contain lines of a single space
+            if timing is not None:
+                text = _clean_text(payload)
+                if text:
+                    yield timing[0], timing[1], text
+            timing = None
+            payload = []
+            skipping = False
+            continue
+        if skipping:
+            continue
+        if timing is not None:
+            payload.append(line)
+            continue
+        match = _VTT_TIMING.search(line)
+        if match:
+            groups = match.groups()
+            timing = (_vtt_ms(*groups[:4]), _vtt_ms(*groups[4:]))
+        elif line.startswith(('NOTE', 'STYLE', 'REGION')):
+            skipping = True
+        # Anything else before a timing line is the WEBVTT header or a cue identifier
+
+    if timing is not None:
+        text = _clean_text(payload)
+        if text:
+            yield timing[0], timing[1], text
+
+
+def _ttml_ms(value, tick_rate, frame_rate):
+    """Convert a TTML time expression (clock time or offset time) to milliseconds"""
+    value = value.strip()
+    match = _TTML_CLOCK.match(value)
+    if match:
+        hours, minutes, seconds, fraction, frames = match.groups()
+        ms = (int(hours) * 3600 + int(minutes) * 60 + int(seconds)) * 1000
+        if fraction:
+            ms += round(float(f'0.{fraction}') * 1000)
+        elif frames:
+            ms += round(int(frames) * 1000 / frame_rate)
+        return ms
+    match = _TTML_OFFSET.match(value)
+    if match:
+        number, unit = float(match.group(1)), match.group(2)
+        scale = {'h': 3600000, 'm': 60000, 's': 1000, 'ms': 1,
+                 'f': 1000 / frame_rate, 't': 1000 / tick_rate}[unit]
+        return round(number * scale)
+    raise CaptionParseError(f'Unsupported TTML time expression: {value!r}')
+
+
+def _ttml_text(element):
+    """Text of a <p>, with <br/> as line breaks and nested <span>s flattened"""
+    parts = [element.text or '']
+    for child in element:
+        if child.tag.rsplit('}', 1)[-1] == 'br':
+            parts.append('\n')
+        else:
+            parts.append(_ttml_text(child))
+        parts.append(child.tail or '')
+    return ''.join(parts)
+
+
+def iter_ttml_cues(stream):
+    """Yield (start_ms, end_ms, text) for each <p> of a TTML document read from a binary stream"""
+    tick_rate = 10000000
+    frame_rate = 30
+    try:
+        for event, element in ET.iterparse(stream, events=('start', 'end')):
+            name = element.tag.rsplit('}', 1)[-1]
+            if event == 'start':
+                if name == 'tt':
+                    tick_rate = float(element.get(f'{_TTML_PARAMETER}tickRate') or tick_rate)
+                    frame_rate = float(element.get(f'{_TTML_PARAMETER}frameRate') or frame_rate)
+                continue
+            if name != 'p':
+                continue
+            begin = element.get('begin')
+            if begin is not None:
+                start = _ttml_ms(begin, tick_rate, frame_rate)
+                if element.get('end') is not None:
+                    end = _ttml_ms(element.get('end'), tick_rate, frame_rate)
+                else:
+                    end = start + _ttml_ms(element.get('dur', '0s'), tick_rate, frame_rate)
+                text = _clean_text(_ttml_text(element).split('\n'))
+                if text:
+                    yield start, end, text
+            element.clear()
+    except ET.ParseError as e:
+        raise CaptionParseError(f'Invalid TTML: {e}') from e
+
+
+def iter_json3_cues(content):
+    """Yield (start_ms, end_ms, text) for each event of a YouTube json3 body"""
+    try:
+        events = json.loads(content).get('events') or []
+    except (ValueError, AttributeError) as e:
+        raise CaptionParseError(f'Invalid json3: {e}') from e
+    for event in events:
+        segs = event.get('segs')
+        if not segs or event.get('aAppend'):
+            continue  # Window definitions and bare line-break appends carry no text
+        # Segments are plain text, not markup
+        text = _clean_text(''.join(seg.get('utf8', '') for seg in segs).split('\n'), markup=False)
+        if text:
+            start = int(event.get('tStartMs', 0))
+            yield start, start + int(event.get('dDurationMs', 0)), text
+
+
+def iter_srv3_cues(stream):
+    """Yield (start_ms, end_ms, text) for each <p t= d=> of a YouTube srv3 (timedtext format 3) body"""
+    try:
+        for _, element in ET.iterparse(stream, events=('end',)):
+            if element.tag != 'p':
+                continue
+            if element.get('t') is not None:
+                text = _clean_text(_ttml_text(element).split('\n'))
+                if text:
+                    start = int(element.get('t'))
+                    yield start, start + int(element.get('d', 0)), text
+            element.clear()
+    except (ET.ParseError, ValueError) as e:
+        raise CaptionParseError(f'Invalid srv3: {e}') from e
+
+
+def collapse_rolling(cues):
+    """Drop the lines each cue repeats from the one before it, merging cues that add nothing new"""
+    collapsed = []
+    previous = []
+    for start, end, text in cues:
+        lines = text.split('\n')
+        # Longest run of leading lines that the previous cue ended with (the scrolled-up line)
+        overlap = min(len(lines), len(previous))
+        while overlap and lines[:overlap] != previous[-overlap:]:
+            overlap -= 1
+        new_lines = lines[overlap:]
+        previous = lines
+        if new_lines:
+            collapsed.append(_cue(start, end, '\n'.join(new_lines)))
+        elif collapsed:
+            collapsed[-1]['end_ms'] = max(collapsed[-1]['end_ms'], end)
+    return collapsed
+
+
+def parse_captions(content, ext, rolling=False):
+    """Parse a caption body (see PARSEABLE_EXTS) into a cue list; rolling=True collapses auto-caption repeats"""
+    if ext == 'vtt':
+        cues = iter_vtt_cues(io.StringIO(content))
+    elif ext in ('ttml', 'xml', 'dfxp'):
+        cues = iter_ttml_cues(io.BytesIO(content.encode('utf-8')))
+    elif ext == 'json3':
+        cues = iter_json3_cues(content)
+    elif ext == 'srv3':
+        cues = iter_srv3_cues(io.BytesIO(content.encode('utf-8')))
+    else:
+        raise CaptionParseError(f'Unsupported caption format: {ext}')
+    if rolling:
+        return collapse_rolling(cues)
+    return [_cue(start, end, text) for start, end, text in cues]
+
+
+def cues_to_text(cues):
+    """Plain transcript: one cue per line"""
+    return '\n'.join(cue['text'].replace('\n', ' ') for cue in cues)
+
+
+def _clock(ms):
+    return f'{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}'
+
+
+def cues_to_vtt(cues):
+    blocks = ['WEBVTT\n']
+    blocks.extend(f"{_clock(cue['start_ms'])} --> {_clock(cue['end_ms'])}\n{cue['text']}\n" for cue in cues)
+    return '\n'.join(blocks)
+
+
+def _ttml_paragraph(cue):
+    text = '<br />'.join(escape(line) for line in cue['text'].split('\n'))
+    return f'<p begin="{_clock(cue["start_ms"])}" end="{_clock(cue["end_ms"])}">{text}</p>\n'
+
+
+def cues_to_ttml(cues, language='en'):
+    paragraphs = ''.join(_ttml_paragraph(cue) for cue in cues)
+    return ('<?xml version="1.0" encoding="utf-8" ?>\n'
+            f'<tt xml:lang="{escape(language)}" xmlns="http://www.w3.org/ns/ttml"><body><div>\n'
+            f'{paragraphs}</div></body></tt>\n')
+
+
+def render_captions(cues, output_format, language='en'):
+    """Render a cue list as 'vtt', 'ttml', 'text' or 'cues' (the list itself)"""
+    if output_format == 'vtt':
+        return cues_to_vtt(cues)
+    if output_format == 'ttml':
+        return cues_to_ttml(cues, language)
+    if output_format == 'text':
+        return cues_to_text(cues)
+    return cues
@@ -0,0 +1,156 @@
+"""
+Streaming download verification for /test-download
+
+Instead of letting yt-dlp write the media file to disk and probing it afterwards,
+the selected format is streamed through a VerificationSink that counts the bytes,
+hashes them incrementally and keeps only the leading magic bytes, so a download
+test costs a few KB of memory and no disk. An optional byte cap stops the stream
+early. Requests go through the YoutubeDL instance's own networking stack (headers,
+cookies, proxy), honouring yt-dlp's ranged chunking for throttled formats.
+"""
+
+import hashlib
+import time
+from urllib.parse import urljoin
+
+from yt_dlp.networking import Request
+
+SIGNATURE_SIZE = 16
+READ_SIZE = 64 * 1024
+STREAMABLE_PROTOCOLS = ('http', 'https', 'http_dash_segments', 'http_dash_segments_generator')
+
+
+class UnsupportedStream(Exception):
+    """Raised for formats that cannot be verified by streaming (e.g. HLS manifests)"""
+
+
+class VerificationSink:
+    """Byte counter, incremental SHA-256 and magic-byte capture; all other data is discarded"""
+
+    def __init__(self, max_bytes=None, signature_size=SIGNATURE_SIZE, on_write=None):
+        self.max_bytes = max_bytes or None
+        self.signature_size = signature_size
+        self.on_write = on_write  # Called with the sink after every chunk, e.g. to report progress
+        self.bytes = 0
+        self.head = b''
+        self.truncated = False
+        self._hash = hashlib.sha256()
+
+    @property
+    def full(self):
+        return self.max_bytes is not None and self.bytes >= self.max_bytes
+
+    def write(self, chunk):
+        """Consume a chunk; returns False once the byte cap is reached"""
+        if self.max_bytes is not None and self.bytes + len(chunk) > self.max_bytes:
+            chunk = chunk[:self.max_bytes - self.bytes]
+            self.truncated = True
+        if len(self.head) < self.signature_size:
+            self.head += chunk[:self.signature_size - len(self.head)]
+        self._hash.update(chunk)
+        self.bytes += len(chunk)
+        if self.on_write is not None:
+            self.on_write(self)
+        return not self.full
+
+    def result(self):
+        return {
+            'bytes': self.bytes,
+            'signature': self.head.hex(),
+            'sha256': self._hash.hexdigest(),
+            'truncated': self.truncated,
+            'max_bytes': self.max_bytes
+        }
+
+
+def _copy(ydl, url, headers, sink, read_size=READ_SIZE):
+    """Stream one HTTP response into sink; returns the number of bytes it delivered"""
+    response = ydl.urlopen(Request(url, headers=headers))
+    copied = 0
+    try:
+        while True:
+            chunk = response.read(read_size)
+            if not chunk:
+                break
+            copied += len(chunk)
+            if not sink.write(chunk):
+                # Cap reached exactly at a chunk boundary: truncated only if the body goes on
+                sink.truncated = sink.truncated or bool(response.read(1))
+                break
+    finally:
+        response.close()
+    return copied
+
+
+def stream_format(ydl, fmt, sink):
+    """Stream one selected format (plain, range-chunked or fragmented) into sink"""
+    headers = fmt.get('http_headers') or {}
+    protocol = fmt.get('protocol') or 'https'
+    if protocol not in STREAMABLE_PROTOCOLS:
+        raise UnsupportedStream(f"Format {fmt.get('format_id')} uses protocol {protocol}, which cannot be streamed")
+
+    if fmt.get('fragments'):
+        base_url = fmt.get('fragment_base_url') or ''
+        for fragment in fmt['fragments']:
+            _copy(ydl, fragment.get('url') or urljoin(base_url, fragment['path']), headers, sink)
+            if sink.full:
+                return
+        return
+
+    chunk_size = (fmt.get('downloader_options') or {}).get('http_chunk_size')
+    if not chunk_size:
+        _copy(ydl, fmt['url'], headers, sink)
+        return
+
+    # Same ranged requests yt-dlp makes for formats that are throttled when fetched in one go
+    start = 0
+    filesize = fmt.get('filesize')
+    while not sink.full and (filesize is None or start < filesize):
+        end = start + chunk_size - 1
+        copied = _copy(ydl, fmt['url'], dict(headers, Range=f'bytes={start}-{end}'), sink)
+        if copied < chunk_size:
+            break
+        start += copied
+
+
+def stream_progress(progress, total_bytes=None, clock=time.monotonic):
+    """Sink callback feeding a jobs.JobProgress through its yt-dlp hook, so both download modes report alike"""
+    started = clock()
+
+    def on_write(sink):
+        elapsed = clock() - started
+        speed = sink.bytes / elapsed if elapsed > 0 else None
+        eta = None
+        if speed and total_bytes:
+            eta = max(0, round((total_bytes - sink.bytes) / speed))
+        progress.hook({'status': 'downloading', 'downloaded_bytes': sink.bytes, 'total_bytes': total_bytes,
+                       'speed': speed, 'eta': eta})
+
+    return on_write
+
+
+def stream_verify_job(ydl, url, max_bytes=None, info=None, progress=None):
+    """Extraction job: select formats as a download would, then stream-verify them without writing to disk
+
+    info, when given, is reused instead of extracting url again; progress, if given, is a
+    jobs.JobProgress. Returns (sink result, extension of the first streamed format).
+    """
+    from extraction_pool import process_extracted
+    selected = process_extracted(ydl, url, info, download=False)
+    formats = selected.get('requested_formats') or [selected]
+
+    print(f"Streaming verification of format(s) {', '.join(str(f.get('format_id')) for f in formats)} for: {url}")
+    on_write = None
+    if progress is not None:
+        total_bytes = sum(f.get('filesize') or f.get('filesize_approx') or 0 for f in formats) or None
+        if max_bytes and total_bytes:
+            total_bytes = min(total_bytes, max_bytes)
+        on_write = stream_progress(progress, total_bytes or max_bytes or None)
+    sink = VerificationSink(max_bytes, on_write=on_write)
+    for fmt in formats:
+        stream_format(ydl, fmt, sink)
+        if sink.full:
+            break
+    if progress is not None:
+        progress.hook({'status': 'finished', 'downloaded_bytes': sink.bytes, 'total_bytes': sink.bytes})
+    return sink.result(), formats[0].get('ext')
@@ -0,0 +1,393 @@
+"""
+Process pool for yt-dlp extractions
+
+Extraction (page download, player JS and extractor parsing) is CPU-heavy Python that
+otherwise runs on the request thread and contends for the GIL with everything else
+the worker does. ExtractionPool runs it in a few child processes instead:
+
+- children fork from a forkserver that has already imported yt_dlp, and each keeps
+  one long-lived YoutubeDL per option profile, so extractors are initialized once
+- at most max_workers + max_queue jobs are admitted; beyond that submissions fail
+  fast with ExtractionQueueFull instead of piling up
+- jobs are bounded by a per-job timeout: the caller stops waiting (ExtractionTimeout) and
+  the worker interrupts the job with a SIGALRM timer, so a hung extraction frees its process
+- each child is replaced after max_jobs_per_worker jobs to contain memory growth
+
+With max_workers=0 extractions run inline on the calling thread (the pre-pool behaviour).
+An extractor class, if given, is tried before all of yt-dlp's own (e.g. fake_youtube.FakeYouTubeIE).
+"""
+
+import concurrent.futures
+import importlib
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from scratch import OutputTracker, ScratchDir
+from video_metadata import VideoMetadata, url_expiry
+
+
+class ExtractionError(Exception):
+    """An extraction failed inside a pool worker (carries the original error message)"""
+
+
+class ExtractionQueueFull(Exception):
+    """Raised when the pool already holds as many jobs as it admits"""
+
+
+class ExtractionTimeout(Exception):
+    """Raised when a job has not finished within its timeout"""
+
+
+class _JobDeadline(BaseException):
+    """Raised in a worker by the job timer; a BaseException so yt-dlp's own error handling does not swallow it"""
+
+
+def _job_deadline(signum, frame):
+    raise _JobDeadline()
+
+
+# Worker-process state: option profiles, the injected extractor and warm YoutubeDL instances
+_profiles = {}
+_extractor = None
+_instances = {}
+
+
+def _init_worker(profiles, extractor=None):
+    global _profiles, _extractor
+    importlib.import_module('yt_dlp')  # Already imported in the forkserver; a no-op there
+    _profiles = profiles
+    _extractor = extractor
+    _instances.clear()
+
+
+def _new_youtube_dl(options, extractor=None):
+    """YoutubeDL with yt-dlp's extractors, preceded by extractor (an InfoExtractor class) if given"""
+    import yt_dlp
+    if extractor is None:
+        return yt_dlp.YoutubeDL(options)
+    # Extractors are tried in the order they were added
+    ydl = yt_dlp.YoutubeDL(options, auto_init=False)
+    ydl.add_info_extractor(extractor())
+    ydl.add_default_info_extractors()
+    return ydl
+
+
+def _youtube_dl(profile, overrides):
+    if overrides:
+        # Per-job options (e.g. an output template) need their own instance
+        return _new_youtube_dl(dict(_profiles[profile], **overrides), _extractor), True
+    ydl = _instances.get(profile)
+    if ydl is None:
+        ydl = _instances[profile] = _new_youtube_dl(_profiles[profile], _extractor)
+    return ydl, False
+
+
+def _run_job(job, profile, url, overrides, args, deadline=None):
+    """Execute one job in a worker; returns (started_at, result)
+
+    With a deadline (epoch seconds, when the caller stops waiting), a job still queued by then
+    is skipped and a running one is interrupted by a SIGALRM timer, so a hung extraction
+    cannot hold the worker process after its caller has given up.
+    """
+    started_at = time.time()
+    if deadline is not None and deadline <= started_at:
+        raise ExtractionTimeout("Extraction timed out while queued")
+    ydl, disposable = _youtube_dl(profile, overrides)
+    if deadline is not None:
+        signal.signal(signal.SIGALRM, _job_deadline)
+        signal.setitimer(signal.ITIMER_REAL, max(0.001, deadline - time.time()))  # 0 would disarm it
+    try:
+        return started_at, job(ydl, url, *args)
+    except _JobDeadline:
+        if not disposable:
+            # The interrupted instance may be mid-request; the next job gets a fresh one
+            _instances.pop(profile, None)
+            disposable = True
+        raise ExtractionTimeout(f"Extraction interrupted after {time.time() - started_at:.1f}s") from None
+    except Exception as e:
+        # yt-dlp exceptions carry tracebacks and are not reliably picklable
+        raise ExtractionError(str(e)) from None
+    finally:
+        if deadline is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        if disposable:
+            ydl.close()
+
+
+def extract_job(ydl, url):
+    """Metadata-only extraction, sanitized so the result is JSON- and pickle-safe"""
+    return ydl.sanitize_info(ydl.extract_info(url, download=False))
+
+
+def metadata_job(ydl, url):
+    """Metadata extraction projected onto a VideoMetadata record, so the full info dict stays in the worker"""
+    return VideoMetadata.from_info(ydl.extract_info(url, download=False))
+
+
+def http_retry_sleep(attempt):
+    """retry_sleep_functions entry for profiles: exponential backoff capped at 30s (module-level, so it pickles)"""
+    return min(3 ** attempt, 30)
+
+
+def subtitles_job(ydl, url):
+    """Extraction with the profile's subtitle options; returns {language: {'ext', 'url', 'data'}} of the requested subtitles"""
+    info = ydl.extract_info(url, download=False)
+    return {language: {'ext': sub.get('ext'), 'url': sub.get('url'), 'data': sub.get('data')}
+            for language, sub in (info.get('requested_subtitles') or {}).items() if sub}
+
+
+# Info dict fields a download never reads; dropped from the cached download info
+DOWNLOAD_INFO_DROP = ('thumbnails', 'thumbnail', 'subtitles', 'automatic_captions', 'heatmap', 'chapters',
+                      'description', 'tags', 'categories')
+
+
+def download_info_job(ydl, url):
+    """Extraction with the download profile's format selection; returns (VideoMetadata, slim info dict)
+
+    The slim dict keeps only the formats the profile selects (process_extracted() picks the
+    same ones again from it), so it is a few KB and can be cached until its media URLs expire.
+    """
+    info = ydl.extract_info(url, download=False)
+    selected = {fmt.get('format_id') for fmt in info.get('requested_formats') or [info]}
+    slim = ydl.sanitize_info(info, remove_private_keys=True)
+    slim['formats'] = [fmt for fmt in slim.get('formats') or [] if fmt.get('format_id') in selected]
+    for field in DOWNLOAD_INFO_DROP:
+        slim.pop(field, None)
+    return VideoMetadata.from_info(info), slim
+
+
+def download_info_expiry(info):
+    """Earliest expiry (epoch seconds) of the media URLs in a download info dict, or None"""
+    expiries = [url_expiry(fmt.get('url')) for fmt in info.get('formats') or []]
+    return min((expires_at for expires_at in expiries if expires_at is not None), default=None)
+
+
+def process_extracted(ydl, url, info, download):
+    """Run format selection (and the download, if asked) on already-extracted info, like --load-info-json
+
+    Re-extracts url when no info is given or when the stored media URLs no longer work.
+    """
+    import yt_dlp
+    if info is None:
+        return ydl.extract_info(url, download=download)
+    try:
+        # Drop the previous run's format selection and file names, as yt-dlp does for info files
+        return ydl.process_ie_result(ydl.sanitize_info(info, remove_private_keys=True), download=download)
+    except yt_dlp.utils.DownloadError as e:
+        print(f"Reusing extracted info for {url} failed ({e}); extracting again")
+        return ydl.extract_info(url, download=download)
+
+
+def download_job(ydl, url, scratch_root, info=None, progress=None):
+    """Download url into a private scratch directory, reusing info when given, and inspect the result
+
+    Needs a per-job instance (run with overrides). progress, if given, is a jobs.JobProgress
+    fed from yt-dlp's progress hooks. Returns details of the final file, or None; the
+    directory, with any .part and fragment files, is gone by the time this returns.
+    """
+    with ScratchDir(scratch_root) as scratch:
+        ydl.params['paths'] = {'home': scratch.path, 'temp': scratch.path}
+        tracker = OutputTracker().attach(ydl)
+        if progress is not None:
+            ydl.add_progress_hook(progress.hook)
+
+        if info is not None:
+            # Show available formats for debugging
+            formats = info.get('formats') or []
+            print(f"Available formats: {len(formats)}")
+            for f in formats[:3]:  # Show first 3 formats
+                print(f"  - {f.get('format_id')}: {f.get('ext')} {f.get('resolution')} {f.get('filesize')}")
+
+        print(f"Attempting to download: {url}")
+        process_extracted(ydl, url, info, download=True)
+
+        final_file = next((path for path in tracker.final_files if os.path.isfile(path)), None)
+        if not final_file:
+            return None
+        with open(final_file, 'rb') as f:
+            first_bytes = f.read(16)
+        return {
+            'filename': os.path.basename(final_file),
+            'bytes': os.path.getsize(final_file),
+            'signature': first_bytes.hex(),
+            'files_written': len(tracker.written)
+        }
+
+
+class ExtractionPool:
+    """Bounded pool of yt-dlp worker processes with warm, per-profile YoutubeDL instances"""
+
+    def __init__(self, profiles, max_workers=2, max_queue=16, job_timeout=60.0, max_jobs_per_worker=50,
+                 extractor=None, observer=None):
+        self.profiles = profiles
+        self.extractor = extractor
+        self.observer = observer  # Called with (in_flight, queue_depth) whenever a job is admitted or finishes
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.job_timeout = job_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue) if max_workers else None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.queue_wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def _get_executor(self):
+        # Created lazily and per process, so importing the app (or forking gunicorn workers) spawns nothing
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['yt_dlp', __name__])
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self.profiles, self.extractor),
+                    max_tasks_per_child=self.max_jobs_per_worker
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _reset_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, job, url, profile, overrides=None, timeout=None, args=()):
+        """Run job(ydl, url, *args) with profile's YoutubeDL in a worker process and return its result
+
+        job must be a module-level function (it is pickled by reference). Raises
+        ExtractionQueueFull, ExtractionTimeout or ExtractionError.
+        """
+        if not self.max_workers:
+            return self._run_inline(job, url, profile, overrides, args)
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ExtractionQueueFull(
+                f"Extraction queue full ({self.max_workers} running, {self.max_queue} queued)")
+
+        executor = self._get_executor()
+        submitted_at = time.time()
+        timeout = timeout or self.job_timeout
+        try:
+            future = executor.submit(_run_job, job, profile, url, overrides, args, submitted_at + timeout)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._slots.release()
+            self._reset_executor(executor)
+            raise ExtractionError(f"Extraction pool unavailable: {e}") from None
+
+        with self._lock:
+            self.in_flight += 1
+            self.submitted += 1
+            self._observe()
+        # The slot is held until the job really finishes, even if the caller stops waiting
+        future.add_done_callback(self._job_done)
+
+        try:
+            started_at, result = future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            # Drops the job if it is still queued; a running one is interrupted by its worker's timer
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise ExtractionTimeout(f"Extraction did not finish within {timeout:.1f}s") from None
+        except ExtractionTimeout:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        except BrokenProcessPool as e:
+            # A worker died (e.g. OOM-killed); start a fresh pool for the next job
+            self._reset_executor(executor)
+            raise ExtractionError(f"Extraction worker crashed: {e}") from None
+
+        finished_at = time.time()
+        with self._lock:
+            self.queue_wait_seconds += max(0.0, started_at - submitted_at)
+            self.run_seconds += finished_at - started_at
+        return result
+
+    def extract(self, url, profile, timeout=None):
+        """Metadata-only extraction with profile's options; returns the sanitized info dict"""
+        return self.run(extract_job, url, profile, timeout=timeout)
+
+    def metadata(self, url, profile, timeout=None):
+        """Metadata-only extraction with profile's options; returns a VideoMetadata record"""
+        return self.run(metadata_job, url, profile, timeout=timeout)
+
+    def _job_done(self, future):
+        self._slots.release()
+        with self._lock:
+            self.in_flight -= 1
+            self._observe()
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def _queue_depth(self):
+        return max(0, self.in_flight - self.max_workers)
+
+    def _observe(self):
+        # Called with self._lock held, so observers see the counts in order
+        if self.observer is not None:
+            self.observer(self.in_flight, self._queue_depth())
+
+    def _run_inline(self, job, url, profile, overrides, args):
+        with self._lock:
+            self.submitted += 1
+        started_at = time.time()
+        with _new_youtube_dl(dict(self.profiles[profile], **(overrides or {})), self.extractor) as ydl:
+            try:
+                result = job(ydl, url, *args)
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+        with self._lock:
+            self.completed += 1
+            self.run_seconds += time.time() - started_at
+        return result
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        """Queue depth and job counters for monitoring"""
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                'mode': 'process' if self.max_workers else 'inline',
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'max_jobs_per_worker': self.max_jobs_per_worker,
+                'job_timeout_seconds': self.job_timeout,
+                'in_flight': self.in_flight,
+                'queue_depth': self._queue_depth(),
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'pool_restarts': self.restarts,
+                'avg_queue_wait_seconds': round(self.queue_wait_seconds / finished, 4) if finished else 0.0,
+                'avg_run_seconds': round(self.run_seconds / finished, 4) if finished else 0.0
+            }
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Offline YouTube stand-in for benchmarks and load tests
+
+A stub HTTP server that answers the three kinds of requests the service makes
+upstream, for any 11-character video ID, with deterministic synthetic content:
+
+    /watch?v=ID         watch page embedding ytInitialPlayerResponse (details, formats, caption tracks)
+    /api/timedtext?...  caption bodies as json3, srv3, vtt or ttml, one cue every CUE_SECONDS of the video
+    /videoplayback?...  media bytes of the format's contentLength, with Range support
+    /stats              request, fault and rejection counters (never delayed or faulted)
+
+Caption and media URLs are signed and carry expire=, like YouTube's: expired or
+tampered URLs get HTTP 403. Every other request is delayed by a latency sampled
+from its route's distribution and can be failed with 429 (with Retry-After) or
+5xx at configurable rates.
+
+FakeYouTubeIE is the matching yt-dlp extractor. Setting FAKE_YOUTUBE_URL makes
+app.py use it ahead of yt-dlp's own YouTube extractor, so extraction, caption
+fetches and downloads all go to the stub:
+
+    python fake_youtube.py --port 8765 --caption-latency lognormal:80,0.5 --error-rate 0.02
+    FAKE_YOUTUBE_URL=http://127.0.0.1:8765 python app.py
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.utils import ExtractorError, mimetype2ext, parse_codecs
+
+from caption_parser import cues_to_ttml, cues_to_vtt
+from video_ids import normalize_video_url
+
+CUE_SECONDS = 3
+CAPTION_EXTS = ('json3', 'srv3', 'ttml', 'vtt')
+CAPTION_CONTENT_TYPES = {'json3': 'application/json', 'srv3': 'text/xml', 'ttml': 'text/xml', 'vtt': 'text/vtt'}
+ROUTES = ('watch', 'captions', 'media')
+TRANSLATION_LANGUAGES = ('af', 'ar', 'bg', 'bn', 'cs', 'da', 'de', 'el', 'es', 'et', 'fa', 'fi', 'fr', 'he', 'hi',
+                         'hr', 'hu', 'id', 'it', 'ja', 'ko', 'lt', 'lv', 'ms', 'nl', 'no', 'pl', 'pt', 'ro', 'ru',
+                         'sk', 'sl', 'sr', 'sv', 'sw', 'ta', 'th', 'tr', 'uk', 'ur', 'vi', 'zh-Hans', 'zh-Hant')
+# itag -> (mimeType, height, size relative to --media-kb); 140 is what the download profile picks first
+FORMATS = {
+    140: ('audio/mp4; codecs="mp4a.40.2"', None, 1),
+    251: ('audio/webm; codecs="opus"', None, 1),
+    18: ('video/mp4; codecs="avc1.42001E, mp4a.40.2"', 360, 4),
+    137: ('video/mp4; codecs="avc1.640028"', 1080, 16),
+}
+MEDIA_HEADER = b'\x00\x00\x00\x18ftypM4A \x00\x00\x02\x00'  # So download checks see an MP4 signature
+_WORDS = ('the', 'video', 'caption', 'service', 'cache', 'request', 'never', 'gonna', 'give', 'you', 'up',
+          'let', 'down', 'run', 'around', 'and', 'desert', 'make', 'cry', 'say', 'goodbye', 'tell', 'lie')
+_RANGE = re.compile(r'bytes=(\d*)-(\d*)$')
+
+
+def parse_latency(spec):
+    """Sampler (returning seconds) for '50' / 'fixed:50', 'uniform:20,200', 'lognormal:80,0.5' or 'exp:50' (ms)"""
+    kind, _, params = (spec or '0').partition(':')
+    if not params:
+        kind, params = 'fixed', kind
+    values = [float(value) for value in params.split(',')]
+    if kind == 'fixed':
+        return lambda: values[0] / 1000
+    if kind == 'uniform':
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == 'lognormal':
+        # Median in ms and sigma of the underlying normal distribution
+        return lambda: random.lognormvariate(math.log(values[0]), values[1]) / 1000
+    if kind == 'exp':
+        return lambda: random.expovariate(1 / values[0]) / 1000
+    raise ValueError(f'Unknown latency distribution: {spec!r}')
+
+
+def synthetic_cues(video_id, language, duration, words_per_cue):
+    """Deterministic cue list covering duration seconds of one video's track in one language"""
+    rng = random.Random(f'{video_id}:{language}')
+    return [{'start_ms': start * 1000, 'end_ms': (start + CUE_SECONDS) * 1000,
+             'text': ' '.join(rng.choice(_WORDS) for _ in range(words_per_cue))}
+            for start in range(0, duration, CUE_SECONDS)]
+
+
+@lru_cache(maxsize=256)
+def caption_body(video_id, language, ext, duration, words_per_cue):
+    """Caption body as YouTube's timedtext endpoint would serve it for fmt=ext"""
+    cues = synthetic_cues(video_id, language, duration, words_per_cue)
+    if ext == 'vtt':
+        return cues_to_vtt(cues)
+    if ext == 'ttml':
+        return cues_to_ttml(cues, language)
+    if ext == 'json3':
+        events = [{'tStartMs': cue['start_ms'], 'dDurationMs': cue['end_ms'] - cue['start_ms'],
+                   'segs': [{'utf8': cue['text']}]} for cue in cues]
+        return json.dumps({'wireMagic': 'pb3', 'events': events})
+    paragraphs = ''.join(f'<p t="{cue["start_ms"]}" d="{cue["end_ms"] - cue["start_ms"]}">{cue["text"]}</p>'
+                         for cue in cues)
+    return f'<?xml version="1.0" encoding="utf-8" ?><timedtext format="3"><body>{paragraphs}</body></timedtext>'
+
+
+class FakeYouTube:
+    """Content, latency and fault settings of the stub server, plus its counters"""
+
+    def __init__(self, duration=600, manual_languages=('en',), translations=20, words_per_cue=8,
+                 media_bytes=512 * 1024, url_ttl=6 * 3600, latency=None, error_rate=0.0,
+                 server_error_rate=0.0, secret='fake-youtube'):
+        self.duration = duration
+        self.manual_languages = tuple(manual_languages)
+        self.translations = translations
+        self.words_per_cue = words_per_cue
+        self.media_bytes = media_bytes
+        self.url_ttl = url_ttl
+        self.latency = {route: parse_latency((latency or {}).get(route)) for route in ROUTES}
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.secret = secret.encode('utf-8')
+        self._lock = threading.Lock()
+        self.counters = {route: {'requests': 0, 'throttled': 0, 'server_errors': 0, 'forbidden': 0}
+                         for route in ROUTES}
+
+    def count(self, route, counter):
+        with self._lock:
+            self.counters[route][counter] += 1
+
+    def sign(self, video_id, expire):
+        return hmac.new(self.secret, f'{video_id}:{expire}'.encode('utf-8'), hashlib.sha256).hexdigest()[:16]
+
+    def signed_query(self, video_id, **params):
+        expire = int(time.time() + self.url_ttl)
+        return urlencode(dict(params, expire=expire, sig=self.sign(video_id, expire)))
+
+    def valid_signature(self, video_id, query):
+        expire = query.get('expire', '')
+        return (expire.isdigit() and int(expire) > time.time()
+                and hmac.compare_digest(query.get('sig', ''), self.sign(video_id, int(expire))))
+
+    def translation_languages(self):
+        extra = max(0, self.translations - len(TRANSLATION_LANGUAGES))
+        return list(TRANSLATION_LANGUAGES[:self.translations]) + [f'x{i:03d}' for i in range(extra)]
+
+    def player_response(self, video_id, base_url):
+        """ytInitialPlayerResponse for video_id, with URLs signed now"""
+        rng = random.Random(video_id)
+        tracks = [{'baseUrl': f'{base_url}/api/timedtext?' + self.signed_query(video_id, v=video_id, lang=language),
+                   'languageCode': language, 'name': {'simpleText': language}}
+                  for language in self.manual_languages]
+        tracks.append({'baseUrl': f'{base_url}/api/timedtext?' + self.signed_query(video_id, v=video_id, lang='en',
+                                                                                    kind='asr'),
+                       'languageCode': 'en', 'kind': 'asr', 'name': {'simpleText': 'English (auto-generated)'}})
+        formats = [{'itag': itag, 'mimeType': mime, 'height': height,
+                    'contentLength': str(self.media_bytes * scale),
+                    'url': f'{base_url}/videoplayback?' + self.signed_query(video_id, id=video_id, itag=itag)}
+                   for itag, (mime, height, scale) in FORMATS.items()]
+        return {
+            'videoDetails': {
+                'videoId': video_id,
+                'title': f'Synthetic video {video_id}',
+                'lengthSeconds': str(self.duration),
+                'author': f'Channel {rng.randrange(1000)}',
+                'viewCount': str(rng.randrange(10 ** 9)),
+                'shortDescription': 'Synthetic description. ' * 40
+            },
+            'microformat': {'playerMicroformatRenderer': {'uploadDate': f'20{rng.randrange(10, 25)}-0{rng.randrange(1, 10)}-1{rng.randrange(10)}'}},
+            'streamingData': {'adaptiveFormats': formats},
+            'captions': {'playerCaptionsTracklistRenderer': {
+                'captionTracks': tracks,
+                'translationLanguages': [{'languageCode': language} for language in self.translation_languages()]
+            }}
+        }
+
+    def stats(self):
+        with self._lock:
+            return {route: dict(counters) for route, counters in self.counters.items()}
+
+
+class FakeYouTubeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so the service's connection pooling behaves as against YouTube
+    disable_nagle_algorithm = True  # Headers and body are separate writes; don't add delayed-ACK stalls
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b'', content_type='text/plain; charset=utf-8', headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        fake = self.server.fake
+        parts = urlsplit(self.path)
+        query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+        route = {'/watch': 'watch', '/api/timedtext': 'captions', '/videoplayback': 'media'}.get(parts.path)
+        if parts.path == '/stats':
+            return self._send(200, json.dumps(fake.stats()), 'application/json')
+        if route is None:
+            return self._send(404, 'Not found')
+
+        fake.count(route, 'requests')
+        time.sleep(max(0.0, fake.latency[route]()))
+        roll = random.random()
+        if roll < fake.error_rate:
+            fake.count(route, 'throttled')
+            return self._send(429, 'Too Many Requests', headers={'Retry-After': '1'})
+        if roll < fake.error_rate + fake.server_error_rate:
+            fake.count(route, 'server_errors')
+            return self._send(random.choice((500, 502, 503)), 'Server error')
+
+        video_id = query.get('v') or query.get('id') or ''
+        if not re.fullmatch(r'[0-9A-Za-z_-]{11}', video_id):
+            return self._send(400, 'Bad video id')
+        if route == 'watch':
+            base_url = f'http://{self.headers.get("Host")}'
+            player = json.dumps(fake.player_response(video_id, base_url))
+            return self._send(200, f'<html><body><script>var ytInitialPlayerResponse = {player};</script></body></html>',
+                              'text/html; charset=utf-8')
+        if not fake.valid_signature(video_id, query):
+            fake.count(route, 'forbidden')
+            return self._send(403, 'Expired or invalid signature')
+        if route == 'captions':
+            ext = query.get('fmt', 'srv3')
+            if ext not in CAPTION_EXTS:
+                return self._send(400, 'Unsupported fmt')
+            body = caption_body(video_id, query.get('tlang') or query.get('lang', 'en'), ext, fake.duration,
+                                fake.words_per_cue)
+            return self._send(200, body, f'{CAPTION_CONTENT_TYPES[ext]}; charset=utf-8')
+        self._send_media(fake, query.get('itag', '140'))
+
+    def _send_media(self, fake, itag):
+        if not itag.isdigit() or int(itag) not in FORMATS:
+            return self._send(404, 'Unknown itag')
+        mime, _, scale = FORMATS[int(itag)]
+        size = fake.media_bytes * scale
+        start, end = 0, size - 1
+        match = _RANGE.match(self.headers.get('Range', ''))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(end, int(match.group(2))) if match.group(2) else end
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start >= size:
+                return self._send(416, '', headers={'Content-Range': f'bytes */{size}'})
+        self.send_response(206 if match else 200)
+        self.send_header('Content-Type', mime.split(';')[0])
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        if match:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        block = MEDIA_HEADER + bytes(64 * 1024 - len(MEDIA_HEADER))
+        position = start
+        while position <= end:
+            offset = position % len(block)
+            chunk = block[offset:offset + end - position + 1]
+            self.wfile.write(chunk)
+            position += len(chunk)
+
+
+def make_server(fake, host='127.0.0.1', port=0):
+    server = ThreadingHTTPServer((host, port), FakeYouTubeHandler)
+    server.daemon_threads = True
+    server.fake = fake
+    return server
+
+
+def start_server(fake, host='127.0.0.1', port=0):
+    """Serve fake on a daemon thread; returns (server, base_url)"""
+    server = make_server(fake, host, port)
+    threading.Thread(target=server.serve_forever, name='fake-youtube', daemon=True).start()
+    return server, f'http://{host}:{server.server_port}'
+
+
+class FakeYouTubeIE(InfoExtractor):
+    """yt-dlp extractor for YouTube URLs that reads the stub server instead of youtube.com
+
+    The server is given as extractor argument fakeyoutube:server=URL.
+    """
+
+    IE_NAME = 'fakeyoutube'
+    IE_DESC = False
+    _VALID_URL = (r'(?:https?://(?:(?:www|m|music)\.)?youtube(?:-nocookie)?\.com/(?:watch/?\?(?:[^#]*?&)?v=|(?:shorts|embed|live|v|e)/)'
+                  r'|https?://(?:www\.)?youtu\.be/)?(?P<id>[0-9A-Za-z_-]{11})')
+
+    @classmethod
+    def suitable(cls, url):
+        return normalize_video_url(url).extractor == 'youtube'
+
+    def _real_extract(self, url):
+        video_id = normalize_video_url(url).video_id
+        server = self._configuration_arg('server', [None], casesense=True)[0]
+        if not server:
+            raise ExtractorError('fakeyoutube needs the stub server URL (extractor argument fakeyoutube:server=URL)',
+                                 expected=True)
+        webpage = self._download_webpage(f'{server.rstrip("/")}/watch?v={video_id}', video_id)
+        player = self._search_json(r'var\s+ytInitialPlayerResponse\s*=', webpage, 'initial player response', video_id)
+
+        formats = []
+        for fmt in player['streamingData']['adaptiveFormats']:
+            mime, _, codecs = fmt['mimeType'].partition(';')
+            formats.append(dict(parse_codecs(codecs.split('"')[1] if '"' in codecs else ''),
+                                format_id=str(fmt['itag']), url=fmt['url'], ext=mimetype2ext(mime),
+                                height=fmt.get('height'), filesize=int(fmt['contentLength'])))
+
+        renderer = player['captions']['playerCaptionsTracklistRenderer']
+        subtitles, automatic_captions = {}, {}
+        for track in renderer['captionTracks']:
+            base_url = track['baseUrl']
+            if track.get('kind') == 'asr':
+                # Auto captions come in the spoken language and every translation language, as on YouTube
+                automatic_captions[track['languageCode']] = self._caption_formats(base_url)
+                for language in renderer['translationLanguages']:
+                    code = language['languageCode']
+                    automatic_captions.setdefault(code, self._caption_formats(f'{base_url}&tlang={code}'))
+            else:
+                subtitles[track['languageCode']] = self._caption_formats(base_url)
+
+        details = player['videoDetails']
+        return {
+            'id': video_id,
+            'title': details['title'],
+            'duration': int(details['lengthSeconds']),
+            'uploader': details['author'],
+            'view_count': int(details['viewCount']),
+            'upload_date': player['microformat']['playerMicroformatRenderer']['uploadDate'].replace('-', ''),
+            'description': details['shortDescription'],
+            'language': next(iter(subtitles), None),
+            'formats': formats,
+            'subtitles': subtitles,
+            'automatic_captions': automatic_captions,
+            'webpage_url': f'https://www.youtube.com/watch?v={video_id}'
+        }
+
+    @staticmethod
+    def _caption_formats(base_url):
+        return [{'ext': ext, 'url': f'{base_url}&fmt={ext}'} for ext in CAPTION_EXTS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline YouTube stand-in for benchmarks and load tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--duration', type=int, default=600, help='Video length in seconds; sets caption size (default: 600)')
+    parser.add_argument('--words-per-cue', type=int, default=8, help='Words per caption cue (default: 8)')
+    parser.add_argument('--manual-languages', default='en', help='Comma-separated manual caption languages (default: en)')
+    parser.add_argument('--translations', type=int, default=20, help='Auto-translated caption languages (default: 20)')
+    parser.add_argument('--media-kb', type=int, default=512, help='Size of the smallest media format in KB (default: 512)')
+    parser.add_argument('--url-ttl', type=int, default=6 * 3600, help='Seconds signed URLs stay valid (default: 21600)')
+    for route, default in (('watch', 'lognormal:300,0.4'), ('caption', 'lognormal:80,0.5'), ('media', '0')):
+        parser.add_argument(f'--{route}-latency', default=default,
+                            help=f'{route} latency: MS, fixed:MS, uniform:LO,HI, lognormal:MEDIAN,SIGMA or exp:MEAN (default: {default})')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered 429 (default: 0)')
+    parser.add_argument('--server-error-rate', type=float, default=0.0, help='Fraction of requests answered 5xx (default: 0)')
+    args = parser.parse_args()
+
+    fake = FakeYouTube(
+        duration=args.duration,
+        manual_languages=[language.strip() for language in args.manual_languages.split(',') if language.strip()],
+        translations=args.translations,
+        words_per_cue=args.words_per_cue,
+        media_bytes=args.media_kb * 1024,
+        url_ttl=args.url_ttl,
+        latency={'watch': args.watch_latency, 'captions': args.caption_latency, 'media': args.media_latency},
+        error_rate=args.error_rate,
+        server_error_rate=args.server_error_rate
+    )
+    server = make_server(fake, args.host, args.port)
+    print(f'Fake YouTube on http://{args.host}:{server.server_port} (stats at /stats)')
+    print(f'Point the service at it with FAKE_YOUTUBE_URL=http://{args.host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
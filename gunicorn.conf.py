@@ -0,0 +1,24 @@
+"""
+Gunicorn settings, picked up automatically from the working directory
+
+Sets up prometheus_client's multiprocess mode so /metrics aggregates every worker:
+the metrics directory is exported before workers import the app, emptied when the
+master starts, and a dead worker's live gauges are dropped when it exits.
+"""
+
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'ytdlp-metrics'))
+
+
+def on_starting(server):
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
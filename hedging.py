@@ -0,0 +1,141 @@
+"""
+Hedged fetching of caption candidates
+
+Starts the primary fetch, launches the next candidate whenever the running ones
+have not answered within the hedge delay (or as soon as one fails), returns the
+first good body and cancels everything still in flight. Concurrency is capped per
+request and per upstream host so hedging never turns into a request storm.
+"""
+
+import concurrent.futures
+import threading
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+
+class FetchCancelled(Exception):
+    """Raised inside a hedge that lost the race"""
+
+
+class HedgedFetcher:
+    """Runs hedged GETs through a shared PooledHTTPClient on a bounded thread pool"""
+
+    def __init__(self, client, max_workers=32, per_host_limit=8, chunk_size=64 * 1024):
+        self.client = client
+        self.per_host_limit = per_host_limit
+        self.chunk_size = chunk_size
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix='hedge')
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(per_host_limit))
+        self._lock = threading.Lock()
+        self.launched = 0
+        self.hedges = 0
+        self.wins_by_hedge = 0
+        self.cancelled = 0
+
+    def _slot(self, url):
+        with self._lock:
+            return self._host_slots[urlsplit(url).netloc]
+
+    def _fetch(self, url, headers, cancel):
+        """GET url and return (status_code, body); aborts as soon as cancel is set
+
+        The upstream token is reserved before a host slot is taken, so a hedge queued behind
+        the rate limiter holds no slot, and stops waiting as soon as the race is decided.
+        """
+        limiter = self.client.rate_limiter
+        if limiter is not None and cancel.wait(limiter.reserve(url)):
+            raise FetchCancelled()
+        slot = self._slot(url)
+        while not slot.acquire(timeout=0.1):
+            if cancel.is_set():
+                raise FetchCancelled()
+        try:
+            if cancel.is_set():
+                raise FetchCancelled()
+            response = self.client.get(url, headers=headers, stream=True, rate_limited=False)
+            try:
+                chunks = []
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if cancel.is_set():
+                        raise FetchCancelled()
+                    chunks.append(chunk)
+                return response.status_code, b''.join(chunks).decode(response.encoding or 'utf-8', 'replace')
+            finally:
+                # Closing a partially read streamed response drops the connection instead of draining it
+                response.close()
+        finally:
+            slot.release()
+
+    def fetch_first(self, candidates, headers=None, hedge_delay=0.75, max_parallel=3):
+        """Race candidates, a list of (name, url), and return (index, body, errors)
+
+        index is None when no candidate produced a non-empty HTTP 200 body. errors
+        holds one message per failed attempt, in completion order.
+        """
+        cancel = threading.Event()
+        running = {}
+        errors = []
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            name, url = candidates[next_index]
+            future = self._executor.submit(self._fetch, url, headers, cancel)
+            running[future] = next_index
+            with self._lock:
+                self.launched += 1
+                if next_index > 0:
+                    self.hedges += 1
+            next_index += 1
+
+        try:
+            if candidates:
+                launch()
+            while running:
+                can_hedge = next_index < len(candidates) and len(running) < max_parallel
+                done, _ = concurrent.futures.wait(
+                    running, timeout=hedge_delay if can_hedge else None,
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                if not done:
+                    # Hedge delay elapsed with nothing back yet: start the next-best candidate
+                    launch()
+                    continue
+
+                for future in done:
+                    index = running.pop(future)
+                    name = candidates[index][0]
+                    try:
+                        status_code, body = future.result()
+                    except Exception as e:
+                        errors.append(f"{name} fetch error: {str(e)}")
+                        continue
+                    if status_code == 200 and body.strip():
+                        if index > 0:
+                            with self._lock:
+                                self.wins_by_hedge += 1
+                        return index, body, errors
+                    errors.append(f"{name} fetch failed: HTTP {status_code}")
+
+                # A failed attempt is replaced right away; upstream pacing (including
+                # backing off after 429s) is the HTTP client's rate limiter's job
+                if next_index < len(candidates) and len(running) < max_parallel:
+                    launch()
+            return None, None, errors
+        finally:
+            cancel.set()
+            with self._lock:
+                self.cancelled += len(running)
+            for future in running:
+                future.cancel()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'launched': self.launched,
+                'hedges': self.hedges,
+                'wins_by_hedge': self.wins_by_hedge,
+                'cancelled': self.cancelled,
+                'per_host_limit': self.per_host_limit
+            }
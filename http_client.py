@@ -0,0 +1,105 @@
+"""
+Pooled, keep-alive HTTP client shared by every caption-fetching code path
+
+A single requests.Session per process reuses TCP+TLS connections to YouTube
+instead of paying a fresh handshake on every caption fetch.
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class PooledHTTPClient:
+    """Thread-safe wrapper around a connection-pooled requests.Session with retries and timeouts
+
+    pool_connections is the number of hosts kept pooled, pool_maxsize the number of
+    connections kept per host; with pool_block=True pool_maxsize is also a hard cap on
+    concurrent connections per host.
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=20, pool_block=False,
+                 max_retries=2, backoff_factor=0.5, connect_timeout=5.0, read_timeout=15.0,
+                 rate_limiter=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.rate_limiter = rate_limiter
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.request_errors = 0
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            # 429s are left to the caller's rate limiting rather than retried blindly; urllib3 would
+            # otherwise retry any 429 carrying Retry-After, whatever status_forcelist says
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            raise_on_status=False,
+            respect_retry_after_header=False
+        )
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+
+    def get(self, url, headers=None, timeout=None, rate_limited=True, **kwargs):
+        """GET url through the shared pool; headers are per request, never stored on the session
+
+        With a rate limiter attached, the call first queues for a token for url's host
+        (raising RateLimitTimeout if none is due in time) and reports the status back.
+        rate_limited=False skips the queueing, for callers that reserved their token themselves.
+        """
+        if self.rate_limiter is not None and rate_limited:
+            self.rate_limiter.acquire(url)
+        with self._lock:
+            self.requests_sent += 1
+        try:
+            response = self.session.get(url, headers=headers, timeout=timeout or self.timeout, **kwargs)
+        except requests.RequestException:
+            with self._lock:
+                self.request_errors += 1
+            raise
+        if self.rate_limiter is not None:
+            self.rate_limiter.observe(url, response.status_code, response.headers.get('Retry-After'))
+        return response
+
+    def stats(self):
+        """Report per-host connection reuse: requests served vs. connections opened"""
+        pools = self._adapter.poolmanager.pools
+        hosts = {}
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}:{pool.port}"
+            hosts[host] = {
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                # The pool queue is pre-filled with None placeholders; count real idle connections
+                'idle_connections': sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0
+            }
+
+        opened = sum(h['connections_opened'] for h in hosts.values())
+        served = sum(h['requests'] for h in hosts.values())
+        with self._lock:
+            stats = {
+                'requests_sent': self.requests_sent,
+                'request_errors': self.request_errors,
+                'connections_opened': opened,
+                'connections_reused': max(0, served - opened),
+                'reuse_ratio': round(1 - opened / served, 4) if served else 0.0,
+                'hosts': hosts
+            }
+        if self.rate_limiter is not None:
+            stats['rate_limits'] = self.rate_limiter.stats()
+        return stats
@@ -0,0 +1,249 @@
+"""
+Asynchronous download jobs with progress polling and cancellation
+
+POST /jobs/download returns a job ID at once; a bounded thread pool runs the
+download (which itself executes in an extraction worker process). Job state lives
+in small JSON files under a jobs directory, so it can be written from the
+extraction process and read or cancelled from any gunicorn worker:
+
+    <id>.json           job record (status, request, result or error), written by the owning worker
+    <id>.progress.json  bytes / speed / ETA, written by the process doing the download
+    <id>.cancel         cancellation marker, checked by the download between progress updates
+
+The owning worker keeps at most max_records jobs; the oldest finished ones are
+evicted (files included), and records older than retention seconds are swept.
+"""
+
+import concurrent.futures
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+ACTIVE = ('queued', 'running')
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+class JobCancelled(Exception):
+    """Raised inside a download whose job was cancelled"""
+
+
+class JobQueueFull(Exception):
+    """Raised when the job executor already holds as many jobs as it admits"""
+
+
+def _write_json(path, data):
+    # Write-then-rename so readers in other processes never see a partial file
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class JobProgress:
+    """Picklable progress channel handed to whatever process runs the download
+
+    update() writes at most once per interval (and checks for cancellation when it
+    does); hook() adapts it to yt-dlp's progress_hooks.
+    """
+
+    def __init__(self, path, cancel_path, interval=0.5):
+        self.path = path
+        self.cancel_path = cancel_path
+        self.interval = interval
+        self._last = 0.0
+
+    def cancelled(self):
+        return os.path.exists(self.cancel_path)
+
+    def check(self):
+        if self.cancelled():
+            raise JobCancelled('Job was cancelled')
+
+    def update(self, force=False, **fields):
+        now = time.monotonic()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        self.check()
+        _write_json(self.path, dict(fields, updated_at=datetime.now().isoformat()))
+
+    def hook(self, status):
+        """yt-dlp progress hook"""
+        self.update(
+            force=status.get('status') != 'downloading',
+            status=status.get('status'),
+            downloaded_bytes=status.get('downloaded_bytes'),
+            total_bytes=status.get('total_bytes') or status.get('total_bytes_estimate'),
+            speed=status.get('speed'),
+            eta=status.get('eta'),
+            fragment_index=status.get('fragment_index'),
+            fragment_count=status.get('fragment_count')
+        )
+
+
+class JobManager:
+    """Runs jobs on a bounded thread pool and keeps their state in a shared directory"""
+
+    def __init__(self, root, max_running=4, max_queued=16, max_records=200, retention=3600.0):
+        self.root = root
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.max_records = max_records
+        self.retention = retention
+        os.makedirs(root, exist_ok=True)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_running, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()  # job_id -> Future, for jobs submitted by this process
+        self.submitted = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def _path(self, job_id, suffix='.json'):
+        return os.path.join(self.root, f'{job_id}{suffix}')
+
+    def progress_channel(self, job_id):
+        return JobProgress(self._path(job_id, '.progress.json'), self._path(job_id, '.cancel'))
+
+    def submit(self, kind, params, fn):
+        """Queue fn(progress) -> (payload, http_status) as a job and return its initial record"""
+        with self._lock:
+            active = sum(1 for future in self._jobs.values() if not future.done())
+            if active >= self.max_running + self.max_queued:
+                self.rejected += 1
+                raise JobQueueFull(f"Job queue full ({self.max_running} running, {self.max_queued} queued)")
+            job_id = uuid.uuid4().hex
+            record = {
+                'job_id': job_id,
+                'kind': kind,
+                'params': params,
+                'status': 'queued',
+                'created_at': datetime.now().isoformat(),
+                'worker_pid': os.getpid()
+            }
+            _write_json(self._path(job_id), record)
+            self._jobs[job_id] = self._executor.submit(self._run, job_id, fn)
+            self.submitted += 1
+        self._evict()
+        return record
+
+    def _run(self, job_id, fn):
+        progress = self.progress_channel(job_id)
+        record = _read_json(self._path(job_id)) or {'job_id': job_id}
+        if progress.cancelled():
+            self._finish(record, 'cancelled')
+            return
+        self._save(record, status='running', started_at=datetime.now().isoformat())
+        try:
+            payload, status = fn(progress)
+        except Exception as e:
+            if progress.cancelled():
+                self._finish(record, 'cancelled')
+            else:
+                # A timed-out download may still be running in its worker: tell it to stop
+                open(progress.cancel_path, 'a').close()
+                self._finish(record, 'failed', error=str(e))
+            return
+        if status < 400:
+            self._finish(record, 'finished', result=payload)
+        else:
+            self._finish(record, 'failed', error=payload.get('error'), result=payload)
+
+    def _save(self, record, **fields):
+        record.update(fields)
+        _write_json(self._path(record['job_id']), record)
+
+    def _finish(self, record, status, **fields):
+        self._save(record, status=status, finished_at=datetime.now().isoformat(), **fields)
+
+    def get(self, job_id):
+        """Current record with the latest progress merged in, or None for unknown jobs"""
+        if not JOB_ID_PATTERN.fullmatch(job_id or ''):
+            return None
+        record = _read_json(self._path(job_id))
+        if record is None:
+            return None
+        progress = _read_json(self._path(job_id, '.progress.json'))
+        if progress:
+            record['progress'] = progress
+        if record['status'] in ACTIVE and os.path.exists(self._path(job_id, '.cancel')):
+            record['status'] = 'cancelling'
+        return record
+
+    def cancel(self, job_id):
+        """Cancel an active job (from any worker), or delete a finished one; returns the record or None"""
+        record = self.get(job_id)
+        if record is None:
+            return None
+        if record['status'] not in ACTIVE + ('cancelling',):
+            self._remove(job_id)
+            record['deleted'] = True
+            return record
+
+        open(self._path(job_id, '.cancel'), 'a').close()
+        with self._lock:
+            future = self._jobs.get(job_id)
+        if future is not None and future.cancel():
+            # Still queued in this process: it will never start
+            record.pop('progress', None)
+            self._finish(record, 'cancelled')
+            return record
+        record['status'] = 'cancelling'
+        return record
+
+    def _remove(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        for suffix in ('.json', '.progress.json', '.cancel'):
+            try:
+                os.unlink(self._path(job_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        """Keep at most max_records of this process's jobs and drop anyone's records past retention"""
+        with self._lock:
+            finished = [job_id for job_id, future in self._jobs.items() if future.done()]
+            excess = len(self._jobs) - self.max_records
+        for job_id in finished[:max(0, excess)]:
+            self._remove(job_id)
+            with self._lock:
+                self.evicted += 1
+
+        cutoff = time.time() - self.retention
+        for entry in os.scandir(self.root):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    job_id = entry.name.split('.', 1)[0]
+                    with self._lock:
+                        future = self._jobs.get(job_id)
+                    if future is None or future.done():
+                        os.unlink(entry.path)
+            except FileNotFoundError:
+                continue
+
+    def stats(self):
+        with self._lock:
+            active = sum(1 for future in self._jobs.values() if not future.done())
+            return {
+                'tracked': len(self._jobs),
+                'active': active,
+                'max_running': self.max_running,
+                'max_queued': self.max_queued,
+                'max_records': self.max_records,
+                'submitted': self.submitted,
+                'rejected': self.rejected,
+                'evicted': self.evicted
+            }
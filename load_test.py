@@ -2,16 +2,36 @@
 """
 yt-dlp Service Load Testing Script
 Sends concurrent requests to test auto-scaling behavior
+
+By default requests go out in closed-loop batches of --concurrent. With --rate the
+tester runs open-loop instead: requests are scheduled at a fixed or Poisson arrival
+rate regardless of how fast earlier ones complete, and each latency is measured from
+the request's intended send time, so queueing (in the service or behind the
+--max-outstanding cap) shows up in the tail instead of slowing the test down.
+
+--scenario FILE replaces the default (POST /test-download over a fixed video list) with
+a weighted mix of endpoints whose payloads are drawn from URL pools (optionally
+Zipf-skewed, so a few hot videos dominate as in production), language choices and
+the like, plus a think time between closed-loop batches; see Scenario.
+
+Latencies go into HDR-style histograms per endpoint and per outcome; --report writes
+them as JSON or CSV, and --compare OLD.json NEW.json diffs two saved runs and exits
+non-zero on regressions.
 """
 
 import asyncio
 import aiohttp
 import time
 import argparse
+import bisect
+import csv
+import itertools
 import json
+import os
+import random
 from datetime import datetime, timedelta
 from dataclasses import dataclass
-from typing import List, Dict
+from typing import List, Dict, Optional
 import sys
 
 @dataclass
@@ -22,12 +42,252 @@ class TestResult:
     downloaded_bytes: int
     error: str = ""
     timestamp: str = ""
+    send_delay: float = 0.0  # Open-loop: how late the request went out after its intended send time
+    endpoint: str = "POST /test-download"
+
+PERCENTILES = (50, 90, 99, 99.9)
+COLORS = sys.stdout.isatty() and not os.environ.get("NO_COLOR")
+DEFAULT_THINK_TIME = 2.0  # Closed loop: seconds between batches unless the scenario says otherwise
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram of latencies: microsecond values, under 1% relative error
+
+    Values below 256µs are counted exactly; above that every power of two is split into
+    128 linear sub-buckets, so memory stays small however many requests are recorded.
+    """
+
+    SUB_BUCKET_BITS = 8
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _key(self, micros: int) -> int:
+        shift = max(0, micros.bit_length() - self.SUB_BUCKET_BITS)
+        return (shift << self.SUB_BUCKET_BITS) | (micros >> shift)
+
+    def _value(self, key: int) -> float:
+        """Midpoint of a bucket, in seconds"""
+        shift, sub = key >> self.SUB_BUCKET_BITS, key & ((1 << self.SUB_BUCKET_BITS) - 1)
+        return ((sub << shift) + ((1 << shift) - 1) / 2) / 1e6
+
+    def record(self, seconds: float):
+        key = self._key(max(0, int(seconds * 1e6)))
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other: "LatencyHistogram") -> "LatencyHistogram":
+        """Add other's samples; both use the same buckets, so nothing is lost to re-bucketing"""
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, pct: float) -> float:
+        """Smallest recorded value (to bucket precision) that pct percent of the samples do not exceed"""
+        if not self.count:
+            return 0.0
+        rank = max(1, -(-self.count * pct // 100))
+        seen = 0
+        for key in sorted(self.counts):
+            seen += self.counts[key]
+            if seen >= rank:
+                return min(self._value(key), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        summary = {"count": self.count, "mean": self.total / self.count if self.count else 0.0}
+        summary.update({f"p{pct:g}": self.percentile(pct) for pct in PERCENTILES})
+        summary["max"] = self.max
+        return summary
+
+def compare_reports(old_path: str, new_path: str, threshold: float) -> int:
+    """Print per endpoint/outcome latency and success-rate changes between two JSON reports; returns regressions"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    regressions = 0
+    print(f"📊 {old_path} -> {new_path} (regression: p50/p90/p99 of all or successful requests +{threshold:.0%}, or success rate -1 point)")
+    for endpoint, after in new["endpoints"].items():
+        before = old["endpoints"].get(endpoint)
+        print(f"\n{endpoint}")
+        if before is None:
+            print("   (not in the old report)")
+            continue
+        change = after["success_rate"] - before["success_rate"]
+        flagged = change < -1
+        regressions += flagged
+        print(f"   {'success rate':<14} {before['success_rate']:9.1f}% {after['success_rate']:9.1f}% {change:+9.1f} pts"
+              f"{'  REGRESSION' if flagged else ''}")
+        for outcome, latency in after["latency"].items():
+            previous = before["latency"].get(outcome)
+            if previous is None or not previous["count"]:
+                continue
+            for stat in ("p50", "p90", "p99", "p99.9", "max"):
+                ratio = latency[stat] / previous[stat] - 1 if previous[stat] else 0.0
+                # Latencies of failed requests are reported, not judged
+                flagged = outcome in ("ALL", "SUCCESS") and stat in ("p50", "p90", "p99") and ratio > threshold
+                regressions += flagged
+                print(f"   {outcome + ' ' + stat:<14} {previous[stat]:9.3f}s {latency[stat]:9.3f}s {ratio:+10.1%}"
+                      f"{'  REGRESSION' if flagged else ''}")
+    print(f"\n{'❌ ' + str(regressions) + ' regression(s)' if regressions else '✅ No regressions'}")
+    return regressions
+
+class VideoPool:
+    """Video URLs to draw from: in rotation, uniformly, or Zipf-skewed with the first URL the hottest"""
+
+    SKEWS = ("round_robin", "uniform", "zipf")
+
+    def __init__(self, urls: List[str], skew: str = "uniform", exponent: float = 1.0):
+        if not urls:
+            raise ValueError("Video pool is empty")
+        if skew not in self.SKEWS:
+            raise ValueError(f"Unknown video pool skew: {skew} (expected one of {', '.join(self.SKEWS)})")
+        self.urls = urls
+        self.skew = skew
+        self.count = 0
+        # Zipf: the k-th URL is drawn with probability proportional to 1 / k^exponent
+        self.cumulative = list(itertools.accumulate(1 / k ** exponent for k in range(1, len(urls) + 1)))
+
+    @classmethod
+    def from_spec(cls, spec: Dict, default_urls: List[str]) -> "VideoPool":
+        """{"urls": [...]} or {"size": N} (synthetic IDs, for fake_youtube.py), plus "skew" and "exponent" """
+        urls = spec.get("urls")
+        if urls is None and spec.get("size"):
+            urls = [f"https://www.youtube.com/watch?v=vid{n:08d}" for n in range(spec["size"])]
+        return cls(urls or default_urls, spec.get("skew", "uniform"), spec.get("exponent", 1.0))
+
+    def sample(self, rng: random.Random) -> str:
+        if self.skew == "round_robin":
+            self.count += 1
+            return self.urls[(self.count - 1) % len(self.urls)]
+        if self.skew == "zipf":
+            return self.urls[bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1])]
+        return rng.choice(self.urls)
+
+@dataclass
+class ScenarioRequest:
+    endpoint: str  # Report key, e.g. "POST /extract-captions"
+    method: str
+    path: str
+    payload: Optional[Dict]
+    video_url: str
+    timeout: float
+
+class Scenario:
+    """Weighted mix of endpoints, each with a payload template, plus the think time between closed-loop batches
+
+    A scenario file (JSON, or YAML with PyYAML installed) looks like:
+
+        {"name": "production-mix", "seed": 1, "think_time": {"exp": 1.0},
+         "video_pools": {"hot": {"size": 1000, "skew": "zipf", "exponent": 1.1}},
+         "endpoints": [
+           {"path": "/extract-captions", "weight": 80, "pool": "hot",
+            "payload": {"url": "$video", "language": {"choice": {"en": 7, "de": 2, "es": 1}}}},
+           {"method": "GET", "path": "/health", "weight": 5}]}
+
+    In payloads "$video" draws a URL from the endpoint's pool ("default": the built-in list in
+    rotation), {"choice": {value: weight}} or {"choice": [values]} picks one value, {"videos": N}
+    draws a list of N URLs, and fields that come out null are left out. GET payloads go in the
+    query string. think_time is seconds, {"uniform": [low, high]} or {"exp": mean}.
+    """
+
+    def __init__(self, spec: Dict, default_videos: List[str]):
+        self.name = spec.get("name", "custom")
+        self.rng = random.Random(spec.get("seed"))
+        self.pools = {name: VideoPool.from_spec(pool, default_videos)
+                      for name, pool in (spec.get("video_pools") or {}).items()}
+        self.pools.setdefault("default", VideoPool(default_videos, "round_robin"))
+        self.think = spec.get("think_time", DEFAULT_THINK_TIME)
+        if isinstance(self.think, dict) and (len(self.think) != 1 or set(self.think) - {"uniform", "exp"}):
+            raise ValueError(f"Unknown think_time: {self.think}")
+
+        self.endpoints = []
+        for endpoint in spec.get("endpoints") or []:
+            method = endpoint.get("method", "POST").upper()
+            if endpoint.get("pool", "default") not in self.pools:
+                raise ValueError(f"Unknown video pool: {endpoint['pool']}")
+            self.endpoints.append(dict(endpoint, method=method, name=endpoint.get("name") or f"{method} {endpoint['path']}"))
+        if not self.endpoints:
+            raise ValueError("Scenario has no endpoints")
+        self.weights = [endpoint.get("weight", 1) for endpoint in self.endpoints]
+        if any(isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight < 0 for weight in self.weights):
+            raise ValueError(f"Endpoint weights must be non-negative numbers: {self.weights}")
+        if not sum(self.weights):
+            raise ValueError("Every endpoint has weight 0")
+
+    @classmethod
+    def load(cls, path: str, default_videos: List[str]) -> "Scenario":
+        with open(path) as f:
+            if path.endswith((".yaml", ".yml")):
+                import yaml  # Only YAML scenarios need PyYAML; it is not a service dependency
+                spec = yaml.safe_load(f)
+            else:
+                spec = json.load(f)
+        return cls(spec, default_videos)
+
+    @classmethod
+    def default(cls, default_videos: List[str]) -> "Scenario":
+        """POST /test-download over the built-in videos in rotation, 2s between batches"""
+        return cls({"name": "test-download", "endpoints": [{"path": "/test-download", "payload": {"url": "$video"}}]},
+                   default_videos)
+
+    def describe(self) -> str:
+        total = sum(self.weights)
+        return ", ".join(f"{endpoint['name']} {weight / total:.0%}" for endpoint, weight in zip(self.endpoints, self.weights))
+
+    def _render(self, template, pool: VideoPool):
+        if template == "$video":
+            return pool.sample(self.rng)
+        if isinstance(template, dict):
+            if set(template) == {"choice"}:
+                options = template["choice"]
+                if isinstance(options, dict):
+                    return self._render(self.rng.choices(list(options), weights=list(options.values()))[0], pool)
+                return self._render(self.rng.choice(options), pool)
+            if set(template) == {"videos"}:
+                return [pool.sample(self.rng) for _ in range(template["videos"])]
+            rendered = {key: self._render(value, pool) for key, value in template.items()}
+            return {key: value for key, value in rendered.items() if value is not None}
+        if isinstance(template, list):
+            return [self._render(item, pool) for item in template]
+        return template
+
+    def next_request(self) -> ScenarioRequest:
+        endpoint = self.rng.choices(self.endpoints, weights=self.weights)[0]
+        payload = self._render(endpoint.get("payload"), self.pools[endpoint.get("pool", "default")])
+        video_url = payload.get("url") if isinstance(payload, dict) else None
+        return ScenarioRequest(endpoint=endpoint["name"], method=endpoint["method"], path=endpoint["path"],
+                               payload=payload, video_url=video_url if isinstance(video_url, str) else "",
+                               timeout=endpoint.get("timeout", 60))
+
+    def think_time(self) -> float:
+        if isinstance(self.think, dict):
+            if "uniform" in self.think:
+                return self.rng.uniform(*self.think["uniform"])
+            return self.rng.expovariate(1 / self.think["exp"]) if self.think["exp"] > 0 else 0.0
+        return float(self.think)
 
 class YTDLPLoadTester:
-    def __init__(self, base_url: str, duration_minutes: int = 5, concurrent_requests: int = 5):
+    def __init__(self, base_url: str, duration_minutes: float = 5, concurrent_requests: int = 5,
+                 rate: float = 0.0, arrival: str = "fixed", max_outstanding: int = 100, scenario_path: str = None):
         self.base_url = base_url.rstrip('/')
         self.duration_minutes = duration_minutes
         self.concurrent_requests = concurrent_requests
+        # Open-loop mode (rate > 0): target requests/s, "fixed" or "poisson" spacing, cap on requests in flight
+        self.rate = rate
+        self.arrival = arrival
+        self.max_outstanding = max_outstanding
+        self.cap_waits = 0
+        self.send_window = 0.0  # Open loop: seconds from the first to the last request sent
         self.test_videos = [
             "https://www.youtube.com/watch?v=dQw4w9WgXcQ",  # Rick Astley - Never Gonna Give You Up
             "https://www.youtube.com/watch?v=jNQXAC9IVRw",  # Me at the zoo (first YouTube video)
@@ -141,84 +401,79 @@ class YTDLPLoadTester:
             "https://www.youtube.com/watch?v=J69CJ5TW4R8",  # Radiohead - Karma Police
             "https://www.youtube.com/watch?v=VrpGhEVyrk0"   # The Beatles - Come Together
         ]
+        if scenario_path:
+            self.scenario = Scenario.load(scenario_path, self.test_videos)
+        else:
+            self.scenario = Scenario.default(self.test_videos)
         self.results: List[TestResult] = []
         self.start_time = None
         self.end_time = None
         
-    async def send_download_request(self, session: aiohttp.ClientSession, video_url: str, request_id: int) -> TestResult:
-        """Send a single download request and return the result"""
-        start_time = time.time()
+    async def send_request(self, session: aiohttp.ClientSession, request: ScenarioRequest, request_id: int,
+                           intended_start: float = None) -> TestResult:
+        """Send a single scenario request and return the result
+
+        With intended_start (open-loop), response times count from that moment rather than from
+        when the request actually went out, so time spent waiting to be sent is not hidden.
+        """
+        sent_at = time.time()
+        start_time = intended_start if intended_start is not None else sent_at
         timestamp = datetime.now().strftime("%H:%M:%S")
+        result = await self._send_request(session, request, start_time, timestamp)
+        result.send_delay = sent_at - start_time
+        return result
+
+    async def _send_request(self, session: aiohttp.ClientSession, request: ScenarioRequest, start_time: float,
+                            timestamp: str) -> TestResult:
+        
+        def result(status: str, downloaded_bytes: int = 0, error: str = "") -> TestResult:
+            return TestResult(
+                url=request.video_url,
+                status=status,
+                response_time=time.time() - start_time,
+                downloaded_bytes=downloaded_bytes,
+                error=error,
+                timestamp=timestamp,
+                endpoint=request.endpoint
+            )
         
         try:
-            payload = {"url": video_url}
             headers = {
                 "Content-Type": "application/json",
                 "Accept": "application/json"
             }
+            if request.method == "GET":
+                body = {"params": request.payload}
+            else:
+                body = {"json": request.payload}
             
-            timeout = aiohttp.ClientTimeout(total=60)  # 60 second timeout
+            timeout = aiohttp.ClientTimeout(total=request.timeout)
             
-            async with session.post(
-                f"{self.base_url}/test-download",
-                json=payload,
+            async with session.request(
+                request.method,
+                f"{self.base_url}{request.path}",
                 headers=headers,
-                timeout=timeout
+                timeout=timeout,
+                **body
             ) as response:
-                response_time = time.time() - start_time
+                # Read the whole body first: streamed responses (NDJSON batches) are only done at the end
+                content = await response.read()
                 
                 if response.status == 200:
-                    data = await response.json()
-                    
-                    if data.get('success', False):
-                        return TestResult(
-                            url=video_url,
-                            status="SUCCESS",
-                            response_time=response_time,
-                            downloaded_bytes=data.get('downloaded_bytes', 0),
-                            timestamp=timestamp
-                        )
-                    else:
-                        return TestResult(
-                            url=video_url,
-                            status="FAILED",
-                            response_time=response_time,
-                            downloaded_bytes=0,
-                            error=data.get('error', 'Unknown error'),
-                            timestamp=timestamp
-                        )
-                else:
-                    return TestResult(
-                        url=video_url,
-                        status="HTTP_ERROR",
-                        response_time=response_time,
-                        downloaded_bytes=0,
-                        error=f"HTTP {response.status}",
-                        timestamp=timestamp
-                    )
+                    try:
+                        data = json.loads(content)
+                    except ValueError:
+                        data = None  # NDJSON or plain text: the status is all there is to judge
+                    if not isinstance(data, dict) or data.get('success', True):
+                        downloaded_bytes = data.get('downloaded_bytes', 0) if isinstance(data, dict) else 0
+                        return result("SUCCESS", downloaded_bytes)
+                    return result("FAILED", error=data.get('error', 'Unknown error'))
+                return result("HTTP_ERROR", error=f"HTTP {response.status}")
                     
         except asyncio.TimeoutError:
-            return TestResult(
-                url=video_url,
-                status="TIMEOUT",
-                response_time=time.time() - start_time,
-                downloaded_bytes=0,
-                error="Request timeout after 60s",
-                timestamp=timestamp
-            )
+            return result("TIMEOUT", error=f"Request timeout after {request.timeout:g}s")
         except Exception as e:
-            return TestResult(
-                url=video_url,
-                status="ERROR",
-                response_time=time.time() - start_time,
-                downloaded_bytes=0,
-                error=str(e),
-                timestamp=timestamp
-            )
-
-    def get_next_video_url(self, request_count: int) -> str:
-        """Get the next video URL in rotation"""
-        return self.test_videos[request_count % len(self.test_videos)]
+            return result("ERROR", error=str(e))
 
     def print_result(self, result: TestResult, request_id: int):
         """Print a single test result with clean formatting"""
@@ -229,21 +484,21 @@ class YTDLPLoadTester:
             "ERROR": "\033[91m",    # Red
             "HTTP_ERROR": "\033[91m"  # Red
         }
-        reset_color = "\033[0m"
+        reset_color = "\033[0m" if COLORS else ""
         
-        color = status_color.get(result.status, "")
+        color = status_color.get(result.status, "") if COLORS else ""
         status_icon = "✅" if result.status == "SUCCESS" else "❌"
         
         # Extract video title from URL for cleaner display
-        video_id = result.url.split('=')[-1][:11] if '=' in result.url else "unknown"
+        video_id = result.url.split('=')[-1][:11] if '=' in result.url else "-"
         
         if result.status == "SUCCESS":
             size_mb = result.downloaded_bytes / (1024 * 1024)
             print(f"{status_icon} [{result.timestamp}] Req#{request_id:3d} | {color}{result.status:10s}{reset_color} | "
-                  f"{video_id} | {result.response_time:6.2f}s | {size_mb:6.2f}MB")
+                  f"{result.endpoint:<24.24} | {video_id:<11} | {result.response_time:6.2f}s | {size_mb:6.2f}MB")
         else:
             print(f"{status_icon} [{result.timestamp}] Req#{request_id:3d} | {color}{result.status:10s}{reset_color} | "
-                  f"{video_id} | {result.response_time:6.2f}s | {result.error}")
+                  f"{result.endpoint:<24.24} | {video_id:<11} | {result.response_time:6.2f}s | {result.error}")
 
     def print_progress(self, completed: int, total_time: float):
         """Print progress update"""
@@ -252,12 +507,74 @@ class YTDLPLoadTester:
         print(f"\n📊 Progress: {completed} requests completed | "
               f"⏱️  Elapsed: {elapsed_minutes:.1f}m | Remaining: {remaining_minutes:.1f}m")
 
+    def build_report(self) -> Dict:
+        """Run settings plus, per endpoint, success rate, throughput and latency histograms (all and per outcome)"""
+        total_duration = (self.end_time - self.start_time).total_seconds()
+        grouped: Dict[str, List[TestResult]] = {}
+        for result in self.results:
+            grouped.setdefault(result.endpoint, []).append(result)
+
+        endpoints = {}
+        for endpoint, results in grouped.items():
+            histograms = {}
+            for result in results:
+                histograms.setdefault(result.status, LatencyHistogram()).record(result.response_time)
+            overall = LatencyHistogram()
+            for histogram in histograms.values():
+                overall.merge(histogram)
+            histograms = {"ALL": overall, **histograms}
+            successful = sum(1 for r in results if r.status == "SUCCESS")
+            endpoints[endpoint] = {
+                "requests": len(results),
+                "success_rate": successful / len(results) * 100,
+                "throughput_rps": len(results) / total_duration if total_duration else 0.0,
+                "downloaded_bytes": sum(r.downloaded_bytes for r in results if r.status == "SUCCESS"),
+                "latency": {outcome: histogram.summary() for outcome, histogram in histograms.items()}
+            }
+
+        run = {
+            "base_url": self.base_url,
+            "mode": "open" if self.rate else "closed",
+            "scenario": self.scenario.name,
+            "started_at": self.start_time.isoformat(),
+            "duration_seconds": total_duration,
+            "requests": len(self.results)
+        }
+        if self.rate:
+            send_delays = LatencyHistogram()
+            for result in self.results:
+                send_delays.record(result.send_delay)
+            run.update(rate=self.rate, arrival=self.arrival, max_outstanding=self.max_outstanding,
+                       sent_rps=len(self.results) / max(self.send_window, 1e-9), cap_waits=self.cap_waits,
+                       send_delay=send_delays.summary())
+        else:
+            run["concurrent"] = self.concurrent_requests
+        return {"run": run, "endpoints": endpoints}
+
+    def write_report(self, path: str):
+        """Write the report as JSON, or as one CSV row per endpoint and outcome (by file extension)"""
+        report = self.build_report()
+        if path.endswith(".csv"):
+            stats = ["count", "mean"] + [f"p{pct:g}" for pct in PERCENTILES] + ["max"]
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["endpoint", "outcome"] + stats + ["success_rate", "throughput_rps"])
+                for endpoint, data in report["endpoints"].items():
+                    for outcome, latency in data["latency"].items():
+                        writer.writerow([endpoint, outcome] + [latency[stat] for stat in stats]
+                                        + [data["success_rate"], data["throughput_rps"]])
+        else:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+        print(f"📝 Report written to {path}")
+
     def print_summary(self):
         """Print final test summary"""
         if not self.results:
             print("\n❌ No results to summarize")
             return
             
+        report = self.build_report()
         total_requests = len(self.results)
         successful = sum(1 for r in self.results if r.status == "SUCCESS")
         failed = total_requests - successful
@@ -265,11 +582,9 @@ class YTDLPLoadTester:
         total_bytes = sum(r.downloaded_bytes for r in self.results if r.status == "SUCCESS")
         total_mb = total_bytes / (1024 * 1024)
         
-        avg_response_time = sum(r.response_time for r in self.results) / total_requests
-        
         success_rate = (successful / total_requests) * 100
         
-        total_duration = (self.end_time - self.start_time).total_seconds()
+        total_duration = report["run"]["duration_seconds"]
         requests_per_minute = (total_requests / total_duration) * 60
         
         print(f"\n{'='*80}")
@@ -279,20 +594,22 @@ class YTDLPLoadTester:
         print(f"📈 Total Requests: {total_requests}")
         print(f"✅ Successful: {successful} ({success_rate:.1f}%)")
         print(f"❌ Failed: {failed} ({100-success_rate:.1f}%)")
-        print(f"⚡ Avg Response Time: {avg_response_time:.2f}s")
         print(f"📊 Requests/min: {requests_per_minute:.1f}")
+        if self.rate:
+            run = report["run"]
+            print(f"🎯 Open loop: target {self.rate:.2f} req/s ({self.arrival}), sent {run['sent_rps']:.2f} req/s")
+            print(f"⏳ Send delay p50/p99: {run['send_delay']['p50']:.3f}s / {run['send_delay']['p99']:.3f}s | "
+                  f"Waited for the {self.max_outstanding}-request cap: {self.cap_waits}")
         print(f"💾 Total Downloaded: {total_mb:.2f} MB")
         
-        # Failure breakdown
-        if failed > 0:
-            print(f"\n❌ Failure Breakdown:")
-            failure_types = {}
-            for result in self.results:
-                if result.status != "SUCCESS":
-                    failure_types[result.status] = failure_types.get(result.status, 0) + 1
-            
-            for failure_type, count in failure_types.items():
-                print(f"   {failure_type}: {count}")
+        # Latency distribution per endpoint, overall and per outcome
+        columns = ["mean"] + [f"p{pct:g}" for pct in PERCENTILES] + ["max"]
+        for endpoint, data in report["endpoints"].items():
+            print(f"\n⚡ {endpoint}: {data['requests']} requests, {data['success_rate']:.1f}% successful, "
+                  f"{data['throughput_rps']:.2f} req/s")
+            print(f"   {'Outcome':<12} {'Count':>7} " + " ".join(f"{column:>8}" for column in columns))
+            for outcome, latency in data["latency"].items():
+                print(f"   {outcome:<12} {latency['count']:>7} " + " ".join(f"{latency[column]:>7.2f}s" for column in columns))
         
         print(f"{'='*80}")
 
@@ -302,9 +619,9 @@ class YTDLPLoadTester:
         print(f"🎯 Target: {self.base_url}")
         print(f"⏱️  Duration: {self.duration_minutes} minutes")
         print(f"🔄 Concurrent Requests: {self.concurrent_requests}")
-        print(f"🎬 Video Pool: {len(self.test_videos)} videos")
+        print(f"🎬 Scenario: {self.scenario.name} ({self.scenario.describe()})")
         print(f"{'='*80}")
-        print(f"{'Status':<12} | {'Video ID':<11} | {'Time':<8} | {'Size/Error'}")
+        print(f"{'Status':<12} | {'Endpoint':<24} | {'Video ID':<11} | {'Time':<8} | {'Size/Error'}")
         print(f"{'='*80}")
         
         self.start_time = datetime.now()
@@ -316,15 +633,17 @@ class YTDLPLoadTester:
             while datetime.now() < end_time:
                 # Create batch of concurrent requests
                 tasks = []
+                requests = []
                 batch_start_count = request_count
                 
                 for i in range(self.concurrent_requests):
                     if datetime.now() >= end_time:
                         break
                         
-                    video_url = self.get_next_video_url(request_count)
-                    task = self.send_download_request(session, video_url, request_count + 1)
+                    request = self.scenario.next_request()
+                    task = self.send_request(session, request, request_count + 1)
                     tasks.append(task)
+                    requests.append(request)
                     request_count += 1
                 
                 if not tasks:
@@ -341,12 +660,13 @@ class YTDLPLoadTester:
                     else:
                         # Handle exceptions
                         error_result = TestResult(
-                            url="unknown",
+                            url=requests[i].video_url,
                             status="EXCEPTION",
                             response_time=0,
                             downloaded_bytes=0,
                             error=str(result),
-                            timestamp=datetime.now().strftime("%H:%M:%S")
+                            timestamp=datetime.now().strftime("%H:%M:%S"),
+                            endpoint=requests[i].endpoint
                         )
                         self.results.append(error_result)
                         self.print_result(error_result, batch_start_count + i + 1)
@@ -356,23 +676,109 @@ class YTDLPLoadTester:
                     elapsed_time = (datetime.now() - self.start_time).total_seconds()
                     self.print_progress(len(self.results), elapsed_time)
                 
-                # Small delay between batches to avoid overwhelming the service
-                await asyncio.sleep(2)
+                # Think time between batches (by default a small fixed delay to avoid overwhelming the service)
+                await asyncio.sleep(self.scenario.think_time())
         
         self.end_time = datetime.now()
         self.print_summary()
 
+    def next_interarrival(self, rng: random.Random) -> float:
+        """Seconds until the next scheduled request"""
+        if self.arrival == "poisson":
+            return rng.expovariate(self.rate)
+        return 1.0 / self.rate
+
+    async def run_open_loop(self):
+        """Run the load test open-loop: send on the arrival schedule, whether or not earlier requests finished"""
+        print(f"🚀 Starting yt-dlp Load Test (open loop)")
+        print(f"🎯 Target: {self.base_url}")
+        print(f"⏱️  Duration: {self.duration_minutes} minutes")
+        print(f"📈 Arrival Rate: {self.rate:.2f} req/s ({self.arrival})")
+        print(f"🚧 Max Outstanding: {self.max_outstanding}")
+        print(f"🎬 Scenario: {self.scenario.name} ({self.scenario.describe()})")
+        print(f"{'='*80}")
+        print(f"{'Status':<12} | {'Endpoint':<24} | {'Video ID':<11} | {'Time':<8} | {'Size/Error'}")
+        print(f"{'='*80}")
+
+        self.start_time = datetime.now()
+        started = time.time()
+        deadline = started + self.duration_minutes * 60
+        rng = random.Random()
+        slots = asyncio.Semaphore(self.max_outstanding)
+        tasks = set()
+        request_count = 0
+
+        async def send(request: ScenarioRequest, request_id: int, intended_start: float):
+            try:
+                result = await self.send_request(session, request, request_id, intended_start)
+            finally:
+                slots.release()
+            self.results.append(result)
+            self.print_result(result, request_id)
+            if len(self.results) % 10 == 0:
+                self.print_progress(len(self.results), time.time() - started)
+
+        # The connector must not queue requests itself, or that wait would escape the cap accounting
+        connector = aiohttp.TCPConnector(limit=self.max_outstanding)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            intended_start = started
+            while intended_start < deadline:
+                delay = intended_start - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if slots.locked():
+                    # Cap reached: this request waits, and the wait counts toward its response time
+                    self.cap_waits += 1
+                await slots.acquire()
+                request_count += 1
+                task = asyncio.create_task(send(self.scenario.next_request(), request_count, intended_start))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                intended_start += self.next_interarrival(rng)
+            self.send_window = time.time() - started
+
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.end_time = datetime.now()
+        self.print_summary()
+
 async def main():
     parser = argparse.ArgumentParser(description="yt-dlp Service Load Tester")
     parser.add_argument("--url", default="http://51.159.205.195", 
                        help="Base URL of yt-dlp service (default: http://51.159.205.195)")
-    parser.add_argument("--duration", type=int, default=5,
+    parser.add_argument("--duration", type=float, default=5,
                        help="Test duration in minutes (default: 5)")
     parser.add_argument("--concurrent", type=int, default=5,
                        help="Number of concurrent requests (default: 5)")
+    parser.add_argument("--rate", type=float, default=0.0,
+                       help="Open loop: requests per second, sent on schedule regardless of completions (default: off)")
+    parser.add_argument("--arrival", choices=["fixed", "poisson"], default="fixed",
+                       help="Open loop: evenly spaced or Poisson (exponential) arrivals (default: fixed)")
+    parser.add_argument("--max-outstanding", type=int, default=100,
+                       help="Open loop: most requests in flight; later arrivals wait, and the wait counts (default: 100)")
+    parser.add_argument("--scenario", metavar="FILE",
+                       help="Weighted endpoint mix, payload generators and think time (JSON, or YAML with PyYAML); "
+                            "default: POST /test-download only")
+    parser.add_argument("--report", action="append", default=[], metavar="FILE",
+                       help="Write the results to FILE (.json, or .csv for one row per endpoint and outcome); repeatable")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                       help="Compare two JSON reports instead of running a test; exits 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                       help="Latency increase counted as a regression by --compare (default: 0.1, i.e. +10%%)")
     
     args = parser.parse_args()
     
+    if args.compare:
+        return 1 if compare_reports(args.compare[0], args.compare[1], args.threshold) else 0
+    
+    try:
+        tester = YTDLPLoadTester(args.url, args.duration, args.concurrent, rate=args.rate, arrival=args.arrival,
+                                 max_outstanding=args.max_outstanding, scenario_path=args.scenario)
+    except Exception as e:
+        print(f"❌ Cannot load scenario {args.scenario}: {e}")
+        return 1
+    
     # Test connection first
     try:
         async with aiohttp.ClientSession() as session:
@@ -386,8 +792,13 @@ async def main():
     
     print(f"✅ Service health check passed")
     
-    tester = YTDLPLoadTester(args.url, args.duration, args.concurrent)
-    await tester.run_load_test()
+    if args.rate > 0:
+        await tester.run_open_loop()
+    else:
+        await tester.run_load_test()
+    if tester.results:
+        for path in args.report:
+            tester.write_report(path)
     
     return 0
 
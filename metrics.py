@@ -0,0 +1,102 @@
+"""
+Prometheus metrics for the yt-dlp service
+
+Under gunicorn every worker is a separate process, so metrics are written to
+prometheus_client's multiprocess files when PROMETHEUS_MULTIPROC_DIR is set
+(gunicorn.conf.py sets and cleans it up) and /metrics aggregates all workers.
+Without it (python app.py) the default single-process registry is used.
+"""
+
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import REGISTRY, multiprocess
+
+# Extraction and caption fetches range from cache hits (ms) to slow yt-dlp fallbacks (tens of seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+HTTP_REQUESTS = Counter(
+    'http_requests', 'HTTP requests served, by route, method and status code',
+    ['route', 'method', 'status']
+)
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time to produce an HTTP response, by route',
+    ['route', 'method'], buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'Requests currently being handled, by route',
+    ['route'], multiprocess_mode='livesum'
+)
+PHASE_DURATION = Histogram(
+    'ytdlp_phase_duration_seconds',
+    'Duration of caption extraction phases (metadata, caption_fetch, ytdlp_fallback, parse, total)',
+    ['endpoint', 'phase'], buckets=LATENCY_BUCKETS
+)
+CACHE_LOOKUPS = Counter(
+    'ytdlp_cache_lookups', 'Metadata and caption cache lookups, by result (hit/miss)',
+    ['cache', 'result']
+)
+UPSTREAM_THROTTLED = Counter(
+    'ytdlp_upstream_throttled', 'HTTP 429 responses received from upstream hosts',
+    ['host']
+)
+EXTRACTION_IN_FLIGHT = Gauge(
+    'ytdlp_extraction_jobs_in_flight', 'yt-dlp jobs admitted to the extraction pool (running or queued)',
+    multiprocess_mode='livesum'
+)
+EXTRACTION_QUEUE_DEPTH = Gauge(
+    'ytdlp_extraction_queue_depth', 'yt-dlp jobs waiting for a free extraction worker process',
+    multiprocess_mode='livesum'
+)
+
+
+def observe_phase(endpoint, phase, seconds):
+    PHASE_DURATION.labels(endpoint, phase).observe(seconds)
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_upstream_throttle(host):
+    UPSTREAM_THROTTLED.labels(host).inc()
+
+
+def record_extraction_pool(in_flight, queue_depth):
+    """ExtractionPool observer: this worker's admitted and queued jobs"""
+    EXTRACTION_IN_FLIGHT.set(in_flight)
+    EXTRACTION_QUEUE_DEPTH.set(queue_depth)
+
+
+class RequestTimer:
+    """Tracks one request: in-flight gauge while it runs, then count and latency by status"""
+
+    __slots__ = ('route', 'method', 'started')
+
+    def __init__(self, route, method):
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        HTTP_IN_FLIGHT.labels(route).inc()
+
+    def finish(self, status):
+        HTTP_IN_FLIGHT.labels(self.route).dec()
+        HTTP_REQUESTS.labels(self.route, self.method, str(status)).inc()
+        HTTP_REQUEST_DURATION.labels(self.route, self.method).observe(time.perf_counter() - self.started)
+
+
+def render_latest():
+    """Return (body, content_type) for a scrape, aggregated over all worker processes if multiprocess"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges (called from gunicorn's child_exit hook)"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
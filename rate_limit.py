@@ -0,0 +1,269 @@
+"""
+Adaptive token-bucket rate limiting for upstream YouTube hosts
+
+Each host gets a bucket that refills at `rate` tokens per second up to `burst`.
+Callers reserve a token and wait their turn in FIFO order instead of sleeping for
+a random interval. The rate adapts AIMD-style: every successful response adds
+`increase` tokens/s; a 429 multiplies the rate by `decrease` (at most once per
+`cooldown` seconds) and drains the bucket. A Retry-After on the 429 also holds back
+the next token until the time the server asked for (reservations handed out before
+the 429 keep their slots).
+
+TokenBucket keeps its state in process memory. SQLiteTokenBucket keeps it in a
+SQLite file so every worker process in a pod draws from the same bucket.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+
+class RateLimitTimeout(Exception):
+    """Raised when no token can be reserved within the caller's wait budget"""
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None if absent or invalid"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - (now or time.time()))
+    except (TypeError, ValueError):
+        return None
+
+
+class _BucketState:
+    """Token-bucket arithmetic shared by the in-memory and SQLite buckets"""
+    __slots__ = ('tokens', 'rate', 'updated_at', 'last_decrease')
+
+    def __init__(self, tokens, rate, updated_at, last_decrease=0.0):
+        self.tokens = tokens
+        self.rate = rate
+        self.updated_at = updated_at
+        self.last_decrease = last_decrease
+
+    def reserve(self, now, burst, max_wait):
+        """Take one token, allowing a negative balance (a queue position); return the wait in seconds"""
+        self.tokens = min(burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        if max_wait is not None and wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+    def succeed(self, increase, max_rate):
+        self.rate = min(max_rate, self.rate + increase)
+
+    def throttle(self, now, burst, decrease, min_rate, cooldown, retry_after=None):
+        decreased = now - self.last_decrease >= cooldown
+        if decreased:
+            self.rate = max(min_rate, self.rate * decrease)
+            self.tokens = min(self.tokens, 0.0)
+            self.last_decrease = now
+        if retry_after:
+            # The next token falls due no sooner than the server asked
+            self.tokens = min(burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens = min(self.tokens, 1 - retry_after * self.rate)
+        return decreased
+
+
+class TokenBucket:
+    """Process-local AIMD token bucket"""
+
+    def __init__(self, rate=5.0, burst=10, min_rate=0.5, max_rate=20.0,
+                 increase=0.05, decrease=0.5, cooldown=2.0, clock=time.monotonic, sleep=time.sleep):
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._state = _BucketState(float(burst), float(rate), clock())
+
+    @property
+    def rate(self):
+        return self._state.rate
+
+    def reserve(self, max_wait=None):
+        """Reserve a token without blocking and return the seconds until it is due"""
+        with self._lock:
+            wait = self._state.reserve(self._clock(), self.burst, max_wait)
+        if wait is None:
+            raise RateLimitTimeout(f"No upstream token within {max_wait:.1f}s (rate {self.rate:.2f}/s)")
+        return wait
+
+    def acquire(self, max_wait=None):
+        """Reserve a token, block until it is due, and return the seconds waited"""
+        wait = self.reserve(max_wait)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def on_success(self):
+        with self._lock:
+            self._state.succeed(self.increase, self.max_rate)
+
+    def on_throttle(self, retry_after=None):
+        with self._lock:
+            return self._state.throttle(self._clock(), self.burst, self.decrease, self.min_rate, self.cooldown,
+                                        retry_after)
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """Pod-wide AIMD token bucket whose state lives in a shared SQLite file (wall-clock time)"""
+
+    def __init__(self, path, name, rate=5.0, burst=10, **kwargs):
+        kwargs.setdefault('clock', time.time)
+        super().__init__(rate=rate, burst=burst, **kwargs)
+        self.path = path
+        self.name = name
+        self._initial_rate = float(rate)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            ' name TEXT PRIMARY KEY,'
+            ' tokens REAL NOT NULL,'
+            ' rate REAL NOT NULL,'
+            ' updated_at REAL NOT NULL,'
+            ' last_decrease REAL NOT NULL)'
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _update(self, apply):
+        """Run apply(state) inside a write transaction and persist the result"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT tokens, rate, updated_at, last_decrease FROM buckets WHERE name = ?', (self.name,)
+            ).fetchone()
+            state = _BucketState(*row) if row else _BucketState(float(self.burst), self._initial_rate, self._clock())
+            result = apply(state)
+            conn.execute(
+                'INSERT OR REPLACE INTO buckets (name, tokens, rate, updated_at, last_decrease) VALUES (?, ?, ?, ?, ?)',
+                (self.name, state.tokens, state.rate, state.updated_at, state.last_decrease)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._state = state  # Last seen shared state, for reporting
+        return result
+
+    # A broken shared file degrades to the process-local bucket rather than failing requests
+
+    def reserve(self, max_wait=None):
+        try:
+            wait = self._update(lambda state: state.reserve(self._clock(), self.burst, max_wait))
+        except sqlite3.Error as e:
+            print(f"Shared rate limiter unavailable for {self.name}, using local bucket: {e}")
+            return super().reserve(max_wait)
+        if wait is None:
+            raise RateLimitTimeout(f"No upstream token within {max_wait:.1f}s (rate {self.rate:.2f}/s)")
+        return wait
+
+    def on_success(self):
+        try:
+            self._update(lambda state: state.succeed(self.increase, self.max_rate))
+        except sqlite3.Error:
+            super().on_success()
+
+    def on_throttle(self, retry_after=None):
+        try:
+            return self._update(lambda state: state.throttle(self._clock(), self.burst, self.decrease, self.min_rate,
+                                                             self.cooldown, retry_after))
+        except sqlite3.Error:
+            return super().on_throttle(retry_after)
+
+
+class RateLimiter:
+    """Per-host AIMD buckets; acquire() before each upstream request, observe() its status after"""
+
+    def __init__(self, bucket_factory, max_wait=10.0, sleep=time.sleep, on_throttle=None):
+        self._bucket_factory = bucket_factory
+        self.max_wait = max_wait
+        self._sleep = sleep
+        self._on_throttle = on_throttle  # Called with the host on every 429, e.g. to export a metric
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._hosts = {}
+
+    def _bucket(self, host):
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = self._bucket_factory(host)
+                self._hosts[host] = {'acquired': 0, 'timeouts': 0, 'wait_seconds': 0.0,
+                                     'throttled': 0, 'rate_decreases': 0}
+            return bucket
+
+    def _count(self, host, counter, amount=1):
+        with self._lock:
+            self._hosts[host][counter] += amount
+
+    def reserve(self, url, max_wait=None):
+        """Reserve a token for url's host and return the seconds until it is due, without blocking
+
+        Async callers await asyncio.sleep() on the result; raises RateLimitTimeout past max_wait.
+        """
+        host = urlsplit(url).netloc
+        bucket = self._bucket(host)
+        try:
+            wait = bucket.reserve(self.max_wait if max_wait is None else max_wait)
+        except RateLimitTimeout:
+            self._count(host, 'timeouts')
+            raise
+        self._count(host, 'acquired')
+        self._count(host, 'wait_seconds', wait)
+        return wait
+
+    def acquire(self, url, max_wait=None):
+        """Wait for a token for url's host; raises RateLimitTimeout past max_wait"""
+        wait = self.reserve(url, max_wait)
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def observe(self, url, status_code, retry_after=None):
+        """Feed a response back into the host's rate: 429 backs off (honouring its Retry-After header), success probes upward"""
+        host = urlsplit(url).netloc
+        bucket = self._bucket(host)
+        if status_code == 429:
+            self._count(host, 'throttled')
+            if self._on_throttle is not None:
+                self._on_throttle(host)
+            if bucket.on_throttle(parse_retry_after(retry_after)):
+                self._count(host, 'rate_decreases')
+                print(f"Upstream 429 from {host}, rate reduced to {bucket.rate:.2f}/s")
+        elif status_code < 500:
+            bucket.on_success()
+
+    def stats(self):
+        with self._lock:
+            return {
+                host: dict(counters, wait_seconds=round(counters['wait_seconds'], 3),
+                           rate=round(self._buckets[host].rate, 3))
+                for host, counters in self._hosts.items()
+            }
@@ -0,0 +1,94 @@
+"""
+Per-request scratch directories and exact output tracking for yt-dlp downloads
+
+Every disk download gets its own directory under a scratch root. yt-dlp writes the
+media, .part and fragment files only there, and the whole directory is discarded
+when the request ends: it is first renamed to a .trash- name (atomic, so a
+half-deleted job directory is never visible) and then removed. Directories left
+behind by a crashed worker are swept once they are older than any job can run.
+
+OutputTracker records the filenames yt-dlp reports through its progress and
+post hooks, so callers know exactly what was written instead of guessing extensions.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+JOB_PREFIX = 'job-'
+TRASH_PREFIX = '.trash-'
+
+
+class ScratchDir:
+    """Context manager creating a private directory under root and discarding it on exit"""
+
+    def __init__(self, root):
+        self.root = root
+        self.path = None
+
+    def __enter__(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.path = tempfile.mkdtemp(prefix=JOB_PREFIX, dir=self.root)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.discard()
+        return False
+
+    def discard(self):
+        if self.path is None:
+            return
+        trash = os.path.join(self.root, f'{TRASH_PREFIX}{uuid.uuid4().hex}')
+        try:
+            os.rename(self.path, trash)
+        except FileNotFoundError:
+            return
+        finally:
+            self.path = None
+        shutil.rmtree(trash, ignore_errors=True)
+
+
+def sweep_scratch(root, max_age):
+    """Remove job and trash directories under root older than max_age seconds; returns how many"""
+    removed = 0
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not entry.name.startswith((JOB_PREFIX, TRASH_PREFIX)) or not entry.is_dir(follow_symlinks=False):
+            continue
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+class OutputTracker:
+    """Collects every path a YoutubeDL instance reports writing, and the final file of each download"""
+
+    def __init__(self):
+        self.written = set()
+        self.final_files = []
+
+    def attach(self, ydl):
+        ydl.add_progress_hook(self.progress_hook)
+        ydl.add_post_hook(self.post_hook)
+        return self
+
+    def progress_hook(self, status):
+        for key in ('tmpfilename', 'filename'):
+            if status.get(key):
+                self.written.add(status[key])
+
+    def post_hook(self, filename):
+        # Called once per video after all postprocessors (merges, moves) with the final path
+        self.written.add(filename)
+        self.final_files.append(filename)
@@ -0,0 +1,91 @@
+"""
+Periodic self-test with instant reads of the last result
+
+/ytdlp-info reports whether a live extraction works. Instead of extracting on every
+call, SelfTest runs the check on a daemon thread every interval seconds and the
+endpoint serves the last result with its age. With a shared store (one of the
+service caches), a worker adopts a result another worker stored within the
+interval instead of running its own, so the pod checks upstream about once per
+interval rather than once per worker.
+"""
+
+import random
+import threading
+import time
+
+STARTUP_JITTER = 5.0  # Seconds; spreads the first checks of workers started together
+
+
+class SelfTest:
+    """Runs check() -> dict on an interval and keeps its latest result (plus 'checked_at')"""
+
+    def __init__(self, check, interval, store=None, key='self-test'):
+        self.check = check
+        self.interval = interval
+        self.store = store
+        self.key = key
+        self._result = None
+        self._lock = threading.Lock()  # One check at a time per process
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self.runs = 0
+        self.adopted = 0
+        self.failures = 0
+
+    def start(self):
+        """Start the background refresher (no-op when interval <= 0 or already started)"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='self-test', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        delay = random.uniform(0, min(self.interval, STARTUP_JITTER))
+        while True:
+            time.sleep(delay)
+            try:
+                self.refresh(force=False)
+            except Exception as e:
+                self.failures += 1
+                print(f"Self-test refresh failed: {e}")
+            delay = self.interval
+
+    def refresh(self, force=True):
+        """Run the check now and return the result; force=False first tries a fresher stored result
+
+        Callers that queue behind a check already running get that check's result.
+        """
+        requested_at = time.time()
+        with self._lock:
+            if self._result is not None and self._result['checked_at'] >= requested_at:
+                return dict(self._result)
+            if not force and self.store is not None:
+                stored = self.store.get(self.key)
+                if stored and stored['checked_at'] > (self._result or {}).get('checked_at', 0):
+                    self._result = stored
+                    self.adopted += 1
+                    return dict(stored)
+            result = dict(self.check(), checked_at=time.time())
+            self._result = result
+            self.runs += 1
+            if self.store is not None:
+                self.store.set(self.key, result, ttl=max(1, int(self.interval)))
+            return dict(result)
+
+    def snapshot(self):
+        """Last result with its age in seconds, or None before the first check finished"""
+        result = self._result
+        if result is None:
+            return None
+        return dict(result, age=time.time() - result['checked_at'])
+
+    def stats(self):
+        return {
+            'interval': self.interval,
+            'last_checked_at': self._result['checked_at'] if self._result else None,
+            'runs': self.runs,
+            'adopted': self.adopted,
+            'failures': self.failures
+        }
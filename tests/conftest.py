@@ -0,0 +1,27 @@
+import copy
+import os
+import tempfile
+
+import pytest
+
+# Importing app creates its caches: keep them out of the shared temp dir, and start nothing in the background
+os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='ytdlp-tests-'))
+os.environ.setdefault('SELF_TEST_INTERVAL', '0')
+
+
+@pytest.fixture
+def fake_service(monkeypatch):
+    """The app extracting from a fake_youtube server; extraction runs inline on the calling thread"""
+    import app
+    import fake_youtube
+    from extraction_pool import ExtractionPool
+
+    fake = fake_youtube.FakeYouTube(duration=60, media_bytes=64 * 1024)
+    server, base_url = fake_youtube.start_server(fake)
+    profiles = copy.deepcopy(app.YDL_PROFILES)
+    for options in profiles.values():
+        options.update(quiet=True, no_warnings=True, extractor_args={'fakeyoutube': {'server': [base_url]}})
+    monkeypatch.setattr(app, 'extraction_pool', ExtractionPool(profiles, max_workers=0,
+                                                               extractor=fake_youtube.FakeYouTubeIE))
+    yield fake
+    server.shutdown()
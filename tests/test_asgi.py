@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+import asgi
+
+TRACK = {'language': 'en', 'type': 'manual', 'ext': 'vtt', 'url': 'https://www.youtube.com/api/timedtext?v=abc'}
+BODY = 'WEBVTT\n\n00:00:00.000 --> 00:00:01.000\nHello\n'
+
+
+def test_follower_gets_captions_when_leader_is_cancelled(monkeypatch):
+    fetcher = asgi.AsyncCaptionFetcher()
+    calls = []
+    leader_fetching = asyncio.Event()
+
+    async def fetch(caption_url, video_id):
+        calls.append(caption_url)
+        if len(calls) == 1:
+            leader_fetching.set()
+            await asyncio.sleep(30)  # The leader's batch client disconnects while this is pending
+        return BODY
+
+    monkeypatch.setattr(fetcher, '_fetch', fetch)
+
+    async def scenario():
+        cache_key = f'youtube:cancel-{id(fetcher)}'
+        leader = asyncio.create_task(fetcher.fetch_track(TRACK, 'abc', cache_key))
+        await leader_fetching.wait()
+        follower = asyncio.create_task(fetcher.fetch_track(TRACK, 'abc', cache_key))
+        while not fetcher.coalesced:
+            await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.wait_for(follower, 5)
+
+    assert asyncio.run(scenario()) == BODY
+    assert len(calls) == 2
+    assert fetcher.stats() == {'in_flight': 0, 'leaders': 2, 'coalesced': 1}
+
+
+def test_followers_share_the_leaders_error(monkeypatch):
+    fetcher = asgi.AsyncCaptionFetcher()
+
+    async def fetch(caption_url, video_id):
+        await asyncio.sleep(0.05)
+        raise Exception('Failed to fetch captions: HTTP 404')
+
+    monkeypatch.setattr(fetcher, '_fetch', fetch)
+
+    async def scenario():
+        cache_key = f'youtube:error-{id(fetcher)}'
+        return await asyncio.gather(*(fetcher.fetch_track(TRACK, 'abc', cache_key) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [str(r) for r in results] == ['Failed to fetch captions: HTTP 404'] * 3
+    assert fetcher.leaders == 1
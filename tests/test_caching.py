@@ -0,0 +1,151 @@
+import os
+import time
+
+from caching import SQLiteCache, TieredCache, TTLCache
+from video_metadata import VideoMetadata, record_size
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_their_ttl():
+    clock = FakeClock()
+    cache = TTLCache(max_bytes=1000, ttl=60, clock=clock)
+    cache.set('a', 'default ttl')
+    cache.set('b', 'short ttl', ttl=5)
+
+    clock.now += 10
+    assert cache.get('a') == 'default ttl'
+    assert cache.get('b') is None
+    clock.now += 60
+    assert cache.get('a', 'gone') == 'gone'
+
+    stats = cache.stats()
+    assert stats['expirations'] == 2
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['entries'] == 0
+    assert stats['bytes'] == 0
+
+
+def test_size_bound_evicts_least_recently_used():
+    cache = TTLCache(max_bytes=30, ttl=60, sizeof=len)
+    cache.set('a', 'x' * 10)
+    cache.set('b', 'y' * 10)
+    cache.set('c', 'z' * 10)
+    assert cache.get('a') == 'x' * 10  # a becomes most recently used
+
+    cache.set('d', 'w' * 10)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'x' * 10
+    assert cache.get('c') == 'z' * 10
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] == 30
+
+
+def test_oversized_and_zero_ttl_values_are_not_stored():
+    cache = TTLCache(max_bytes=10, ttl=60, sizeof=len)
+    assert not cache.set('big', 'x' * 11)
+    assert not cache.set('stale', 'x', ttl=0)
+    assert len(cache) == 0
+
+
+def test_replacing_a_key_keeps_the_byte_count_exact():
+    cache = TTLCache(max_bytes=100, ttl=60, sizeof=len)
+    cache.set('a', 'x' * 40)
+    cache.set('a', 'y' * 20)
+    assert cache.get('a') == 'y' * 20
+    assert cache.stats()['bytes'] == 20
+    cache.pop('a')
+    assert cache.stats()['bytes'] == 0
+
+
+def test_shared_file_is_visible_to_every_worker(tmp_path):
+    path = os.path.join(tmp_path, 'metadata-cache.sqlite3')
+    worker_a = SQLiteCache(path, max_bytes=1 << 20, ttl=60)
+    worker_b = SQLiteCache(path, max_bytes=1 << 20, ttl=60)
+
+    worker_a.set('youtube:aaaaaaaaaaa', {'title': 'shared', 'tags': ['a', 'b']})
+    value, ttl = worker_b.get_with_ttl('youtube:aaaaaaaaaaa')
+    assert value == {'title': 'shared', 'tags': ['a', 'b']}
+    assert 55 < ttl <= 60
+
+    worker_b.pop('youtube:aaaaaaaaaaa')
+    assert worker_a.get('youtube:aaaaaaaaaaa') is None
+    assert worker_a.stats()['entries'] == 0
+
+
+def test_shared_entries_expire(tmp_path):
+    cache = SQLiteCache(os.path.join(tmp_path, 'c.sqlite3'), max_bytes=1 << 20, ttl=60)
+    cache.set('k', 'value', ttl=0.2)
+    assert cache.get('k') == 'value'
+    time.sleep(0.3)
+    assert cache.get_with_ttl('k', 'missing') == ('missing', 0)
+
+
+def test_shared_cache_evicts_least_recently_read(tmp_path):
+    cache = SQLiteCache(os.path.join(tmp_path, 'c.sqlite3'), max_bytes=1 << 20, ttl=60, compresslevel=0)
+    value = 'x' * 400
+    cache.set('a', value)
+    size = cache.stats()['bytes']
+    cache.max_bytes = size * 2
+    cache.set('b', value)
+    cache.set('c', value)
+
+    assert cache.get('a') is None
+    assert cache.get('b') == value
+    assert cache.get('c') == value
+    assert cache.stats()['evictions'] == 1
+
+
+def test_records_round_trip_through_encode_and_decode(tmp_path):
+    cache = SQLiteCache(os.path.join(tmp_path, 'c.sqlite3'), max_bytes=1 << 20, ttl=60,
+                        encode=VideoMetadata.to_dict, decode=VideoMetadata.from_dict)
+    record = VideoMetadata(id='aaaaaaaaaaa', title='Record', duration=12,
+                           captions={'manual': {'en': {'vtt': 'https://example.com/en.vtt'}}, 'auto': {}})
+    cache.set('youtube:aaaaaaaaaaa', record)
+
+    restored = cache.get('youtube:aaaaaaaaaaa')
+    assert isinstance(restored, VideoMetadata)
+    assert restored.to_dict() == record.to_dict()
+    assert restored.track_index.find('en', track_type='manual')['url'] == 'https://example.com/en.vtt'
+
+
+def test_tiered_cache_warms_the_local_tier_with_the_remaining_ttl(tmp_path):
+    path = os.path.join(tmp_path, 'c.sqlite3')
+    writer = TieredCache(TTLCache(max_bytes=1 << 20, ttl=600), SQLiteCache(path, max_bytes=1 << 20, ttl=600))
+    writer.set('k', {'title': 'from another worker'}, ttl=30)
+
+    clock = FakeClock()
+    local = TTLCache(max_bytes=1 << 20, ttl=600, clock=clock)
+    reader = TieredCache(local, SQLiteCache(path, max_bytes=1 << 20, ttl=600))
+    assert reader.get('k') == {'title': 'from another worker'}
+    assert reader.get('k') == {'title': 'from another worker'}
+    assert reader.get('missing', 'default') == 'default'
+    stats = reader.stats()
+    assert stats['shared']['hits'] == 1
+    assert stats['local']['hits'] == 1
+    assert stats['misses'] == 1
+
+    # The promoted copy expires with the shared entry, not after the local default TTL
+    clock.now += 31
+    assert local.get('k') is None
+
+
+def test_tiered_cache_sizes_records_locally(tmp_path):
+    record = VideoMetadata(id='bbbbbbbbbbb', title='Sized')
+    local = TTLCache(max_bytes=1 << 20, ttl=60, sizeof=record_size)
+    shared = SQLiteCache(os.path.join(tmp_path, 'c.sqlite3'), max_bytes=1 << 20, ttl=60,
+                         encode=VideoMetadata.to_dict, decode=VideoMetadata.from_dict)
+    cache = TieredCache(local, shared)
+    cache.set('youtube:bbbbbbbbbbb', record)
+
+    assert local.stats()['bytes'] == record_size(record)
+    cache.pop('youtube:bbbbbbbbbbb')
+    assert cache.get('youtube:bbbbbbbbbbb') is None
+    assert shared.get('youtube:bbbbbbbbbbb') is None
@@ -0,0 +1,136 @@
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+
+import pytest
+
+import app
+import asgi
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def no_extraction(*args, **kwargs):
+        raise AssertionError('invalid batches must not reach the extraction pool')
+
+    monkeypatch.setattr(app.extraction_pool, 'run', no_extraction)
+    return app.app.test_client()
+
+
+def test_unparseable_url_is_a_client_error(client):
+    response = client.post('/extract-captions/batch', json={'urls': ['https://youtu.be/dQw4w9WgXcQ', 'bad']})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': "Item 1 is not a video URL: 'bad'", 'success': False}
+
+
+def test_plan_dedups_by_video_and_language():
+    entries, requested, concurrency = app.plan_caption_batch({'urls': [
+        'https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=30',
+        'https://youtu.be/dQw4w9WgXcQ',
+        {'url': 'dQw4w9WgXcQ', 'language': 'de'},
+        'https://vimeo.com/76979871',
+    ]})
+    assert requested == 4
+    assert [(entry['videoKey'], entry['language'], entry['inputIndexes']) for entry in entries] == [
+        ('youtube:dQw4w9WgXcQ', 'en', [0, 1]),
+        ('youtube:dQw4w9WgXcQ', 'de', [2]),
+        ('generic:https://vimeo.com/76979871', 'en', [3]),
+    ]
+    assert concurrency == app.BATCH_CONCURRENCY
+
+
+def test_async_batch_rejects_unparseable_url():
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    status = asyncio.run(asgi.handle_extract_captions_batch({'urls': ['not a url']}, None, send))
+    assert status == 400
+    assert sent[0]['status'] == 400
+    assert json.loads(sent[1]['body'])['error'] == "Item 0 is not a video URL: 'not a url'"
+
+
+class Extractions:
+    """Stand-in for extract_captions_for_url that records concurrency and can hold calls"""
+
+    def __init__(self, hold_after=None):
+        self.lock = threading.Lock()
+        self.started = []
+        self.running = 0
+        self.peak = 0
+        self.hold_after = hold_after
+        self.release = threading.Event()
+
+    def __call__(self, url, *args):
+        with self.lock:
+            self.started.append(url)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            hold = self.hold_after is not None and len(self.started) > self.hold_after
+        if hold:
+            self.release.wait(5)
+        else:
+            time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        return {'success': True, 'videoId': url[-11:]}, 200
+
+
+def batch_urls(count):
+    return [f'https://youtu.be/batch{index:06d}' for index in range(count)]
+
+
+def test_global_slots_cap_work_across_batches(monkeypatch):
+    extractions = Extractions()
+    monkeypatch.setattr(app, 'extract_captions_for_url', extractions)
+    monkeypatch.setattr(app, 'batch_slots', threading.BoundedSemaphore(2))
+    client = app.app.test_client()
+
+    def run_batch(urls):
+        return client.post('/extract-captions/batch', json={'urls': urls, 'concurrency': 4}).get_data(as_text=True)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as batches:
+        bodies = list(batches.map(run_batch, [batch_urls(6)[:3], batch_urls(6)[3:]]))
+    assert extractions.peak == 2
+    for body in bodies:
+        lines = [json.loads(line) for line in body.splitlines()]
+        assert lines[-1]['type'] == 'summary'
+        assert lines[-1]['succeeded'] == 3
+
+
+def test_batch_waits_while_all_slots_are_taken(monkeypatch):
+    extractions = Extractions()
+    monkeypatch.setattr(app, 'extract_captions_for_url', extractions)
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(app, 'batch_slots', slots)
+    slots.acquire()  # Another batch holds the only slot
+
+    client = app.app.test_client()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as caller:
+        body = caller.submit(lambda: client.post('/extract-captions/batch',
+                                                 json={'urls': batch_urls(2)}).get_data(as_text=True))
+        time.sleep(0.2)
+        assert extractions.started == []
+        slots.release()
+        lines = body.result(5).splitlines()
+    assert len(extractions.started) == 2
+    assert json.loads(lines[-1])['succeeded'] == 2
+
+
+def test_client_disconnect_cancels_entries_not_started(monkeypatch):
+    extractions = Extractions(hold_after=1)
+    monkeypatch.setattr(app, 'extract_captions_for_url', extractions)
+    client = app.app.test_client()
+
+    response = client.post('/extract-captions/batch', json={'urls': batch_urls(6), 'concurrency': 1},
+                           buffered=False)
+    first = json.loads(next(response.response))
+    assert first['type'] == 'result'
+    # The second entry is running (held); the client goes away before it finishes
+    response.close()
+    extractions.release.set()
+    time.sleep(0.2)
+    assert len(extractions.started) == 2
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+
+from caption_parser import CaptionParseError, collapse_rolling, parse_captions, render_captions
+
+VTT = '''WEBVTT
+Kind: captions
+Language: en
+
+NOTE this block is skipped
+00:00:09.000 --> 00:00:10.000
+
+1
+00:00:01.000 --> 00:00:02.500 align:start position:0%
+<v Speaker>Hello &amp; welcome</v>
+
+01:00:03,250 --> 01:00:04,000
+first line
+<c.yellow>second</c> line
+'''
+
+TTML = '''<?xml version="1.0" encoding="utf-8" ?>
+<tt xmlns="http://www.w3.org/ns/ttml" xmlns:ttp="http://www.w3.org/ns/ttml#parameter" ttp:tickRate="1000">
+<body><div>
+<p begin="00:00:01.000" end="00:00:02.500">Hello <span>there</span></p>
+<p begin="3s" dur="1500ms">one<br/>two</p>
+<p begin="4000t" end="00:00:05:15">ticks &amp; frames</p>
+<p begin="6s" end="7s">   </p>
+</div></body></tt>
+'''
+
+SRV3 = '''<?xml version="1.0" encoding="utf-8" ?>
+<timedtext format="3"><body>
+<p t="1000" d="1500">Hello <s>world</s></p>
+<p t="3000" d="500">a<br/>b</p>
+<p t="4000" d="500"></p>
+</body></timedtext>
+'''
+
+
+def cues(*items):
+    return [{'start_ms': start, 'end_ms': end, 'text': text} for start, end, text in items]
+
+
+def test_vtt_skips_headers_notes_and_markup():
+    assert parse_captions(VTT, 'vtt') == cues(
+        (1000, 2500, 'Hello & welcome'),
+        (3603250, 3604000, 'first line\nsecond line'),
+    )
+
+
+def test_ttml_time_expressions():
+    assert parse_captions(TTML, 'ttml') == cues(
+        (1000, 2500, 'Hello there'),
+        (3000, 4500, 'one\ntwo'),
+        (4000, 5500, 'ticks & frames'),
+    )
+
+
+def test_json3_skips_windows_and_appends():
+    body = json.dumps({'events': [
+        {'tStartMs': 0, 'dDurationMs': 5000, 'id': 1},
+        {'tStartMs': 100, 'dDurationMs': 900, 'segs': [{'utf8': 'a <b> '}, {'utf8': 'c'}]},
+        {'tStartMs': 900, 'aAppend': 1, 'segs': [{'utf8': '\n'}]},
+        {'tStartMs': 1000, 'dDurationMs': 500, 'segs': [{'utf8': 'line one\nline two'}]},
+    ]})
+    assert parse_captions(body, 'json3') == cues(
+        (100, 1000, 'a <b> c'),
+        (1000, 1500, 'line one\nline two'),
+    )
+
+
+def test_srv3():
+    assert parse_captions(SRV3, 'srv3') == cues(
+        (1000, 2500, 'Hello world'),
+        (3000, 3500, 'a\nb'),
+    )
+
+
+@pytest.mark.parametrize('body, ext', [
+    ('<tt><body><p begin="1s"', 'ttml'),
+    ('<tt><body><p begin="soon" end="1s">x</p></body></tt>', 'ttml'),
+    ('not json', 'json3'),
+    ('<timedtext><p t="x">a</p></timedtext>', 'srv3'),
+    ('1\n00:00:01.000 --> 00:00:02.000\nx', 'srt'),
+])
+def test_invalid_bodies_raise_parse_error(body, ext):
+    with pytest.raises(CaptionParseError):
+        parse_captions(body, ext)
+
+
+def test_collapse_rolling_keeps_only_new_lines():
+    rolling = [
+        (0, 2000, 'we are'),
+        (2000, 2010, 'we are'),
+        (2010, 4000, 'we are\ngoing to'),
+        (4000, 4010, 'going to'),
+        (4010, 6000, 'going to\nthe park'),
+    ]
+    assert collapse_rolling(rolling) == cues(
+        (0, 2010, 'we are'),
+        (2010, 4010, 'going to'),
+        (4010, 6000, 'the park'),
+    )
+
+
+def test_render_round_trips_through_vtt_and_ttml():
+    original = cues((1000, 2500, 'Tom & Jerry'), (3603250, 3604000, 'one\ntwo'))
+    vtt = render_captions(original, 'vtt')
+    assert vtt.startswith('WEBVTT\n')
+    assert '01:00:03.250 --> 01:00:04.000' in vtt
+    assert parse_captions(vtt, 'vtt') == original
+
+    ttml = render_captions(original, 'ttml', language='fr')
+    assert 'xml:lang="fr"' in ttml
+    assert 'Tom &amp; Jerry' in ttml
+    assert parse_captions(ttml, 'ttml') == original
+
+    assert render_captions(original, 'text') == 'Tom & Jerry\none two'
+    assert render_captions(original, 'cues') is original
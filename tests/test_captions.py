@@ -0,0 +1,57 @@
+import fake_youtube
+import pytest
+
+import app
+from caption_parser import parse_captions
+
+
+def extract(url, **body):
+    response = app.app.test_client().post('/extract-captions', json=dict(body, url=url))
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def upstream_body(fake, video_id, ext, language='en'):
+    return fake_youtube.caption_body(video_id, language, ext, fake.duration, fake.words_per_cue)
+
+
+def caption_requests(fake):
+    return fake.stats()['captions']['requests']
+
+
+@pytest.mark.parametrize('output_format', [None, 'raw', 'vtt'])
+def test_manual_captions_are_youtubes_vtt_byte_for_byte(fake_service, output_format):
+    video_id = f'capVtt{output_format or "dflt":->5}'
+    payload = extract(f'https://youtu.be/{video_id}', format=output_format)
+    assert payload['selectedTrack']['ext'] == 'vtt'
+    assert payload['captionFormat'] == (output_format or 'vtt')
+    assert payload['selectedCaptions'] == upstream_body(fake_service, video_id, 'vtt')
+
+
+def test_auto_captions_default_to_youtubes_ttml(fake_service):
+    fake_service.manual_languages = ()
+    payload = extract('https://youtu.be/capAutoTtml')
+    assert payload['selectedTrack']['type'] == 'auto'
+    assert payload['captionFormat'] == 'ttml'
+    assert payload['selectedCaptions'] == upstream_body(fake_service, 'capAutoTtml', 'ttml')
+
+
+@pytest.mark.parametrize('ext', ['srv3', 'json3'])
+def test_compact_tracks_are_parsed_converted_and_cached(fake_service, monkeypatch, ext):
+    monkeypatch.setattr(app, 'CAPTION_FORMAT_PREFERENCE', [ext, 'vtt'])
+    video_id = f'capCue{ext:->5}'
+    url = f'https://youtu.be/{video_id}'
+    expected = parse_captions(upstream_body(fake_service, video_id, 'vtt'), 'vtt')
+
+    payload = extract(url, format='cues')
+    assert payload['selectedTrack']['ext'] == ext
+    assert payload['selectedCaptions'] == expected
+    assert caption_requests(fake_service) == 1
+    cache_key = app.caption_track_key(payload['selectedTrack'], app.video_key(url))
+    assert app.caption_cache.get(cache_key) == upstream_body(fake_service, video_id, ext)
+    assert app.caption_cache.get(f'{cache_key}|cues') == expected
+
+    # Other renderings come from the cached cues without fetching again
+    text = extract(url, format='text')['selectedCaptions']
+    assert text.splitlines() == [cue['text'] for cue in expected]
+    assert caption_requests(fake_service) == 1
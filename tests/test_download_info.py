@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+import app
+import fake_youtube
+from video_metadata import VideoMetadata
+
+
+def watch_requests(fake):
+    return fake.stats().get('watch', {}).get('requests', 0)
+
+
+def test_download_info_keeps_only_the_selected_format(fake_service):
+    url = 'https://www.youtube.com/watch?v=dlSelected1'
+    info = app.get_download_info(url)
+    assert [fmt['format_id'] for fmt in info['formats']] == ['140']
+    assert 'subtitles' not in info and 'automatic_captions' not in info
+    # The same extraction seeded the metadata cache
+    assert app.get_video_metadata_cached(url).title == 'Synthetic video dlSelected1'
+    assert watch_requests(fake_service) == 1
+
+
+def test_warm_download_test_only_fetches_the_media(fake_service):
+    url = 'https://www.youtube.com/watch?v=dlWarmPath1'
+    app.get_download_info(url)
+    assert watch_requests(fake_service) == 1
+
+    payload, status = app.stream_download_test(url, max_bytes=16 * 1024)
+    assert status == 200
+    assert payload['downloaded_bytes'] == 16 * 1024
+    assert payload['video_title'] == 'Synthetic video dlWarmPath1'
+    assert watch_requests(fake_service) == 1
+    assert fake_service.stats()['media']['requests'] >= 1
+
+
+def test_metadata_payload_cuts_the_description_once():
+    long_description = 'x' * 500
+    record = VideoMetadata.from_info({'id': 'aaaaaaaaaaa', 'description': long_description, 'formats': []})
+    assert record.description == 'x' * 200
+    assert app.metadata_payload(record)['description'] == 'x' * 200 + '...'
+    full = VideoMetadata(id='aaaaaaaaaaa', description=long_description, formats={'count': 0})
+    assert app.metadata_payload(full)['description'] == 'x' * 200 + '...'
+
+
+class CountingFakeYouTubeIE(fake_youtube.FakeYouTubeIE):
+    extractions = 0
+
+    @classmethod
+    def ie_key(cls):
+        return 'FakeYouTube'  # Same extractor arguments as the class it counts for
+
+    def _real_extract(self, url):
+        type(self).extractions += 1
+        return super()._real_extract(url)
+
+
+@pytest.mark.parametrize('mode', ['stream', 'disk'])
+def test_download_test_extracts_once(fake_service, monkeypatch, tmp_path, mode):
+    monkeypatch.setattr(app.extraction_pool, 'extractor', CountingFakeYouTubeIE)
+    monkeypatch.setattr(CountingFakeYouTubeIE, 'extractions', 0)
+    monkeypatch.setattr(app, 'DOWNLOAD_SCRATCH_DIR', str(tmp_path))
+    video_id = f'dlOnce{mode[:4]:->5}'
+
+    response = app.app.test_client().post('/test-download', json={'url': f'https://youtu.be/{video_id}', 'mode': mode})
+    payload = response.get_json()
+    assert response.status_code == 200, payload
+    assert payload['mode'] == mode
+    assert payload['downloaded_bytes'] == 64 * 1024
+    assert payload['file_extension'] == '.m4a'
+    assert CountingFakeYouTubeIE.extractions == 1
+    assert watch_requests(fake_service) == 1
+    if mode == 'disk':
+        # The .part file and the final file were tracked, and the scratch directory is gone
+        assert payload['files_written'] >= 2
+        assert os.listdir(tmp_path) == []
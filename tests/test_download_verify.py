@@ -0,0 +1,101 @@
+import hashlib
+import io
+import re
+
+import pytest
+
+from download_verify import UnsupportedStream, VerificationSink, stream_format
+
+MEDIA = bytes(range(256)) * 40  # 10240 bytes
+
+
+class StubYDL:
+    """urlopen() serving bodies by URL, honouring Range headers; records every request"""
+
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.requests = []
+
+    def urlopen(self, request):
+        self.requests.append((request.url, request.headers.get('Range'), request.headers.get('User-Agent')))
+        body = self.bodies[request.url]
+        match = re.fullmatch(r'bytes=(\d+)-(\d+)', request.headers.get('Range') or '')
+        if match:
+            body = body[int(match.group(1)):int(match.group(2)) + 1]
+        return io.BytesIO(body)
+
+
+def test_sink_hashes_and_signs_what_it_keeps():
+    sink = VerificationSink()
+    for start in range(0, len(MEDIA), 1000):
+        assert sink.write(MEDIA[start:start + 1000])
+    assert sink.result() == {
+        'bytes': len(MEDIA),
+        'signature': MEDIA[:16].hex(),
+        'sha256': hashlib.sha256(MEDIA).hexdigest(),
+        'truncated': False,
+        'max_bytes': None
+    }
+
+
+def test_sink_stops_at_max_bytes():
+    sink = VerificationSink(max_bytes=2500)
+    assert sink.write(MEDIA[:2000])
+    assert not sink.write(MEDIA[2000:4000])
+    result = sink.result()
+    assert result['bytes'] == 2500
+    assert result['truncated']
+    assert result['sha256'] == hashlib.sha256(MEDIA[:2500]).hexdigest()
+
+
+def test_plain_format_is_streamed_in_one_request():
+    ydl = StubYDL({'https://media/plain': MEDIA})
+    sink = VerificationSink()
+    stream_format(ydl, {'format_id': '140', 'url': 'https://media/plain', 'http_headers': {'User-Agent': 'ua'}}, sink)
+    assert ydl.requests == [('https://media/plain', None, 'ua')]
+    assert sink.result()['sha256'] == hashlib.sha256(MEDIA).hexdigest()
+
+
+def test_chunked_format_is_fetched_in_ranges():
+    ydl = StubYDL({'https://media/ranged': MEDIA})
+    fmt = {'format_id': '251', 'url': 'https://media/ranged', 'filesize': len(MEDIA),
+           'downloader_options': {'http_chunk_size': 4096}}
+    sink = VerificationSink()
+    stream_format(ydl, fmt, sink)
+    assert [request[1] for request in ydl.requests] == ['bytes=0-4095', 'bytes=4096-8191', 'bytes=8192-12287']
+    assert sink.result()['sha256'] == hashlib.sha256(MEDIA).hexdigest()
+
+
+def test_chunked_format_stops_at_the_cap_and_at_a_short_range():
+    ydl = StubYDL({'https://media/ranged': MEDIA})
+    fmt = {'format_id': '251', 'url': 'https://media/ranged', 'downloader_options': {'http_chunk_size': 4096}}
+    capped = VerificationSink(max_bytes=5000)
+    stream_format(ydl, fmt, capped)
+    assert len(ydl.requests) == 2
+    assert capped.result()['truncated']
+
+    # Without a known filesize, a range shorter than the chunk size ends the stream
+    ydl.requests.clear()
+    stream_format(ydl, fmt, VerificationSink())
+    assert len(ydl.requests) == 3
+
+
+def test_fragmented_format_streams_fragments_in_order():
+    fragments = {f'https://media/dash/seg{index}': MEDIA[index * 2048:(index + 1) * 2048] for index in range(5)}
+    fmt = {'format_id': '137', 'protocol': 'http_dash_segments', 'fragment_base_url': 'https://media/dash/',
+           'fragments': [{'path': f'seg{index}'} for index in range(4)] + [{'url': 'https://media/dash/seg4'}]}
+    ydl = StubYDL(fragments)
+    sink = VerificationSink()
+    stream_format(ydl, fmt, sink)
+    assert [request[0] for request in ydl.requests] == list(fragments)
+    assert sink.result()['sha256'] == hashlib.sha256(MEDIA).hexdigest()
+
+    ydl.requests.clear()
+    stream_format(ydl, fmt, VerificationSink(max_bytes=3000))
+    assert len(ydl.requests) == 2
+
+
+def test_manifest_formats_cannot_be_streamed():
+    with pytest.raises(UnsupportedStream):
+        stream_format(StubYDL({}), {'format_id': '96', 'protocol': 'm3u8_native', 'url': 'https://media/x.m3u8'},
+                      VerificationSink())
@@ -0,0 +1,121 @@
+import concurrent.futures
+import time
+
+import pytest
+import yt_dlp
+
+from extraction_pool import ExtractionPool, ExtractionTimeout, process_extracted
+
+PROFILES = {'metadata': {'quiet': True}}
+
+
+def hang_job(ydl, url):
+    time.sleep(30)
+
+
+def echo_job(ydl, url):
+    return url
+
+
+@pytest.fixture
+def pool():
+    pool = ExtractionPool(PROFILES, max_workers=1, max_queue=4, job_timeout=1.0)
+    yield pool
+    pool.shutdown()
+
+
+def test_timed_out_job_frees_its_worker(pool):
+    assert pool.run(echo_job, 'warm-up', 'metadata', timeout=30) == 'warm-up'
+    with pytest.raises(ExtractionTimeout):
+        pool.run(hang_job, 'hang', 'metadata')
+    # The worker interrupts the hung job itself, so the only worker is free again well before 30s
+    started = time.time()
+    assert pool.run(echo_job, 'after', 'metadata', timeout=10) == 'after'
+    assert time.time() - started < 5
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_job_queued_past_its_deadline_is_skipped(pool):
+    assert pool.run(echo_job, 'warm-up', 'metadata', timeout=30) == 'warm-up'
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as callers:
+        hung = callers.submit(pool.run, hang_job, 'hang', 'metadata', timeout=2)
+        time.sleep(0.2)
+        # Queued behind the hung job; its caller gives up before the worker gets to it
+        with pytest.raises(ExtractionTimeout):
+            pool.run(echo_job, 'queued', 'metadata', timeout=0.5)
+        with pytest.raises(ExtractionTimeout):
+            hung.result()
+    deadline = time.time() + 5
+    while pool.stats()['in_flight'] and time.time() < deadline:
+        time.sleep(0.05)
+    stats = pool.stats()
+    assert stats['in_flight'] == 0
+    assert (stats['completed'], stats['failed']) == (1, 2)
+
+
+def test_every_app_profile_reaches_the_workers():
+    import app
+    pool = ExtractionPool(app.YDL_PROFILES, max_workers=1, job_timeout=30)
+    try:
+        # Profiles are pickled into the workers, so they must not hold lambdas or other local objects
+        for profile in app.YDL_PROFILES:
+            assert pool.run(echo_job, profile, profile) == profile
+            assert pool.run(echo_job, profile, profile, overrides={'subtitleslangs': ['en']}) == profile
+    finally:
+        pool.shutdown()
+
+
+def slow_job(ydl, url):
+    time.sleep(0.5)
+    return url
+
+
+def test_observer_follows_in_flight_and_queue_depth():
+    seen = []
+    pool = ExtractionPool(PROFILES, max_workers=1, max_queue=4, job_timeout=10, observer=lambda *counts: seen.append(counts))
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as callers:
+            first = callers.submit(pool.run, slow_job, 'first', 'metadata')
+            time.sleep(0.2)
+            second = callers.submit(pool.run, slow_job, 'second', 'metadata')
+            assert (first.result(timeout=30), second.result(timeout=30)) == ('first', 'second')
+    finally:
+        pool.shutdown()
+    # The second job waits behind the first, then both drain
+    assert seen == [(1, 0), (2, 1), (1, 0), (0, 0)]
+
+
+STORED_URL = 'https://www.youtube.com/watch?v=aaaaaaaaaaa'
+STORED_INFO = {
+    'id': 'aaaaaaaaaaa', 'title': 'Stored', 'extractor': 'youtube', 'extractor_key': 'Youtube', 'webpage_url': STORED_URL,
+    'formats': [
+        {'format_id': '18', 'url': 'https://media.example/18', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'mp4a.40.2'},
+        {'format_id': '140', 'url': 'https://media.example/140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2'},
+    ],
+}
+
+
+class RecordingYDL(yt_dlp.YoutubeDL):
+    """Records extract_info() calls instead of going to the network"""
+
+    def __init__(self, params):
+        super().__init__(dict(params, quiet=True, no_warnings=True))
+        self.extracted = []
+
+    def extract_info(self, url, download=True, **kwargs):
+        self.extracted.append(url)
+        return {'id': 'extracted'}
+
+
+def test_process_extracted_selects_formats_from_stored_info():
+    ydl = RecordingYDL({'format': 'bestaudio'})
+    # Leftovers of the earlier format selection are dropped before selecting again
+    stored = dict(STORED_INFO, format_id='18', requested_formats=[STORED_INFO['formats'][0]], _filename='old.mp4')
+    selected = process_extracted(ydl, STORED_URL, stored, download=False)
+    assert selected['format_id'] == '140'
+    assert selected['url'] == 'https://media.example/140'
+    assert ydl.extracted == []
+
+    # Without stored info it extracts as before
+    assert process_extracted(ydl, STORED_URL, None, download=False) == {'id': 'extracted'}
+    assert ydl.extracted == [STORED_URL]
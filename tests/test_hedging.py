@@ -0,0 +1,70 @@
+import time
+
+from hedging import HedgedFetcher
+
+
+class StubResponse:
+    status_code = 200
+    encoding = 'utf-8'
+
+    def __init__(self, body):
+        self.body = body
+
+    def iter_content(self, chunk_size):
+        yield self.body.encode()
+
+    def close(self):
+        pass
+
+
+class StubLimiter:
+    """The first reservation is due at once, every later one after wait seconds"""
+
+    def __init__(self, wait):
+        self.wait = wait
+        self.reserved = []
+
+    def reserve(self, url):
+        self.reserved.append(url)
+        return 0.0 if len(self.reserved) == 1 else self.wait
+
+    def observe(self, url, status_code):
+        pass
+
+
+class StubClient:
+    def __init__(self, rate_limiter, delays):
+        self.rate_limiter = rate_limiter
+        self.delays = delays
+        self.fetched = []
+
+    def get(self, url, headers=None, stream=False, rate_limited=True):
+        assert not rate_limited, 'hedges reserve their own token'
+        self.fetched.append(url)
+        time.sleep(self.delays.get(url, 0))
+        return StubResponse(f'body of {url}')
+
+
+def test_hedge_waiting_for_a_token_gives_up_when_the_race_is_decided():
+    limiter = StubLimiter(wait=5.0)
+    client = StubClient(limiter, delays={'https://a/primary': 0.2})
+    fetcher = HedgedFetcher(client, per_host_limit=1)
+
+    started = time.time()
+    index, body, errors = fetcher.fetch_first([('primary', 'https://a/primary'), ('hedge', 'https://a/hedge')],
+                                              hedge_delay=0.05)
+    assert (index, body, errors) == (0, 'body of https://a/primary', [])
+    assert time.time() - started < 1
+    # The hedge queued for a token without holding the only slot on the host, and never fetched
+    time.sleep(0.1)
+    assert client.fetched == ['https://a/primary']
+    assert fetcher._slot('https://a/x').acquire(blocking=False)
+
+
+def test_hedge_wins_when_the_primary_is_slow():
+    client = StubClient(StubLimiter(wait=0.0), delays={'https://a/primary': 1.0})
+    fetcher = HedgedFetcher(client)
+    index, body, _ = fetcher.fetch_first([('primary', 'https://a/primary'), ('hedge', 'https://b/hedge')],
+                                         hedge_delay=0.05)
+    assert (index, body) == (1, 'body of https://b/hedge')
+    assert fetcher.stats()['wins_by_hedge'] == 1
@@ -0,0 +1,66 @@
+import time
+
+import pytest
+import requests
+
+import fake_youtube
+from http_client import PooledHTTPClient
+
+
+@pytest.fixture
+def upstream():
+    fake = fake_youtube.FakeYouTube()
+    server, base_url = fake_youtube.start_server(fake)
+    yield fake, base_url
+    server.shutdown()
+
+
+def caption_url(upstream, video_id='httpClient1'):
+    fake, base_url = upstream
+    return f'{base_url}/api/timedtext?' + fake.signed_query(video_id, v=video_id, lang='en', fmt='vtt')
+
+
+def test_requests_reuse_one_keep_alive_connection(upstream):
+    client = PooledHTTPClient(max_retries=0)
+    url = caption_url(upstream)
+    for _ in range(5):
+        response = client.get(url, headers={'Accept-Language': 'en'})
+        assert response.status_code == 200
+        assert response.text.startswith('WEBVTT')
+    stats = client.stats()
+    assert (stats['requests_sent'], stats['connections_opened'], stats['connections_reused']) == (5, 1, 4)
+    assert stats['reuse_ratio'] == 0.8
+    assert 'Accept-Language' not in client.session.headers
+
+
+def test_server_errors_are_retried_but_429s_are_not(upstream):
+    fake, _ = upstream
+    client = PooledHTTPClient(max_retries=2, backoff_factor=0)
+    url = caption_url(upstream)
+
+    fake.server_error_rate = 1.0
+    assert client.get(url).status_code in (500, 502, 503)
+    assert fake.stats()['captions']['server_errors'] == 3
+
+    fake.server_error_rate, fake.error_rate = 0.0, 1.0
+    assert client.get(url).status_code == 429
+    assert fake.stats()['captions']['throttled'] == 1
+    assert client.stats()['requests_sent'] == 2
+
+
+def test_read_timeout_is_applied_to_every_attempt(upstream):
+    fake, _ = upstream
+    fake.latency['captions'] = fake_youtube.parse_latency('fixed:1000')
+    client = PooledHTTPClient(max_retries=1, backoff_factor=0, read_timeout=0.2)
+    url = caption_url(upstream)
+
+    started = time.monotonic()
+    with pytest.raises(requests.RequestException):
+        client.get(url)
+    assert time.monotonic() - started < 0.9
+    assert fake.stats()['captions']['requests'] == 2
+    assert client.stats()['request_errors'] == 1
+
+    # A per-call timeout replaces the client's default
+    fake.latency['captions'] = fake_youtube.parse_latency('fixed:300')
+    assert client.get(url, timeout=(5, 5)).status_code == 200
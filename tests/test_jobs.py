@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from download_verify import VerificationSink, stream_progress
+from jobs import JobCancelled, JobManager, JobProgress, JobQueueFull
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = condition()
+        if value:
+            return value
+        time.sleep(0.01)
+    raise AssertionError('condition not met in time')
+
+
+def wait_for_status(jobs, job_id, *statuses):
+    return wait_for(lambda: (jobs.get(job_id) or {}).get('status') in statuses and jobs.get(job_id))
+
+
+@pytest.fixture
+def jobs(tmp_path):
+    return JobManager(str(tmp_path), max_running=1, max_queued=1, max_records=2, retention=60)
+
+
+def test_job_reports_progress_then_its_result(jobs):
+    release = threading.Event()
+
+    def run(progress):
+        progress.update(force=True, status='downloading', downloaded_bytes=512, total_bytes=1024)
+        release.wait(5)
+        return {'success': True, 'downloaded_bytes': 1024}, 200
+
+    job = jobs.submit('download', {'url': 'https://youtu.be/aaaaaaaaaaa'}, run)
+    assert job['status'] == 'queued'
+
+    running = wait_for(lambda: (jobs.get(job['job_id']) or {}).get('progress') and jobs.get(job['job_id']))
+    assert running['status'] == 'running'
+    assert running['progress']['downloaded_bytes'] == 512
+
+    release.set()
+    finished = wait_for_status(jobs, job['job_id'], 'finished')
+    assert finished['result'] == {'success': True, 'downloaded_bytes': 1024}
+    assert finished['params'] == {'url': 'https://youtu.be/aaaaaaaaaaa'}
+
+
+def test_failed_payloads_mark_the_job_failed(jobs):
+    job = jobs.submit('download', {}, lambda progress: ({'error': 'no formats'}, 500))
+    failed = wait_for_status(jobs, job['job_id'], 'failed')
+    assert failed['error'] == 'no formats'
+
+
+def test_cancel_marker_stops_a_running_download(jobs):
+    started = threading.Event()
+    seen = []
+
+    def run(progress):
+        started.set()
+        try:
+            while True:
+                progress.check()
+                time.sleep(0.01)
+        except JobCancelled:
+            seen.append(True)
+            raise
+
+    job = jobs.submit('download', {}, run)
+    assert started.wait(5)
+    assert jobs.cancel(job['job_id'])['status'] == 'cancelling'
+    assert wait_for_status(jobs, job['job_id'], 'cancelled')
+    assert seen == [True]
+
+    # Deleting a finished job removes its files
+    assert jobs.cancel(job['job_id'])['deleted']
+    assert jobs.get(job['job_id']) is None
+
+
+def test_queued_jobs_are_cancelled_before_they_start(jobs):
+    release = threading.Event()
+    first = jobs.submit('download', {}, lambda progress: (release.wait(5), 200))
+    ran = []
+    second = jobs.submit('download', {}, lambda progress: (ran.append(True), 200))
+
+    assert jobs.cancel(second['job_id'])['status'] == 'cancelled'
+    release.set()
+    wait_for_status(jobs, first['job_id'], 'finished')
+    assert jobs.get(second['job_id'])['status'] == 'cancelled'
+    assert ran == []
+
+
+def test_full_queue_rejects_new_jobs(jobs):
+    release = threading.Event()
+    block = lambda progress: (release.wait(5), 200)
+    jobs.submit('download', {}, block)
+    jobs.submit('download', {}, block)
+    with pytest.raises(JobQueueFull):
+        jobs.submit('download', {}, block)
+    assert jobs.stats()['rejected'] == 1
+    release.set()
+
+
+def test_eviction_trims_to_max_records_and_sweeps_expired_files(jobs):
+    done = lambda progress: ({'success': True}, 200)
+    ids = []
+    for _ in range(3):
+        ids.append(jobs.submit('download', {}, done)['job_id'])
+        wait_for_status(jobs, ids[-1], 'finished')
+    assert jobs.get(ids[0]) is None
+    assert jobs.get(ids[1])['status'] == 'finished'
+    assert jobs.stats()['evicted'] == 1
+
+    # Records left behind by another worker are swept once past retention
+    stale = os.path.join(jobs.root, f'{"0" * 32}.json')
+    with open(stale, 'w') as f:
+        json.dump({'job_id': '0' * 32, 'status': 'finished'}, f)
+    old = time.time() - 120
+    os.utime(stale, (old, old))
+    jobs.submit('download', {}, done)
+    assert not os.path.exists(stale)
+    assert jobs.get(ids[2])['status'] == 'finished'
+
+
+def test_stream_progress_matches_the_download_hook_shape(tmp_path):
+    now = [100.0]
+    progress = JobProgress(str(tmp_path / 'p.json'), str(tmp_path / 'cancel'), interval=0)
+    sink = VerificationSink(on_write=stream_progress(progress, total_bytes=4000, clock=lambda: now[0]))
+
+    now[0] += 2
+    sink.write(b'x' * 1000)
+    with open(tmp_path / 'p.json') as f:
+        streamed = json.load(f)
+
+    progress.hook({'status': 'downloading', 'downloaded_bytes': 1000, 'total_bytes': 4000,
+                   'speed': 500.0, 'eta': 6})
+    with open(tmp_path / 'p.json') as f:
+        hooked = json.load(f)
+
+    streamed.pop('updated_at')
+    hooked.pop('updated_at')
+    assert streamed == hooked
+    assert streamed['speed'] == 500.0
+    assert streamed['eta'] == 6
+
+    open(tmp_path / 'cancel', 'a').close()
+    with pytest.raises(JobCancelled):
+        sink.write(b'x')
+
+
+def test_download_job_endpoints(monkeypatch):
+    import app
+
+    def fake_download(url, max_bytes, progress=None):
+        progress.hook({'status': 'finished', 'downloaded_bytes': 10, 'total_bytes': 10})
+        return {'success': True, 'url_tested': url, 'downloaded_bytes': 10}, 200
+
+    monkeypatch.setattr(app, 'stream_download_test', fake_download)
+    client = app.app.test_client()
+    response = client.post('/jobs/download', json={'url': 'https://youtu.be/bbbbbbbbbbb', 'mode': 'stream'})
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+
+    def finished():
+        job = client.get(status_url).get_json()
+        return job if job['status'] == 'finished' else None
+
+    job = wait_for(finished)
+    assert job['result']['url_tested'] == 'https://youtu.be/bbbbbbbbbbb'
+    assert job['progress']['status'] == 'finished'
+
+    assert client.delete(status_url).get_json()['deleted']
+    assert client.get(status_url).status_code == 404
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import math
+import random
+
+import pytest
+from aiohttp import web
+
+from load_test import LatencyHistogram, Scenario, VideoPool, YTDLPLoadTester, compare_reports
+
+
+class StubService:
+    """aiohttp app answering POST /test-download after a delay, tracking how many requests overlap"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.requests = 0
+
+    async def test_download(self, request):
+        self.requests += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return web.json_response({'success': True, 'downloaded_bytes': 1024})
+
+
+async def run_against(stub, tester_kwargs):
+    app = web.Application()
+    app.router.add_post('/test-download', stub.test_download)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    try:
+        tester = YTDLPLoadTester(f'http://{host}:{port}', **tester_kwargs)
+        await tester.run_open_loop()
+        return tester
+    finally:
+        await runner.cleanup()
+
+
+def test_open_loop_caps_outstanding_requests_and_counts_the_wait():
+    stub = StubService(delay=0.3)
+    # 20 req/s for a second against a 0.3s service would keep ~6 in flight; the cap allows 3
+    tester = asyncio.run(run_against(stub, dict(duration_minutes=1 / 60, rate=20, max_outstanding=3)))
+
+    assert stub.peak == 3
+    assert tester.cap_waits > 0
+    assert len(tester.results) == stub.requests >= 20
+    assert all(result.status == 'SUCCESS' for result in tester.results)
+    # Requests held back by the cap went out late, and that delay is part of their response time
+    late = max(tester.results, key=lambda result: result.send_delay)
+    assert late.send_delay > 0.5
+    assert late.response_time >= late.send_delay + 0.3
+
+
+def test_histogram_percentiles_stay_within_one_percent():
+    histogram = LatencyHistogram()
+    for micros in range(1, 201):
+        histogram.record(micros / 1e6)  # Below 256µs every value has its own bucket
+    assert histogram.percentile(50) == pytest.approx(100e-6)
+    assert histogram.percentile(99) == pytest.approx(198e-6)
+
+    histogram = LatencyHistogram()
+    samples = [random.Random(1).lognormvariate(-2, 1) for _ in range(1000)]
+    for seconds in samples:
+        histogram.record(seconds)
+    ordered = sorted(samples)
+    for pct in (50, 90, 99, 99.9):
+        exact = ordered[math.ceil(len(ordered) * pct / 100) - 1]
+        assert histogram.percentile(pct) == pytest.approx(exact, rel=0.01)
+    assert histogram.percentile(100) == pytest.approx(max(samples), rel=0.01)
+    assert histogram.max == max(samples)
+    assert LatencyHistogram().summary()['p99'] == 0.0
+
+
+def test_merged_histograms_match_one_histogram_of_all_samples():
+    rng = random.Random(7)
+    fast, slow, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for _ in range(500):
+        seconds = rng.uniform(0.01, 0.1)
+        fast.record(seconds)
+        both.record(seconds)
+        seconds = rng.uniform(1, 10)
+        slow.record(seconds)
+        both.record(seconds)
+
+    merged = LatencyHistogram().merge(fast).merge(slow)
+    assert merged.counts == both.counts
+    assert merged.summary() == pytest.approx(both.summary())
+    assert fast.count == 500  # The merged-in histograms are left alone
+
+
+def report(path, success_rate=100.0, **latency):
+    stats = {'count': 10, 'mean': 1.0, 'p50': 1.0, 'p90': 1.0, 'p99': 1.0, 'p99.9': 1.0, 'max': 1.0}
+    outcomes = {outcome: dict(stats, **values) for outcome, values in latency.items()}
+    with open(path, 'w') as f:
+        json.dump({'run': {}, 'endpoints': {'POST /test-download': {'success_rate': success_rate,
+                                                                     'latency': dict({'ALL': stats}, **outcomes)}}}, f)
+    return str(path)
+
+
+def test_compare_reports_flags_latency_and_success_rate_regressions(tmp_path):
+    old = report(tmp_path / 'old.json', SUCCESS={}, TIMEOUT={})
+
+    assert compare_reports(old, report(tmp_path / 'same.json', SUCCESS={}, TIMEOUT={}), 0.1) == 0
+    # Within the threshold, or only the tail beyond p99
+    assert compare_reports(old, report(tmp_path / 'tail.json', SUCCESS={'p90': 1.05, 'p99.9': 5.0, 'max': 9.0}), 0.1) == 0
+    # Slow failures are reported but not judged
+    assert compare_reports(old, report(tmp_path / 'timeouts.json', TIMEOUT={'p50': 3.0}), 0.1) == 0
+    assert compare_reports(old, report(tmp_path / 'slower.json', SUCCESS={'p50': 1.2, 'p99': 1.5}), 0.1) == 2
+    assert compare_reports(old, report(tmp_path / 'flaky.json', success_rate=98.5), 0.1) == 1
+
+
+def test_zipf_pool_favours_the_first_urls():
+    pool = VideoPool([f'video{n}' for n in range(10)], 'zipf', exponent=1.0)
+    rng = random.Random(3)
+    draws = [pool.sample(rng) for _ in range(20000)]
+    shares = [draws.count(f'video{n}') / len(draws) for n in range(10)]
+    harmonic = sum(1 / k for k in range(1, 11))
+    for n, share in enumerate(shares):
+        assert share == pytest.approx(1 / (n + 1) / harmonic, abs=0.015)
+
+    rotation = VideoPool(['a', 'b', 'c'], 'round_robin')
+    assert [rotation.sample(rng) for _ in range(4)] == ['a', 'b', 'c', 'a']
+    with pytest.raises(ValueError):
+        VideoPool(['a'], 'pareto')
+    with pytest.raises(ValueError):
+        VideoPool([], 'uniform')
+
+
+def test_scenario_renders_payloads_from_its_pools():
+    scenario = Scenario({
+        'seed': 5,
+        'video_pools': {'hot': {'urls': ['https://youtu.be/hotVideo001'], 'skew': 'zipf'}, 'synthetic': {'size': 3}},
+        'endpoints': [
+            {'path': '/extract-captions', 'weight': 3, 'pool': 'hot',
+             'payload': {'url': '$video', 'language': {'choice': {'en': 1}}, 'format': {'choice': [None]}}},
+            {'path': '/extract-captions/batch', 'weight': 1, 'pool': 'synthetic', 'timeout': 120,
+             'payload': {'urls': {'videos': 2}}},
+            {'method': 'get', 'path': '/health', 'weight': 0},
+        ],
+    }, ['https://youtu.be/default0001'])
+    assert scenario.describe() == 'POST /extract-captions 75%, POST /extract-captions/batch 25%, GET /health 0%'
+
+    requests = [scenario.next_request() for _ in range(50)]
+    single = next(request for request in requests if request.path == '/extract-captions')
+    assert single.payload == {'url': 'https://youtu.be/hotVideo001', 'language': 'en'}
+    assert single.video_url == 'https://youtu.be/hotVideo001'
+    batch = next(request for request in requests if request.path == '/extract-captions/batch')
+    assert batch.timeout == 120 and batch.video_url == ''
+    assert all(url.startswith('https://www.youtube.com/watch?v=vid') for url in batch.payload['urls'])
+    assert {request.endpoint for request in requests} == {'POST /extract-captions', 'POST /extract-captions/batch'}
+
+
+@pytest.mark.parametrize('spec', [
+    {'endpoints': []},
+    {'endpoints': [{'path': '/health', 'pool': 'missing'}]},
+    {'endpoints': [{'path': '/health', 'weight': -1}]},
+    {'endpoints': [{'path': '/health', 'weight': '5'}]},
+    {'endpoints': [{'path': '/health', 'weight': 0}]},
+    {'endpoints': [{'path': '/health'}], 'think_time': {'gamma': 2}},
+])
+def test_invalid_scenarios_are_rejected(spec):
+    with pytest.raises(ValueError):
+        Scenario(spec, ['https://youtu.be/default0001'])
+
+
+def test_bundled_scenario_draws_only_its_own_videos():
+    scenario = Scenario.load('scenarios/production-mix.json', ['https://www.youtube.com/watch?v=dQw4w9WgXcQ'])
+    videos = set(scenario.pools['hot'].urls)
+    for _ in range(200):
+        payload = scenario.next_request().payload or {}
+        urls = payload.get('urls') or ([payload['url']] if 'url' in payload else [])
+        assert set(urls) <= videos
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# metrics.py picks single- or multiprocess mode when it is imported, so each "worker" is a fresh interpreter
+WORKER = textwrap.dedent('''
+    import os
+    import app
+    import metrics
+    client = app.app.test_client()
+    assert client.get('/health').status_code == 200
+    metrics.observe_phase('extract-captions', 'metadata', 0.2)
+    metrics.record_extraction_pool(3, 2)
+    print(os.getpid())
+''')
+
+SCRAPER = textwrap.dedent('''
+    import sys
+    import app
+    import metrics
+    if len(sys.argv) > 1:
+        metrics.mark_process_dead(int(sys.argv[1]))
+    response = app.app.test_client().get('/metrics')
+    assert response.status_code == 200
+    sys.stdout.write(response.get_data(as_text=True))
+''')
+
+
+def run_python(source, metrics_dir, *args):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(metrics_dir))
+    process = subprocess.run([sys.executable, '-c', source, *args], cwd=ROOT, env=env,
+                             capture_output=True, text=True, timeout=60)
+    assert process.returncode == 0, process.stderr
+    return process
+
+
+def sample(body, line_start):
+    values = [float(line.rsplit(' ', 1)[1]) for line in body.splitlines() if line.startswith(line_start)]
+    assert len(values) == 1, line_start
+    return values[0]
+
+
+@pytest.fixture
+def metrics_dir(tmp_path):
+    path = tmp_path / 'metrics'
+    path.mkdir()
+    return path
+
+
+def test_metrics_aggregate_worker_processes(metrics_dir):
+    run_python(WORKER, metrics_dir)
+    run_python(WORKER, metrics_dir)
+    body = run_python(SCRAPER, metrics_dir).stdout
+
+    assert sample(body, 'http_requests_total{method="GET",route="/health",status="200"}') == 2
+    assert sample(body, 'ytdlp_phase_duration_seconds_count{endpoint="extract-captions",phase="metadata"}') == 2
+    assert sample(body, 'ytdlp_phase_duration_seconds_bucket{endpoint="extract-captions",le="0.25",phase="metadata"}') == 2
+    assert sample(body, 'ytdlp_phase_duration_seconds_bucket{endpoint="extract-captions",le="0.1",phase="metadata"}') == 0
+    # Live gauges are summed over the processes that wrote them
+    assert sample(body, 'ytdlp_extraction_jobs_in_flight ') == 6
+    assert sample(body, 'ytdlp_extraction_queue_depth ') == 4
+
+
+def test_dead_worker_gauges_are_dropped(metrics_dir):
+    pid = run_python(WORKER, metrics_dir).stdout.strip()
+    # What gunicorn's child_exit hook does when a worker exits
+    body = run_python(SCRAPER, metrics_dir, pid).stdout
+
+    assert sample(body, 'ytdlp_extraction_queue_depth ') == 0
+    # Counters survive the worker that incremented them
+    assert sample(body, 'http_requests_total{method="GET",route="/health",status="200"}') == 1
@@ -0,0 +1,113 @@
+import time
+from email.utils import formatdate
+from urllib.parse import urlsplit
+
+import pytest
+
+import fake_youtube
+from http_client import PooledHTTPClient
+from rate_limit import RateLimiter, RateLimitTimeout, SQLiteTokenBucket, TokenBucket, parse_retry_after
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def bucket(clock, **kwargs):
+    settings = dict(rate=10.0, burst=2, min_rate=1.0, max_rate=20.0, increase=1.0, decrease=0.5, cooldown=2.0)
+    settings.update(kwargs)
+    return TokenBucket(clock=clock, **settings)
+
+
+def test_requests_queue_for_tokens_in_order():
+    clock = Clock()
+    tokens = bucket(clock)
+    assert [tokens.reserve() for _ in range(4)] == pytest.approx([0.0, 0.0, 0.1, 0.2])
+    with pytest.raises(RateLimitTimeout):
+        tokens.reserve(max_wait=0.25)
+
+
+def test_429_halves_the_rate_once_per_cooldown_and_successes_probe_back_up():
+    clock = Clock()
+    tokens = bucket(clock)
+    assert tokens.on_throttle()
+    assert tokens.rate == 5.0
+    clock.now += 1
+    assert not tokens.on_throttle()  # Same burst of 429s
+    assert tokens.rate == 5.0
+    clock.now += 2
+    assert tokens.on_throttle()
+    assert tokens.rate == 2.5
+    for _ in range(30):
+        tokens.on_success()
+    assert tokens.rate == 20.0
+    for _ in range(10):
+        clock.now += 2
+        tokens.on_throttle()
+    assert tokens.rate == 1.0
+
+
+def test_retry_after_holds_back_the_next_token():
+    clock = Clock()
+    tokens = bucket(clock, cooldown=0.0)
+    tokens.on_throttle(retry_after=3.0)
+    assert tokens.reserve() == pytest.approx(3.0)
+    clock.now += 3
+    assert tokens.reserve() == pytest.approx(1 / tokens.rate)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('2') == 2.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(formatdate(1030.0, usegmt=True), now=1000.0) == pytest.approx(30.0)
+
+
+def test_sqlite_buckets_share_one_rate_across_processes(tmp_path):
+    path = str(tmp_path / 'rate-limits.sqlite3')
+    first = SQLiteTokenBucket(path, 'www.youtube.com', rate=10.0, burst=1, cooldown=0.0)
+    second = SQLiteTokenBucket(path, 'www.youtube.com', rate=10.0, burst=1, cooldown=0.0)
+    assert first.reserve() == 0.0
+    assert second.reserve() > 0.0  # The burst was spent through the other instance
+    first.on_throttle()
+    second.reserve()
+    assert second.rate == 5.0
+
+
+@pytest.fixture
+def upstream():
+    fake = fake_youtube.FakeYouTube()
+    server, base_url = fake_youtube.start_server(fake)
+    yield fake, base_url
+    server.shutdown()
+
+
+def test_limiter_backs_off_on_upstream_429s_and_recovers(upstream):
+    fake, base_url = upstream
+    limiter = RateLimiter(lambda host: TokenBucket(rate=20.0, burst=1, min_rate=1.0, max_rate=40.0, increase=5.0,
+                                                   decrease=0.5, cooldown=0.0), max_wait=5.0)
+    client = PooledHTTPClient(max_retries=0, rate_limiter=limiter)
+    url = f'{base_url}/api/timedtext?' + fake.signed_query('rateLimit01', v='rateLimit01', lang='en', fmt='vtt')
+    host = urlsplit(url).netloc
+
+    fake.error_rate = 1.0  # Every request is answered 429 with Retry-After: 1
+    response = client.get(url)
+    assert response.status_code == 429
+    assert limiter.stats()[host]['rate'] == 10.0
+
+    fake.error_rate = 0.0
+    started = time.monotonic()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert time.monotonic() - started >= 0.9  # Held back until Retry-After passed
+
+    for _ in range(4):
+        assert client.get(url).status_code == 200
+    stats = limiter.stats()[host]
+    assert stats['rate'] == 35.0  # Additive increase past the original rate
+    assert (stats['throttled'], stats['rate_decreases'], stats['acquired']) == (1, 1, 6)
+    assert fake.stats()['captions'] == {'requests': 6, 'throttled': 1, 'server_errors': 0, 'forbidden': 0}
@@ -0,0 +1,69 @@
+import os
+import time
+
+import pytest
+
+from scratch import OutputTracker, ScratchDir, sweep_scratch
+
+
+class HookRecorder:
+    def __init__(self):
+        self.progress_hooks = []
+        self.post_hooks = []
+
+    def add_progress_hook(self, hook):
+        self.progress_hooks.append(hook)
+
+    def add_post_hook(self, hook):
+        self.post_hooks.append(hook)
+
+
+def test_scratch_dir_is_removed_when_the_job_fails(tmp_path):
+    root = str(tmp_path / 'scratch')
+    with pytest.raises(RuntimeError):
+        with ScratchDir(root) as scratch:
+            path = scratch.path
+            with open(os.path.join(path, 'video.mp4.part'), 'wb') as f:
+                f.write(b'partial')
+            raise RuntimeError('download failed')
+    assert not os.path.exists(path)
+    assert os.listdir(root) == []
+    assert scratch.path is None
+
+
+def test_each_scratch_dir_is_private(tmp_path):
+    with ScratchDir(str(tmp_path)) as first, ScratchDir(str(tmp_path)) as second:
+        assert first.path != second.path
+        assert os.path.dirname(first.path) == str(tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_sweep_removes_only_old_job_and_trash_dirs(tmp_path):
+    old = time.time() - 3600
+    for name in ('job-old', '.trash-old', 'job-new', 'unrelated-old'):
+        os.mkdir(tmp_path / name)
+    for name in ('job-old', '.trash-old', 'unrelated-old'):
+        os.utime(tmp_path / name, (old, old))
+    (tmp_path / 'job-file').write_text('not a directory')
+    os.utime(tmp_path / 'job-file', (old, old))
+
+    assert sweep_scratch(str(tmp_path), max_age=600) == 2
+    assert sorted(os.listdir(tmp_path)) == ['job-file', 'job-new', 'unrelated-old']
+    assert sweep_scratch(str(tmp_path / 'missing'), max_age=600) == 0
+
+
+def test_output_tracker_records_part_fragment_and_final_files():
+    ydl = HookRecorder()
+    tracker = OutputTracker().attach(ydl)
+    progress, = ydl.progress_hooks
+    post, = ydl.post_hooks
+
+    progress({'status': 'downloading', 'tmpfilename': '/s/video.f137.mp4.part-Frag1.part',
+              'filename': '/s/video.f137.mp4'})
+    progress({'status': 'downloading', 'tmpfilename': '/s/video.f137.mp4.part', 'filename': '/s/video.f137.mp4'})
+    progress({'status': 'finished', 'filename': '/s/video.f140.m4a'})
+    post('/s/video.mp4')
+
+    assert tracker.written == {'/s/video.f137.mp4.part-Frag1.part', '/s/video.f137.mp4.part', '/s/video.f137.mp4',
+                               '/s/video.f140.m4a', '/s/video.mp4'}
+    assert tracker.final_files == ['/s/video.mp4']
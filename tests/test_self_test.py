@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+from caching import TTLCache
+from self_test import SelfTest
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError('condition not met in time')
+
+
+class Check:
+    """Returns successive titles; raises once fail is set"""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.gate = None
+
+    def __call__(self):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError('extraction failed')
+        return {'test_extraction': 'success', 'test_video_title': f'title {self.calls}'}
+
+
+def test_snapshot_serves_the_last_result_with_its_age():
+    check = Check()
+    test = SelfTest(check, interval=0)
+    assert test.snapshot() is None
+    test.refresh()
+    time.sleep(0.05)
+    snapshot = test.snapshot()
+    assert snapshot['test_video_title'] == 'title 1'
+    assert snapshot['age'] >= 0.05
+    assert check.calls == 1
+
+
+def test_reads_do_not_wait_for_a_running_refresh():
+    check = Check()
+    test = SelfTest(check, interval=0)
+    test.refresh()
+    check.gate = threading.Event()
+    refresher = threading.Thread(target=test.refresh)
+    refresher.start()
+
+    started = time.monotonic()
+    assert test.snapshot()['test_video_title'] == 'title 1'
+    assert time.monotonic() - started < 0.5
+    check.gate.set()
+    refresher.join(5)
+    assert test.snapshot()['test_video_title'] == 'title 2'
+
+
+def test_background_refresher_keeps_the_last_good_result_on_failure():
+    check = Check()
+    test = SelfTest(check, interval=0.05)
+    test.start()
+    test.start()  # Idempotent
+    wait_for(lambda: test.runs >= 2)
+
+    check.fail = True
+    wait_for(lambda: test.failures >= 2)
+    assert test.snapshot()['test_extraction'] == 'success'
+    assert test.snapshot()['test_video_title'].startswith('title ')
+    check.gate = threading.Event()  # Park the daemon thread for the rest of the session
+
+
+def test_disabled_refresher_starts_no_thread():
+    test = SelfTest(Check(), interval=0)
+    test.start()
+    assert test._thread is None
+
+
+def test_workers_adopt_a_fresher_stored_result():
+    store = TTLCache(max_bytes=64 * 1024, ttl=60)
+    first, second = Check(), Check()
+    SelfTest(first, interval=60, store=store).refresh()
+    adopter = SelfTest(second, interval=60, store=store)
+    assert adopter.refresh(force=False)['test_video_title'] == 'title 1'
+    assert second.calls == 0
+    assert adopter.stats()['adopted'] == 1
+    # Forced refreshes (e.g. ?refresh=1) always check
+    assert adopter.refresh()['test_video_title'] == 'title 1'
+    assert second.calls == 1
+
+
+def test_ytdlp_info_refresh_runs_the_check(monkeypatch):
+    import app
+    check = Check()
+    monkeypatch.setattr(app, 'ytdlp_self_test', SelfTest(check, interval=0))
+    client = app.app.test_client()
+
+    pending = client.get('/ytdlp-info').get_json()
+    assert pending['test_extraction'] == 'pending'
+    assert check.calls == 0
+
+    refreshed = client.get('/ytdlp-info?refresh=1').get_json()
+    assert refreshed['test_extraction'] == 'success'
+    assert refreshed['test_video_title'] == 'title 1'
+    assert refreshed['test_age_seconds'] == pytest.approx(0, abs=1)
+
+    assert client.get('/ytdlp-info').get_json()['test_video_title'] == 'title 1'
+    assert check.calls == 1
@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def start_followers(flight, key, fn, count):
+    """Start count callers for key once the leader is inside fn; return their threads and outcomes"""
+    outcomes = []
+
+    def follow():
+        try:
+            outcomes.append(flight.do(key, fn))
+        except Exception as e:
+            outcomes.append(e)
+
+    threads = [threading.Thread(target=follow) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def wait_for_waiters(flight, count):
+    for _ in range(500):
+        if flight.stats()['waiting'] == count:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f'expected {count} waiters, got {flight.stats()}')
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    entered = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        entered.set()
+        release.wait(5)
+        return {'title': 'shared'}
+
+    leader = []
+    leader_thread = threading.Thread(target=lambda: leader.append(flight.do('v1', work)))
+    leader_thread.start()
+    assert entered.wait(5)
+
+    threads, outcomes = start_followers(flight, 'v1', work, 4)
+    wait_for_waiters(flight, 4)
+    release.set()
+    for thread in threads + [leader_thread]:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert leader == [{'title': 'shared'}]
+    assert all(outcome is leader[0] for outcome in outcomes)
+    stats = flight.stats()
+    assert stats['leaders'] == 1
+    assert stats['coalesced'] == 4
+    assert stats['in_flight'] == 0
+
+
+def test_leader_error_reaches_every_waiter():
+    flight = SingleFlight()
+    entered = threading.Event()
+    release = threading.Event()
+
+    def work():
+        entered.set()
+        release.wait(5)
+        raise RuntimeError('upstream failed')
+
+    leader_thread = threading.Thread(target=lambda: pytest.raises(RuntimeError, flight.do, 'v2', work))
+    leader_thread.start()
+    assert entered.wait(5)
+
+    threads, outcomes = start_followers(flight, 'v2', work, 3)
+    wait_for_waiters(flight, 3)
+    release.set()
+    for thread in threads + [leader_thread]:
+        thread.join(5)
+
+    assert len(outcomes) == 3
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert flight.stats()['failures'] == 1
+
+
+def test_key_is_released_after_each_call():
+    flight = SingleFlight()
+    results = [flight.do('v3', lambda n=n: n) for n in range(3)]
+    assert results == [0, 1, 2]
+    assert flight.stats()['leaders'] == 3
+    assert flight.stats()['coalesced'] == 0
+
+    with pytest.raises(ValueError):
+        flight.do('v3', int, 'x')
+    # A failed call does not poison the key for the next caller
+    assert flight.do('v3', int, '7') == 7
@@ -0,0 +1,77 @@
+from track_index import TrackIndex
+from video_metadata import VideoMetadata
+
+TABLE = {
+    'manual': {
+        'de': {'vtt': 'https://example.com/de.vtt'},
+        'en-GB': {'ttml': 'https://example.com/en-GB.ttml', 'vtt': 'https://example.com/en-GB.vtt'},
+    },
+    'auto': {
+        'en': {'json3': 'https://example.com/en.json3', 'vtt': 'https://example.com/en.vtt'},
+        'en-US': {'srv3': 'https://example.com/en-US.srv3'},
+        'es': {'vtt': 'https://example.com/es.vtt'},
+    },
+}
+
+
+def urls(tracks):
+    return [track['url'] for track in tracks]
+
+
+def test_find_prefers_manual_tracks_then_listing_order():
+    index = TrackIndex.from_table(TABLE)
+    assert index.find('en')['url'] == 'https://example.com/en-GB.ttml'
+    assert index.find('en', 'auto')['url'] == 'https://example.com/en.json3'
+    assert index.find('e', 'auto')['url'] == 'https://example.com/en.json3'
+    assert index.find('es')['type'] == 'auto'
+    assert index.find('fr') is None
+    assert index.find()['language'] == 'de'
+
+
+def test_find_exact_and_format_preferences():
+    index = TrackIndex.from_table(TABLE)
+    assert index.find('en', exact=True)['language'] == 'en'
+    assert index.find('en-G', exact=True) is None
+    # A sequence is a preference order; a set takes whichever format is listed first
+    assert index.find('en', 'manual', exts=('vtt', 'ttml'))['ext'] == 'vtt'
+    assert index.find('en', 'manual', exts={'vtt', 'ttml'})['ext'] == 'ttml'
+    # Languages without an acceptable format are skipped
+    assert index.find('en', 'auto', exts=('srv3',))['language'] == 'en-US'
+    assert index.find('de', exts=('json3',)) is None
+
+
+def test_select_returns_one_track_per_language():
+    index = TrackIndex.from_table(TABLE)
+    assert urls(index.select('auto')) == [
+        'https://example.com/en.json3', 'https://example.com/en-US.srv3', 'https://example.com/es.vtt']
+    assert urls(index.select('auto', ('vtt', 'srv3'), prefix='en')) == [
+        'https://example.com/en.vtt', 'https://example.com/en-US.srv3']
+    assert index.select('manual', ['json3']) == []
+
+
+def test_select_results_are_cached_but_not_shared():
+    index = TrackIndex.from_table(TABLE)
+    first = index.select('manual')
+    first.clear()
+    assert len(index.select('manual')) == 2
+
+    # Adding a track invalidates cached selections
+    index.add({'language': 'fr', 'type': 'manual', 'url': 'https://example.com/fr.vtt', 'ext': 'vtt'})
+    assert index.languages('manual') == ['de', 'en-GB', 'fr']
+    assert len(index.select('manual')) == 3
+
+
+def test_duplicate_formats_keep_the_first_track():
+    index = TrackIndex([
+        {'language': 'en', 'type': 'auto', 'url': 'https://example.com/first.vtt', 'ext': 'vtt'},
+        {'language': 'en', 'type': 'auto', 'url': 'https://example.com/second.vtt', 'ext': 'vtt'},
+    ])
+    assert index.find('en')['url'] == 'https://example.com/first.vtt'
+    assert index.languages('auto') == ['en']
+
+
+def test_records_build_their_index_once():
+    record = VideoMetadata(id='ccccccccccc', captions=TABLE)
+    assert record.track_index is record.track_index
+    assert record.track_index.find('es')['url'] == 'https://example.com/es.vtt'
+    assert VideoMetadata(id='ddddddddddd').track_index.find('en') is None
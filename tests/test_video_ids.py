@@ -0,0 +1,39 @@
+from video_ids import VideoKey, is_video_url, normalize_video_url, video_key
+
+
+def test_url_spellings_share_one_key():
+    urls = [
+        'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+        'https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ&t=30',
+        'http://m.youtube.com/watch?v=dQw4w9WgXcQ',
+        'https://music.youtube.com/watch?v=dQw4w9WgXcQ',
+        'https://youtu.be/dQw4w9WgXcQ?t=10',
+        'https://www.youtube.com/shorts/dQw4w9WgXcQ',
+        'https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ',
+        'youtube.com/live/dQw4w9WgXcQ',
+        '  dQw4w9WgXcQ  ',
+    ]
+    for url in urls:
+        assert normalize_video_url(url) == VideoKey('youtube', 'dQw4w9WgXcQ'), url
+        assert video_key(url) == 'youtube:dQw4w9WgXcQ'
+
+
+def test_ids_must_be_exactly_eleven_characters():
+    assert normalize_video_url('https://youtu.be/dQw4w9WgXcQx').extractor == 'generic'
+    assert normalize_video_url('dQw4w9WgXc').extractor == 'generic'
+
+
+def test_unknown_sites_collapse_trivial_variants():
+    a = video_key('HTTPS://Example.COM/video/1?x=2#comments')
+    b = video_key('https://example.com/video/1?x=2')
+    assert a == b == 'generic:https://example.com/video/1?x=2'
+    assert video_key('https://example.com/Video/1') != b
+
+
+def test_is_video_url():
+    assert is_video_url('https://youtu.be/dQw4w9WgXcQ')
+    assert is_video_url('dQw4w9WgXcQ')
+    assert is_video_url('https://example.com/clip.mp4')
+    assert not is_video_url('not a url')
+    assert not is_video_url('ftp://example.com/clip.mp4')
+    assert not is_video_url('https://')
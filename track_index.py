@@ -0,0 +1,107 @@
+"""
+Pre-indexed caption track lookup
+
+Videos with auto-translated captions list 100+ languages in several formats each,
+and the caption endpoints ask the same questions of them several times per request
+("first track whose language starts with 'en'", "manual track in 'de'", ...).
+TrackIndex answers those from a per-type language-prefix trie and a
+(type, language) -> {ext: track} map instead of a linear scan per question.
+
+VideoMetadata builds the index once per record and keeps it, so a record held by
+the in-memory metadata cache carries its index along.
+"""
+
+TRACK_TYPES = ('manual', 'auto')
+
+
+class _TrieNode:
+    __slots__ = ('children', 'languages')
+
+    def __init__(self):
+        self.children = {}
+        self.languages = []  # Every language under this prefix, in listing order
+
+
+class TrackIndex:
+    """Caption tracks of one video, indexed by type, language prefix and format"""
+
+    def __init__(self, tracks=()):
+        self._tries = {track_type: _TrieNode() for track_type in TRACK_TYPES}
+        self._formats = {}  # (type, language) -> {ext: track}
+        self._selections = {}
+        for track in tracks:
+            self.add(track)
+
+    @classmethod
+    def from_table(cls, table):
+        """Index a caption table {'manual'|'auto': {language: {ext: url}}} (see video_metadata.caption_table)"""
+        index = cls()
+        for track_type in TRACK_TYPES:
+            for language, formats in (table.get(track_type) or {}).items():
+                for ext, url in formats.items():
+                    index.add({'language': language, 'type': track_type, 'url': url, 'ext': ext})
+        return index
+
+    def add(self, track):
+        key = (track['type'], track['language'])
+        formats = self._formats.get(key)
+        if formats is None:
+            formats = self._formats[key] = {}
+            node = self._tries[track['type']]
+            node.languages.append(track['language'])
+            for char in track['language']:
+                node = node.children.setdefault(char, _TrieNode())
+                node.languages.append(track['language'])
+        formats.setdefault(track['ext'], track)
+        self._selections.clear()
+
+    def _languages(self, track_type, prefix):
+        node = self._tries[track_type]
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return ()
+        return node.languages
+
+    def _best(self, track_type, language, exts):
+        formats = self._formats[(track_type, language)]
+        if exts is None:
+            return next(iter(formats.values()))
+        if isinstance(exts, (set, frozenset)):
+            return next((track for ext, track in formats.items() if ext in exts), None)
+        return next((formats[ext] for ext in exts if ext in formats), None)
+
+    def find(self, prefix='', track_type=None, exts=None, exact=False):
+        """First track whose language starts with (or, if exact, equals) prefix, in the first of exts available
+
+        track_type None searches manual tracks before auto ones. exts is a preference order, or a
+        set to take whichever of its formats is listed first; None accepts any format.
+        """
+        for kind in ((track_type,) if track_type else TRACK_TYPES):
+            if exact:
+                track = self._best(kind, prefix, exts) if (kind, prefix) in self._formats else None
+                if track is not None:
+                    return track
+                continue
+            for language in self._languages(kind, prefix):
+                track = self._best(kind, language, exts)
+                if track is not None:
+                    return track
+        return None
+
+    def select(self, track_type, exts=None, prefix=''):
+        """One track per language of track_type (in listing order), each in the first of exts available"""
+        if exts is not None:
+            exts = frozenset(exts) if isinstance(exts, (set, frozenset)) else tuple(exts)
+        key = (track_type, exts, prefix)
+        selection = self._selections.get(key)
+        if selection is None:
+            selection = [track for track in (self._best(track_type, language, exts)
+                                             for language in self._languages(track_type, prefix))
+                         if track is not None]
+            self._selections[key] = selection
+        return list(selection)
+
+    def languages(self, track_type):
+        return list(self._tries[track_type].languages)
+
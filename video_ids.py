@@ -0,0 +1,63 @@
+"""
+Canonical video-ID normalization for cache, dedup and metrics keys
+
+Maps every URL spelling of a video (watch?v=ID&t=30, youtu.be/ID, m.youtube.com,
+shorts/ID, embed/ID, ...) to a single (extractor, video_id) pair using a
+precompiled regex table, without touching the network.
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit
+
+_ID = r'([0-9A-Za-z_-]{11})(?![0-9A-Za-z_-])'
+
+# (extractor, pattern) pairs tried in order; group 1 is always the video ID
+_URL_PATTERNS = [
+    ('youtube', re.compile(
+        r'(?i:(?:https?://)?(?:(?:www|m|music)\.)?youtube(?:-nocookie)?\.com/)'
+        r'(?:watch/?\?(?:[^#]*?&)?v=|(?:shorts|embed|live|v|e)/)' + _ID)),
+    ('youtube', re.compile(r'(?i:(?:https?://)?(?:www\.)?youtu\.be/)' + _ID)),
+    ('youtube', re.compile(r'^' + _ID + r'$')),
+]
+
+
+class VideoKey(namedtuple('VideoKey', ['extractor', 'video_id'])):
+    """Canonical identity of a video; str() gives the cache key form 'extractor:video_id'"""
+    __slots__ = ()
+
+    def __str__(self):
+        return f'{self.extractor}:{self.video_id}'
+
+
+@lru_cache(maxsize=4096)
+def normalize_video_url(url):
+    """Return the VideoKey for url; unknown URLs fall back to a 'generic' key on the cleaned URL"""
+    url = url.strip()
+    for extractor, pattern in _URL_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return VideoKey(extractor, match.group(1))
+
+    # Unknown site: lowercase scheme/host and drop the fragment so trivial variants collapse
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return VideoKey('generic', url)
+    return VideoKey('generic', urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+                                           parts.path, parts.query, '')))
+
+
+def is_video_url(url):
+    """True for URLs a video could be extracted from: a known video URL or ID, or any http(s) URL"""
+    key = normalize_video_url(url)
+    if key.extractor != 'generic':
+        return True
+    parts = urlsplit(key.video_id)
+    return parts.scheme in ('http', 'https') and bool(parts.netloc)
+
+
+def video_key(url):
+    """Return the canonical string key ('youtube:dQw4w9WgXcQ') used by caches and dedup"""
+    return str(normalize_video_url(url))
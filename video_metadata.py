@@ -0,0 +1,114 @@
+"""
+Slim video metadata records for the metadata cache
+
+The info dict yt-dlp returns for one YouTube video holds hundreds of formats,
+thumbnails, caption URLs for every translation language and HTTP headers, often
+several MB. VideoMetadata keeps only what the metadata and caption endpoints read:
+display fields, the caption track table and a summary of the formats. Metadata
+jobs project the info dict inside the extraction worker, so the full dict never
+reaches the server process and the caches hold records of a few KB.
+"""
+
+import json
+import re
+
+from track_index import TrackIndex
+
+# Records keep only the start of the description; /test-ytdlp cuts it to the same length itself,
+# so it does not depend on getting records rather than info dicts
+DESCRIPTION_CHARS = 200
+_EXPIRE = re.compile(r'[?&]expire=(\d+)')
+
+
+def url_expiry(url):
+    """Expiry (epoch seconds) of a signed googlevideo/timedtext URL, or None if it carries none"""
+    match = _EXPIRE.search(url or '')
+    return int(match.group(1)) if match else None
+
+
+def caption_table(info):
+    """{'manual': {language: {ext: url}}, 'auto': {...}} from an info dict's caption listings"""
+    table = {}
+    for track_type, field in (('manual', 'subtitles'), ('auto', 'automatic_captions')):
+        table[track_type] = {
+            language: {track['ext']: track['url'] for track in tracks if track.get('url') and track.get('ext')}
+            for language, tracks in (info.get(field) or {}).items()
+        }
+    return table
+
+
+def format_summary(formats):
+    """Counts of what the format list offers, without the formats themselves"""
+    video = [f for f in formats if f.get('vcodec') not in (None, 'none')]
+    audio_only = [f for f in formats if f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')]
+    return {
+        'count': len(formats),
+        'video': len(video),
+        'audio_only': len(audio_only),
+        'max_height': max((f.get('height') or 0 for f in video), default=0) or None
+    }
+
+
+class VideoMetadata:
+    """Compact, picklable record of the parts of an info dict the endpoints use"""
+
+    FIELDS = ('id', 'title', 'duration', 'uploader', 'view_count', 'upload_date', 'description', 'language',
+              'captions', 'formats')
+    __slots__ = FIELDS + ('_track_index',)
+
+    def __init__(self, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+        self._track_index = None
+
+    @classmethod
+    def from_info(cls, info):
+        """Project a full yt-dlp info dict onto a record"""
+        return cls(
+            id=info.get('id'),
+            title=info.get('title'),
+            duration=info.get('duration'),
+            uploader=info.get('uploader'),
+            view_count=info.get('view_count'),
+            upload_date=info.get('upload_date'),
+            description=(info.get('description') or '')[:DESCRIPTION_CHARS],
+            language=info.get('language') or info.get('language_code'),
+            captions=caption_table(info),
+            formats=format_summary(info.get('formats') or [])
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        if 'captions' not in data:
+            # A full info dict cached before records existed
+            return cls.from_info(data)
+        return cls(**data)
+
+    def to_dict(self):
+        """JSON form, as stored in the shared cache"""
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @property
+    def track_index(self):
+        """Caption TrackIndex, built on first use and kept with the record"""
+        if self._track_index is None:
+            self._track_index = TrackIndex.from_table(self.captions or {})
+        return self._track_index
+
+    def caption_expiry(self):
+        """Expiry (epoch seconds) of the signed caption URLs, or None if they carry none"""
+        for languages in (self.captions or {}).values():
+            for formats in languages.values():
+                for url in formats.values():
+                    expires_at = url_expiry(url)
+                    if expires_at is not None:
+                        return expires_at
+        return None
+
+    def __repr__(self):
+        return f'<VideoMetadata {self.id} {self.title!r}>'
+
+
+def record_size(record):
+    """Memory-cache size estimate for a record: the length of its JSON form"""
+    return len(json.dumps(record.to_dict(), separators=(',', ':')))